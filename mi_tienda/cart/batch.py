@@ -0,0 +1,126 @@
+"""Varios cambios al carrito en una sola petición.
+
+``apply_operations`` recibe una lista de operaciones ``add`` / ``set`` /
+``remove``, las aplica sobre una copia de las cantidades, trae todos los
+productos involucrados con una consulta, valida el stock de una vez y, si
+todo es válido, guarda la sesión como mucho una vez. Si alguna falla no se aplica
+ninguna.
+"""
+from orders.checkout import compute_totals
+from orders.reservations import available_to_sell
+from products.models import Product
+from .cart import CartSnapshot
+
+OPERATIONS = ('add', 'set', 'remove')
+MAX_OPERATIONS = 200
+MAX_QUANTITY = 999
+
+
+class BatchError(Exception):
+    """Operaciones inválidas: ``errors`` es ``[{'index', 'product_id', 'message'}]``"""
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def parse_operations(data):
+    """Valida la forma del JSON y devuelve ``[(op, product_id, cantidad)]``"""
+    operations = data.get('operations') if isinstance(data, dict) else None
+    if not isinstance(operations, list) or not operations:
+        raise BatchError([{'index': None, 'product_id': None, 'message': 'Falta la lista "operations"'}])
+    if len(operations) > MAX_OPERATIONS:
+        raise BatchError([{'index': None, 'product_id': None,
+                           'message': f'Como máximo {MAX_OPERATIONS} operaciones por petición'}])
+    parsed, errors = [], []
+    for index, operation in enumerate(operations):
+        operation = operation if isinstance(operation, dict) else {}
+        op, product_id = operation.get('op'), operation.get('product_id')
+        quantity = operation.get('quantity', 1 if op == 'add' else None)
+        message = None
+        if op not in OPERATIONS:
+            message = f'Operación desconocida: {op!r}'
+        elif not isinstance(product_id, int) or isinstance(product_id, bool) or product_id < 1:
+            message = 'product_id inválido'
+        elif op != 'remove' and (
+            not isinstance(quantity, int) or isinstance(quantity, bool)
+            or not (1 if op == 'add' else 0) <= quantity <= MAX_QUANTITY
+        ):
+            message = 'Cantidad inválida'
+        if message:
+            errors.append({'index': index, 'product_id': product_id, 'message': message})
+        else:
+            parsed.append((op, product_id, quantity))
+    if errors:
+        raise BatchError(errors)
+    return parsed
+
+
+def apply_operations(cart, operations):
+    """Aplica ``operations`` (ya validadas con :func:`parse_operations`) a ``cart``.
+
+    Lanza ``BatchError`` sin tocar el carrito si algún producto no existe o
+    no hay stock para la cantidad pedida. Devuelve el ``CartSnapshot`` nuevo.
+    """
+    quantities = cart.quantities()
+    touched = {}
+    for index, (op, product_id, quantity) in enumerate(operations):
+        if op == 'add':
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+        elif op == 'set' and quantity:
+            quantities[product_id] = quantity
+        else:
+            quantities.pop(product_id, None)
+        touched[product_id] = index
+
+    products = Product.objects.filter(pk__in=list(quantities), is_active=True).in_bulk()
+    changed = [pk for pk in touched if pk in quantities]
+    available = available_to_sell(changed)
+    errors = []
+    for pk in changed:
+        if pk not in products:
+            errors.append({'index': touched[pk], 'product_id': pk, 'message': 'El producto no existe'})
+        elif quantities[pk] > MAX_QUANTITY or quantities[pk] > available.get(pk, 0):
+            errors.append({'index': touched[pk], 'product_id': pk,
+                           'message': f'Stock insuficiente (disponible: {available.get(pk, 0)})'})
+    if errors:
+        raise BatchError(sorted(errors, key=lambda error: error['index']))
+
+    # Los productos ya están cargados: se revaloran todas las líneas sin otra
+    # consulta y el snapshot se arma con ellos. Las líneas de productos
+    # desactivados se conservan, sin precio.
+    for pk in changed:
+        cart.pin(products[pk])
+    cart.cart = quantities
+    cart.reprice({pk: (product.price_version, product.unit_price, product.iva_percentage)
+                  for pk, product in products.items()})
+    cart.save()
+
+    snapshot = CartSnapshot([
+        cart.item(products[pk], quantity)
+        for pk, quantity in quantities.items() if pk in products
+    ])
+    cart.request._cart_snapshot = snapshot
+    return snapshot
+
+
+def summarize(snapshot, evaluation=None):
+    """Respuesta JSON con las líneas y los totales recalculados"""
+    totals = compute_totals(snapshot.items, evaluation)
+    return {
+        'items': [
+            {
+                'product_id': item.product.pk,
+                'name': item.product.name,
+                'quantity': item.quantity,
+                'price': str(item.price),
+                'total_price': str(item.total_price),
+            }
+            for item in snapshot.items
+        ],
+        'total_items': snapshot.total_items,
+        'subtotal': str(totals['subtotal']),
+        'discount': str(totals['discount']),
+        'total_iva': str(totals['total_iva']),
+        'total': str(totals['total']),
+    }
@@ -1,93 +1,315 @@
+import hashlib
+import json
 from decimal import Decimal
 from django.conf import settings
+from products import money
+from products.money import from_cents, to_basis_points, to_cents
 from products.models import Product
 
 class CartItem:
     """Clase para representar un item del carrito de forma más robusta"""
-    def __init__(self, product, quantity, price):
+    def __init__(self, product, quantity, price=None, unit_cents=None, rate=None):
         self.product = product
         self.quantity = quantity
-        self.price = price
-        self.total_price = price * quantity
+        # Precio fijado en el carrito (centavos y puntos básicos); sin él, el vigente del producto
+        self.unit_cents = to_cents(product.unit_price) if unit_cents is None else unit_cents
+        self.rate = to_basis_points(product.iva_percentage) if rate is None else rate
+        iva_cents = money.unit_iva(self.unit_cents, self.rate)
+        self.unit_price = from_cents(self.unit_cents)
+        self.iva_amount = from_cents(iva_cents)
+        self.iva_percentage = from_cents(self.rate)
+        self.price = from_cents(self.unit_cents + iva_cents) if price is None else price
+        self.total_price = self.price * quantity
+        # ``(precio_unitario, tasa, cantidad)`` para ``money.compute``
+        self.line = (self.unit_cents, self.rate, quantity)
+
+class CartSnapshot:
+    """Items y totales del carrito calculados una sola vez"""
+    def __init__(self, items):
+        self.items = items
+        self.totals = money.compute(item.line for item in items)
+        self.total_price = from_cents(self.totals.total)
+        self.total_items = sum(item.quantity for item in items)
+
+# Claves de sesión de la sincronización con el carrito guardado (ver ``middleware.py``)
+DIRTY_KEY = 'cart_dirty'
+SYNCED_KEY = 'cart_synced_at'
+
+# Formato del carrito en la sesión (ver ``encode_cart``)
+CART_FORMAT = 3
+
+
+def encode_cart(quantities, price_version, prices=None):
+    """``{'v': 3, 'pv': versión de precios, 'q': {'<id>': cantidad}, 'p': {'<id>': [precio, tasa]}}``.
+
+    Solo ids y enteros: el nombre se lee del producto al armar el snapshot.
+    ``p`` guarda el precio sin IVA (centavos) y la tasa de IVA (puntos
+    básicos, ver ``products.money``) fijados para cada línea, vigentes en la
+    versión de precios ``pv`` del catálogo
+    (``products.pricing``); ``null`` si el producto no está a la venta. Una
+    línea sin entrada en ``p`` se revalora al leerla.
+    """
+    data = {'v': CART_FORMAT, 'pv': price_version, 'q': {str(pk): quantity for pk, quantity in quantities.items()}}
+    if prices:
+        data['p'] = {
+            str(pk): list(price) if price is not None else None
+            for pk, price in prices.items() if pk in quantities
+        }
+    return data
+
+
+def decode_cart(data):
+    """``(cantidades, versión de precios, precios)`` de lo guardado en la sesión.
+
+    Acepta también los formatos anteriores: el 2, cuyos precios (con el IVA
+    en centavos) se descartan y se revaloran, y el original, ``{'<id>':
+    {'quantity', 'price', 'product_id', 'product_name'}}``, sin versión ni
+    precios fijados. Las líneas corruptas se descartan.
+    """
+    if not isinstance(data, dict):
+        return {}, None, {}
+    if data.get('v') == CART_FORMAT:
+        lines, price_version, pins = data.get('q') or {}, data.get('pv'), data.get('p') or {}
+    elif data.get('v') == 2:
+        lines, price_version, pins = data.get('q') or {}, None, {}
+    else:
+        lines = {pk: item.get('quantity') if isinstance(item, dict) else None for pk, item in data.items()}
+        price_version, pins = None, {}
+    quantities = {}
+    for product_id, quantity in lines.items():
+        try:
+            product_id, quantity = int(product_id), int(quantity)
+        except (ValueError, TypeError):
+            continue
+        if quantity > 0:
+            quantities[product_id] = quantity
+    prices = {}
+    for product_id, price in pins.items():
+        try:
+            if price is None:
+                prices[int(product_id)] = None
+            else:
+                unit_cents, rate = price
+                prices[int(product_id)] = (int(unit_cents), int(rate))
+        except (ValueError, TypeError):
+            continue
+    return quantities, price_version, prices
+
 
 class Cart:
+    """Carrito en sesión.
+
+    Los productos se cargan de forma perezosa en un ``CartSnapshot`` que se
+    guarda en el request, así todas las instancias de ``Cart`` del mismo
+    request (context processor, vistas) comparten una única consulta. El
+    snapshot se invalida en ``add``, ``remove`` y ``clear``.
+
+    Cada línea lleva su precio fijado. Mientras la versión de precios del
+    catálogo no cambie, los totales salen de esos precios sin consultar los
+    productos; si cambió, ``refresh_prices`` revalora solo las líneas cuyo
+    producto cambió después de ``price_version``.
+
+    ``save`` solo escribe la sesión si algo cambió respecto de lo guardado.
+    Cada cambio de cantidades marca el carrito como pendiente de guardar; el
+    backend de ``CART_BACKEND`` lo persiste después, una vez por petición
+    como mucho.
+    """
     def __init__(self, request):
+        self.request = request
         self.session = request.session
-        cart = self.session.get(settings.CART_SESSION_ID)
-        if not cart:
-            cart = self.session[settings.CART_SESSION_ID] = {}
-        self.cart = cart
+        # El carrito vacío no se guarda en la sesión hasta el primer ``add``,
+        # así una visita anónima no crea ni reescribe su sesión
+        stored = self.session.get(settings.CART_SESSION_ID)
+        self.stored = stored if isinstance(stored, dict) else None
+        self.cart, self.price_version, self.prices = decode_cart(self.stored)
+
+    def pin(self, product):
+        """Fija en la línea de ``product`` su precio vigente"""
+        if not any(price is not None for price in self.prices.values()):
+            # Sin otros precios fijados: valen desde la versión de este producto
+            self.price_version = product.price_version
+        elif self.price_version is not None:
+            self.price_version = min(self.price_version, product.price_version)
+        self.prices[product.id] = (to_cents(product.unit_price), to_basis_points(product.iva_percentage))
 
     def add(self, product, quantity=1, override_quantity=False):
-        product_id = str(product.id)
-        
-        if product_id not in self.cart:
-            self.cart[product_id] = {
-                'quantity': 0,
-                'price': str(product.price_with_iva),
-                'product_id': product_id,
-                'product_name': product.name
-            }
-        
+        self.pin(product)
         if override_quantity:
-            self.cart[product_id]['quantity'] = quantity
+            self.cart[product.id] = quantity
         else:
-            self.cart[product_id]['quantity'] += quantity
-        
+            self.cart[product.id] = self.cart.get(product.id, 0) + quantity
         self.save()
 
     def save(self):
-        self.session.modified = True
+        """Guarda en la sesión si algo cambió; devuelve ``True`` si escribió"""
+        self.cart = {pk: quantity for pk, quantity in self.cart.items() if quantity > 0}
+        self.prices = {pk: price for pk, price in self.prices.items() if pk in self.cart}
+        if self.stored is None and not self.cart:
+            return False
+        encoded = encode_cart(self.cart, self.price_version, self.prices)
+        # Un carrito en el formato anterior se reescribe aunque no cambie
+        if encoded == self.stored:
+            return False
+        quantities_changed = decode_cart(self.stored)[0] != self.cart
+        self.stored = encoded
+        self.session[settings.CART_SESSION_ID] = encoded
+        if quantities_changed:
+            self.session[DIRTY_KEY] = True
+            self.invalidate()
+        return True
+
+    @property
+    def version(self):
+        """Huella de lo guardado en la sesión: cambia con cantidades y precios"""
+        return hashlib.sha1(json.dumps(self.stored, sort_keys=True).encode()).hexdigest()
+
+    def quantities(self):
+        """``{product_id: cantidad}`` sin consultar la base de datos"""
+        return dict(self.cart)
+
+    def merge(self, stored):
+        """Incorpora un carrito guardado ``{product_id: cantidad}``.
+
+        Si un producto está en los dos se queda la cantidad mayor, así
+        fusionar dos veces el mismo carrito no duplica nada. Devuelve
+        ``True`` si el carrito de la sesión cambió.
+        """
+        missing = [pk for pk in stored if pk not in self.cart]
+        for product in Product.objects.filter(pk__in=missing, is_active=True):
+            self.pin(product)
+            self.cart[product.pk] = stored[product.pk]
+        for product_id, quantity in stored.items():
+            if self.cart.get(product_id, quantity) < quantity:
+                self.cart[product_id] = quantity
+        return self.save()
+
+    def reprice(self, current):
+        """Actualiza los precios fijados con ``current``.
+
+        ``current`` es ``{product_id: (price_version, unit_price, iva_percentage)}``
+        de los productos activos del carrito. Solo se revaloran las líneas
+        sin precio o cuyo producto cambió después de ``price_version``; las
+        de productos que ya no están a la venta quedan con precio ``None``.
+        Devuelve los ids de las líneas cuyo precio fijado cambió.
+        """
+        changed = []
+        for product_id in self.cart:
+            pinned = self.prices.get(product_id)
+            if product_id not in current:
+                if pinned is not None:
+                    changed.append(product_id)
+                self.prices[product_id] = None
+                continue
+            product_version, unit_price, iva_percentage = current[product_id]
+            if pinned is not None and self.price_version is not None and product_version <= self.price_version:
+                continue
+            price = (to_cents(unit_price), to_basis_points(iva_percentage))
+            if pinned != price:
+                self.prices[product_id] = price
+                if pinned is not None:
+                    changed.append(product_id)
+        return changed
+
+    def refresh_prices(self):
+        """Revalora el carrito si la versión de precios del catálogo cambió.
+
+        Cuesta la lectura de la versión (una vez por petición) y una
+        consulta liviana (ids, versiones y precios de las líneas) solo
+        cuando la versión avanzó. Devuelve los ids de
+        las líneas cuyo precio cambió.
+        """
+        from products.pricing import get_price_version
+
+        version = get_price_version(self.request)
+        if not self.cart or (self.price_version == version and self.prices.keys() >= self.cart.keys()):
+            return []
+        current = Product.objects.filter(pk__in=list(self.cart), is_active=True).values_list(
+            'pk', 'price_version', 'unit_price', 'iva_percentage'
+        )
+        changed = self.reprice({pk: values for pk, *values in current})
+        self.price_version = version
+        self.save()
+        return changed
+
+    def invalidate(self):
+        """Descarta el snapshot para que se recalcule en el próximo acceso"""
+        self.request.__dict__.pop('_cart_snapshot', None)
+
+    @property
+    def snapshot(self):
+        snapshot = getattr(self.request, '_cart_snapshot', None)
+        if snapshot is None:
+            snapshot = self.request._cart_snapshot = CartSnapshot(list(self._load_items()))
+        return snapshot
 
     def remove(self, product):
-        product_id = str(product.id)
-        if product_id in self.cart:
-            del self.cart[product_id]
+        if product.id in self.cart:
+            del self.cart[product.id]
             self.save()
 
+    def _load_items(self):
+        """Genera los CartItem válidos con una sola consulta de productos.
+
+        Los productos traen sus precios vigentes: las líneas desactualizadas
+        se revaloran con ellos sin otra consulta.
+        """
+        if not self.cart:
+            return
+        products = Product.objects.filter(id__in=list(self.cart), is_active=True).select_related('category')
+        product_dict = {product.id: product for product in products}
+        self.reprice({
+            pk: (product.price_version, product.unit_price, product.iva_percentage)
+            for pk, product in product_dict.items()
+        })
+        self.save()
+        for product_id, quantity in self.cart.items():
+            product = product_dict.get(product_id)
+            if product is not None and self.prices.get(product_id) is not None:
+                yield self.item(product, quantity)
+
+    def item(self, product, quantity):
+        """``CartItem`` de ``product`` con el precio fijado en su línea"""
+        unit_cents, rate = self.prices[product.id]
+        return CartItem(product, quantity, unit_cents=unit_cents, rate=rate)
+
+    def priced_lines(self):
+        """``[(precio_unitario, tasa, cantidad)]`` de los precios fijados, sin cargar productos"""
+        self.refresh_prices()
+        return [
+            (*self.prices[product_id], quantity)
+            for product_id, quantity in self.cart.items() if self.prices.get(product_id) is not None
+        ]
+
     def __iter__(self):
         """Iterador que devuelve objetos CartItem en lugar de diccionarios"""
-        product_ids = list(self.cart.keys())
-        
-        # Obtener productos existentes
-        products = Product.objects.filter(
-            id__in=product_ids, 
-            is_active=True
-        )
-        
-        product_dict = {str(p.id): p for p in products}
-        
-        # Crear items válidos
-        for product_id, item_data in self.cart.items():
-            if product_id in product_dict:
-                try:
-                    product = product_dict[product_id]
-                    quantity = int(item_data['quantity'])
-                    price = Decimal(item_data['price'])
-                    
-                    yield CartItem(
-                        product=product,
-                        quantity=quantity,
-                        price=price
-                    )
-                except (KeyError, ValueError, TypeError):
-                    # Ignorar items corruptos
-                    continue
+        return iter(self.snapshot.items)
 
     def __len__(self):
-        return sum(1 for _ in self)
+        if not self.cart:
+            return 0
+        return len(self.snapshot.items)
 
     def get_total_price(self):
-        total = Decimal('0.00')
-        for item in self:
-            total += item.total_price
-        return total
+        if not self.cart:
+            return Decimal('0.00')
+        snapshot = getattr(self.request, '_cart_snapshot', None)
+        if snapshot is not None:
+            return snapshot.total_price
+        return from_cents(money.compute(self.priced_lines()).total)
 
     def get_total_items(self):
-        return sum(item.quantity for item in self)
+        if not self.cart:
+            return 0
+        snapshot = getattr(self.request, '_cart_snapshot', None)
+        if snapshot is not None:
+            return snapshot.total_items
+        return sum(quantity for _, _, quantity in self.priced_lines())
 
     def clear(self):
         if settings.CART_SESSION_ID in self.session:
             del self.session[settings.CART_SESSION_ID]
-            self.save()
-
+            self.session[DIRTY_KEY] = True
+        self.cart = {}
+        self.prices = {}
+        self.stored = None
+        self.invalidate()
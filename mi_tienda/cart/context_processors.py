@@ -1,9 +1,13 @@
 from .cart import Cart
 
 def cart_total_amount(request):
-    """Context processor para mostrar información del carrito en todas las páginas"""
+    """Context processor para mostrar información del carrito en todas las páginas.
+
+    Se pasan los métodos sin llamarlos: la plantilla los evalúa solo si los
+    usa, de modo que una página que no muestra el carrito no hace consultas.
+    """
     cart = Cart(request)
     return {
-        'cart_total_items': cart.get_total_items(),
-        'cart_total_price': cart.get_total_price(),
+        'cart_total_items': cart.get_total_items,
+        'cart_total_price': cart.get_total_price,
     }
\ No newline at end of file
@@ -0,0 +1,105 @@
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.base import SessionBase
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+
+from cart.cart import Cart, CartItem, DIRTY_KEY
+from products.models import Category, Product
+
+
+class MemorySession(SessionBase):
+    """Sesión sin almacenamiento: solo interesa si quedaría marcada para escribir"""
+
+    def load(self):
+        return {}
+
+
+class LegacyCart(Cart):
+    """Implementación anterior: guarda nombre y precio por línea y escribe siempre"""
+
+    def save(self):
+        products = Product.objects.in_bulk(list(self.cart))
+        self.session[settings.CART_SESSION_ID] = {
+            str(pk): {
+                'quantity': quantity,
+                'price': str(products[pk].price_with_iva),
+                'product_id': str(pk),
+                'product_name': products[pk].name,
+            }
+            for pk, quantity in self.cart.items()
+        }
+        self.session[DIRTY_KEY] = True
+        self.session.modified = True
+        self.invalidate()
+        return True
+
+    def _load_items(self):
+        products = Product.objects.filter(id__in=list(self.cart), is_active=True)
+        for product in products:
+            yield CartItem(product, self.cart[product.pk], product.price_with_iva)
+
+    def get_total_price(self):
+        return self.snapshot.total_price
+
+    def get_total_items(self):
+        return self.snapshot.total_items
+
+
+class Command(BaseCommand):
+    help = 'Compara el tamaño de la sesión y las escrituras por petición del carrito anterior y el compacto'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 50])
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            category = Category.objects.create(name=f'benchmark-{time.time()}')
+            Product.objects.bulk_create([
+                Product(name=f'Zapatillas deportivas modelo {i}', description='-',
+                        unit_price=Decimal('129900.00'), category=category)
+                for i in range(max(options['sizes']))
+            ])
+            products = list(category.products.order_by('pk'))
+
+            self.stdout.write(f'{"líneas":>7} {"bytes antes":>12} {"bytes después":>14} '
+                              f'{"escrituras antes":>17} {"escrituras después":>19}')
+            for size in options['sizes']:
+                before = self.measure(LegacyCart, products[:size])
+                after = self.measure(Cart, products[:size])
+                requests = len(self.script(products))
+                self.stdout.write(f'{size:>7} {before[0]:>12} {after[0]:>14} '
+                                  f'{before[1]:>15}/{requests} {after[1]:>17}/{requests}')
+            # No dejar datos sintéticos en la base de datos
+            transaction.set_rollback(True)
+
+    def script(self, products):
+        """Peticiones típicas de una visita; solo la primera y la última cambian el carrito"""
+        first = products[0]
+        return [
+            lambda cart: [cart.add(product, 2) for product in products],
+            lambda cart: list(cart),
+            lambda cart: cart.get_total_items(),
+            lambda cart: cart.add(first, cart.quantities()[first.pk], override_quantity=True),
+            lambda cart: cart.add(first, 1),
+        ]
+
+    def measure(self, cart_class, products):
+        """``(bytes de la sesión codificada, peticiones que la reescriben)``"""
+        session, writes = MemorySession(), 0
+        for action in self.script(products):
+            request = RequestFactory().get('/')
+            request.user = AnonymousUser()
+            # Cada petición parte de la sesión guardada, como en el middleware
+            request.session = MemorySession()
+            request.session.update(dict(session.items()))
+            request.session.modified = False
+            action(cart_class(request))
+            if request.session.modified:
+                writes += 1
+                session = request.session
+        return len(session.encode(dict(session.items()))), writes
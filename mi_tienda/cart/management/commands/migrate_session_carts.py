@@ -0,0 +1,46 @@
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from cart.cart import CART_FORMAT, decode_cart, encode_cart
+
+
+class Command(BaseCommand):
+    help = 'Reescribe en el formato compacto los carritos de las sesiones guardadas con el formato anterior'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        store_class = import_module(settings.SESSION_ENGINE).SessionStore
+        if not hasattr(store_class, 'get_model_class'):
+            # Caché o cookies firmadas: se migran solas al próximo cambio del carrito
+            raise CommandError(f'{settings.SESSION_ENGINE} no guarda las sesiones en la base de datos')
+        model = store_class.get_model_class()
+        store = store_class()
+        batch, migrated, saved_bytes = [], 0, 0
+        sessions = model.objects.filter(expire_date__gt=timezone.now()).order_by('pk')
+        for session in sessions.iterator(chunk_size=options['batch_size']):
+            data = store.decode(session.session_data)
+            stored = data.get(settings.CART_SESSION_ID)
+            if not isinstance(stored, dict) or stored.get('v') == CART_FORMAT:
+                continue
+            # Sin versión de precios: el carrito se valora con los precios vigentes
+            data[settings.CART_SESSION_ID] = encode_cart(decode_cart(stored)[0], None)
+            encoded = store.encode(data)
+            saved_bytes += len(session.session_data) - len(encoded)
+            session.session_data = encoded
+            batch.append(session)
+            migrated += 1
+            if len(batch) >= options['batch_size']:
+                self.flush(model, batch, options['dry_run'])
+        self.flush(model, batch, options['dry_run'])
+        self.stdout.write(f'{migrated} sesiones migradas ({saved_bytes} bytes menos)')
+
+    def flush(self, model, batch, dry_run):
+        if batch and not dry_run:
+            model.objects.bulk_update(batch, ['session_data'])
+        batch.clear()
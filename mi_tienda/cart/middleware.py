@@ -0,0 +1,40 @@
+import time
+
+from django.conf import settings
+
+from .backends import get_backend
+from .cart import DIRTY_KEY, SYNCED_KEY, Cart
+
+
+def sync_cart(request, force=False):
+    """Guarda el carrito de la sesión con el backend si tiene cambios pendientes.
+
+    Sin ``force`` se espera al menos ``CART_SYNC_INTERVAL`` segundos desde la
+    última escritura, así varios cambios seguidos terminan en una sola.
+    Devuelve ``True`` si escribió.
+    """
+    session = request.session
+    if not session.get(DIRTY_KEY) or not request.user.is_authenticated:
+        return False
+    interval = getattr(settings, 'CART_SYNC_INTERVAL', 0)
+    if not force and time.time() - session.get(SYNCED_KEY, 0) < interval:
+        return False
+    get_backend().save(request.user, Cart(request).quantities())
+    session[DIRTY_KEY] = False
+    session[SYNCED_KEY] = time.time()
+    return True
+
+
+class CartSyncMiddleware:
+    """Persiste el carrito al terminar la petición (escritura diferida)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        session = getattr(request, 'session', None)
+        # Solo si la petición ya cargó la sesión: revisar no cuesta consultas
+        if session is not None and session.accessed and hasattr(request, 'user'):
+            sync_cart(request)
+        return response
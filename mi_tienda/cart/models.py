@@ -1,5 +1,5 @@
-# El carrito se manejará con sesiones, no necesitamos modelos específicos
-# Pero podríamos agregar un modelo para persistir carritos si fuera necesario
+# El carrito se usa desde la sesión; estos modelos guardan la copia de cada
+# usuario (ver ``backends.DatabaseCartBackend``)
 from django.db import models
 from django.contrib.auth.models import User
 from products.models import Product
@@ -7,7 +7,7 @@ from django.conf import settings
 
 
 class Cart(models.Model):
-    """Modelo opcional para persistir carritos en base de datos"""
+    """Carrito guardado de un usuario"""
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='cart')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
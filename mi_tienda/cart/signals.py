@@ -0,0 +1,31 @@
+import time
+
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.dispatch import receiver
+
+from .backends import get_backend
+from .cart import DIRTY_KEY, SYNCED_KEY, Cart
+from .middleware import sync_cart
+
+
+@receiver(user_logged_in)
+def merge_stored_cart(sender, request, user, **kwargs):
+    """Fusiona el carrito anónimo de la sesión con el guardado del usuario"""
+    if request is None or not hasattr(request, 'session'):
+        return
+    backend = get_backend()
+    stored = backend.load(user)
+    cart = Cart(request)
+    cart.merge(stored)
+    quantities = cart.quantities()
+    if quantities != stored:
+        backend.save(user, quantities)
+    request.session[DIRTY_KEY] = False
+    request.session[SYNCED_KEY] = time.time()
+
+
+@receiver(user_logged_out)
+def flush_cart_on_logout(sender, request, user, **kwargs):
+    """La sesión se borra al salir: guardar antes lo pendiente"""
+    if request is not None and user is not None and hasattr(request, 'session'):
+        sync_cart(request, force=True)
@@ -1,8 +1,18 @@
-from django.test import TestCase
+from unittest import mock
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, RequestFactory, override_settings
+from django.contrib.sessions.middleware import SessionMiddleware
 from django.contrib.auth import get_user_model
 from products.models import Product, Category
+from cart.backends import DatabaseCartBackend
 from cart.models import Cart, CartItem
+from cart.cart import CART_FORMAT, Cart as SessionCart, decode_cart
+from cart.context_processors import cart_total_amount
+from products.models import CatalogVersion
+from products.pricing import PRICES, get_price_version
 from decimal import Decimal
+import json
 
 User = get_user_model()
 
@@ -35,3 +45,195 @@ class CartTest(TestCase):
     def test_remove_item(self):
         self.cart_item.delete()
         self.assertEqual(self.cart.items.count(), 0)
+
+
+class SessionCartTest(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Calzado")
+        self.product = Product.objects.create(
+            name="Adidas Running",
+            description="Zapatillas de running",
+            unit_price=Decimal('300000.00'),
+            stock=20,
+            category=self.category
+        )
+        self.request = RequestFactory().get('/')
+        SessionMiddleware(lambda request: None).process_request(self.request)
+
+    def test_cart_is_loaded_once_per_request(self):
+        SessionCart(self.request).add(self.product, quantity=2)
+        with self.assertNumQueries(1):
+            context = cart_total_amount(self.request)
+            cart = SessionCart(self.request)
+            self.assertTrue(cart)
+            self.assertEqual(len(list(cart)), 1)
+            self.assertEqual(context['cart_total_items'](), 2)
+            self.assertEqual(context['cart_total_price'](), Decimal('714000.00'))
+
+    def test_context_processor_is_lazy(self):
+        SessionCart(self.request).add(self.product)
+        with self.assertNumQueries(0):
+            cart_total_amount(self.request)
+
+    def test_add_invalidates_snapshot(self):
+        cart = SessionCart(self.request)
+        cart.add(self.product)
+        self.assertEqual(cart.get_total_items(), 1)
+        cart.add(self.product, quantity=3)
+        self.assertEqual(cart.get_total_items(), 4)
+        cart.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(cart.get_total_items(), 0)
+
+    def test_unchanged_cart_does_not_write_session(self):
+        SessionCart(self.request).add(self.product, quantity=2)
+        self.request.session.modified = False
+        cart = SessionCart(self.request)
+        cart.add(self.product, quantity=2, override_quantity=True)
+        cart.remove(Product(pk=self.product.pk + 1))
+        self.assertFalse(self.request.session.modified)
+        self.assertEqual(self.request.session['cart']['q'], {str(self.product.pk): 2})
+
+    def test_totals_use_pinned_prices_without_queries(self):
+        SessionCart(self.request).add(self.product, quantity=2)
+        # La versión de precios se lee una vez por petición
+        get_price_version(self.request)
+        with self.assertNumQueries(0):
+            cart = SessionCart(self.request)
+            self.assertEqual(cart.get_total_price(), Decimal('714000.00'))
+            self.assertEqual(cart.get_total_items(), 2)
+
+    def test_price_change_in_another_process_is_noticed(self):
+        SessionCart(self.request).add(self.product, quantity=2)
+        self.assertEqual(SessionCart(self.request).get_total_price(), Decimal('714000.00'))
+        # Otro proceso (una importación) cambia el precio sin pasar por la caché de este
+        Product.objects.filter(pk=self.product.pk).update(
+            unit_price=Decimal('100000.00'), price_version=F('price_version') + 1,
+        )
+        CatalogVersion.objects.get_or_create(name=PRICES)
+        CatalogVersion.objects.filter(name=PRICES).update(value=F('value') + 1)
+        request = RequestFactory().get('/')
+        request.session = self.request.session
+        self.assertEqual(SessionCart(request).get_total_price(), Decimal('238000.00'))
+
+    def test_price_change_reprices_only_stale_lines(self):
+        cap = Product.objects.create(name="Gorra", description="-", unit_price=Decimal('100.00'),
+                                     stock=5, category=self.category)
+        cart = SessionCart(self.request)
+        cart.add(self.product)
+        cart.add(cap)
+        self.product.unit_price = Decimal('200000.00')
+        self.product.save()
+        cart = SessionCart(self.request)
+        # Versión vigente y una consulta con las líneas del carrito
+        with self.assertNumQueries(2):
+            self.assertEqual(cart.refresh_prices(), [self.product.pk])
+        cart = SessionCart(self.request)
+        self.assertEqual(cart.get_total_price(), Decimal('238119.00'))
+        self.assertEqual([item.price for item in cart], [Decimal('238000.00'), Decimal('119.00')])
+        self.assertEqual(cart.refresh_prices(), [])
+
+    def test_legacy_session_cart_is_migrated_on_change(self):
+        self.request.session['cart'] = {
+            str(self.product.pk): {'quantity': 2, 'price': '1.00', 'product_id': str(self.product.pk),
+                                   'product_name': "Adidas Running"},
+        }
+        cart = SessionCart(self.request)
+        # El precio viejo de la sesión ya no se usa: manda el del producto
+        self.assertEqual(cart.get_total_price(), Decimal('714000.00'))
+        cart.add(self.product)
+        self.assertEqual(self.request.session['cart']['v'], CART_FORMAT)
+        self.assertEqual(decode_cart(self.request.session['cart'])[0], {self.product.pk: 3})
+
+
+class PersistentCartTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="kevin", password="123456")
+        self.category = Category.objects.create(name="Calzado")
+        self.shoes, self.cap = [
+            Product.objects.create(name=name, description="-", unit_price=Decimal('1000.00'),
+                                   stock=20, category=self.category)
+            for name in ("Tenis", "Gorra")
+        ]
+
+    def stored(self):
+        return dict(CartItem.objects.filter(cart__user=self.user).values_list('product_id', 'quantity'))
+
+    def test_changes_are_written_behind_and_flushed_on_logout(self):
+        self.client.force_login(self.user)
+        self.client.post(f'/cart/add/{self.shoes.pk}/', {'quantity': 2})
+        self.assertEqual(self.stored(), {self.shoes.pk: 2})
+        with override_settings(CART_SYNC_INTERVAL=60):
+            self.client.post(f'/cart/add/{self.cap.pk}/', {'quantity': 1})
+            self.client.post(f'/cart/remove/{self.shoes.pk}/')
+            # Dentro del intervalo los cambios esperan en la sesión
+            self.assertEqual(self.stored(), {self.shoes.pk: 2})
+            self.client.post('/users/logout/')
+        self.assertEqual(self.stored(), {self.cap.pk: 1})
+
+    def test_login_merges_anonymous_cart_with_stored_cart(self):
+        stored = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=stored, product=self.shoes, quantity=3)
+        session = self.client.session
+        session['cart'] = {
+            str(self.shoes.pk): {'quantity': 1, 'price': '1190.00', 'product_id': str(self.shoes.pk),
+                                 'product_name': "Tenis"},
+            str(self.cap.pk): {'quantity': 2, 'price': '1190.00', 'product_id': str(self.cap.pk),
+                               'product_name': "Gorra"},
+        }
+        session.save()
+        self.client.login(username="kevin", password="123456")
+        expected = {self.shoes.pk: 3, self.cap.pk: 2}
+        self.assertEqual(decode_cart(self.client.session['cart'])[0], expected)
+        self.assertEqual(self.stored(), expected)
+
+    def test_save_without_conflict_target(self):
+        # MySQL: sin ``unique_fields``, insert de las líneas nuevas y update de las cambiadas
+        backend = DatabaseCartBackend()
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False):
+            backend.save(self.user, {self.shoes.pk: 2})
+            backend.save(self.user, {self.shoes.pk: 5, self.cap.pk: 1})
+        self.assertEqual(self.stored(), {self.shoes.pk: 5, self.cap.pk: 1})
+
+
+class CartBatchTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="kevin", password="123456")
+        self.client.force_login(self.user)
+        self.category = Category.objects.create(name="Calzado")
+        self.products = [
+            Product.objects.create(name=f"Tenis {i}", description="-", unit_price=Decimal('1000.00'),
+                                   stock=5, category=self.category)
+            for i in range(3)
+        ]
+
+    def batch(self, *operations):
+        return self.client.post('/cart/batch/', json.dumps({'operations': list(operations)}),
+                                content_type='application/json')
+
+    def test_many_operations_in_one_request(self):
+        a, b, c = [p.pk for p in self.products]
+        self.batch({'op': 'add', 'product_id': c})
+        response = self.batch(
+            {'op': 'add', 'product_id': a, 'quantity': 2},
+            {'op': 'add', 'product_id': a},
+            {'op': 'set', 'product_id': b, 'quantity': 4},
+            {'op': 'remove', 'product_id': c},
+        )
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual({item['product_id']: item['quantity'] for item in data['items']}, {a: 3, b: 4})
+        self.assertEqual(data['total_items'], 7)
+        self.assertEqual(data['total'], '8330.00')
+
+    def test_failed_operation_leaves_cart_untouched(self):
+        a, b, _ = [p.pk for p in self.products]
+        self.batch({'op': 'add', 'product_id': a})
+        response = self.batch(
+            {'op': 'set', 'product_id': a, 'quantity': 2},
+            {'op': 'add', 'product_id': b, 'quantity': 6},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.json()['errors']], [1])
+        self.assertEqual(decode_cart(self.client.session['cart'])[0], {a: 1})
+        self.assertEqual(self.batch({'op': 'explode', 'product_id': a}).status_code, 400)
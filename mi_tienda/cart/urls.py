@@ -8,4 +8,5 @@ urlpatterns = [
     path('add/<int:product_id>/', views.cart_add, name='cart_add'),
     path('remove/<int:product_id>/', views.cart_remove, name='cart_remove'),
     path('clear/', views.cart_clear, name='cart_clear'),
+    path('batch/', views.cart_batch, name='cart_batch'),
 ]
\ No newline at end of file
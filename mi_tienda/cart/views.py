@@ -1,9 +1,12 @@
-from decimal import Decimal
+import json
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.views.decorators.http import require_POST
+from products import money
 from products.models import Product
+from promotions.engine import evaluate_cart, get_coupon
+from .batch import BatchError, apply_operations, parse_operations, summarize
 from .cart import Cart
 from .forms import CartAddProductForm
 
@@ -39,39 +42,30 @@ def cart_remove(request, product_id):
 @login_required
 def cart_detail(request):
     cart = Cart(request)
+    repriced = cart.refresh_prices()
+    if repriced:
+        messages.info(request, 'Algunos precios de tu carrito cambiaron desde que agregaste los productos')
     
-    # Inicializar totales
-    subtotal = Decimal('0.00')
-    total_iva = Decimal('0.00')
-    valid_items = []
-    
-    # Filtrar solo items válidos
-    for item in cart:
-        if hasattr(item, 'product') and hasattr(item.product, 'unit_price'):
-            product = item.product
-            quantity = item.quantity
-            
-            # Calcular valores
-            item_subtotal = product.unit_price * quantity
-            item_iva = product.iva_amount * quantity
-            
-            # Agregar información al item
-            item.unit_price = product.unit_price
-            item.iva_amount = product.iva_amount
-            item.subtotal = item_subtotal
-            item.iva_total = item_iva
-            
-            # Acumular totales
-            subtotal += item_subtotal
-            total_iva += item_iva
-            
-            valid_items.append(item)
-    
-    total = subtotal + total_iva
+    # Totales de todas las líneas en una pasada (ver ``products.money``)
+    valid_items = list(cart)
+    totals = money.compute((item.line for item in valid_items), per_line=True)
+    # Descuentos de las promociones, cacheados por versión del carrito
+    evaluation = evaluate_cart(cart)
+    for item, (item_subtotal, item_iva) in zip(valid_items, totals.lines):
+        item.subtotal = money.from_cents(item_subtotal)
+        item.iva_total = money.from_cents(item_iva)
+        item.discount = money.from_cents(evaluation.lines.get(item.product.pk, (0,))[0])
+    subtotal = money.from_cents(totals.subtotal)
+    discount = money.from_cents(evaluation.discount)
+    total_iva = money.from_cents(totals.iva - evaluation.iva)
+    total = money.from_cents(totals.total - evaluation.total)
     
     context = {
         'cart': valid_items,  # Usar solo items válidos
         'subtotal': subtotal,
+        'discount': discount,
+        'promotions': evaluation.promotions,
+        'coupon': get_coupon(request),
         'total_iva': total_iva,
         'total': total,
         'cart_total_items': len(valid_items),
@@ -121,4 +115,24 @@ def cart_add(request, product_id):
         })
     
     messages.error(request, 'Error al agregar el producto al carrito')
-    return redirect('products:product_detail', pk=product_id)
\ No newline at end of file
+    return redirect('products:product_detail', pk=product_id)
+
+@require_POST
+@login_required
+def cart_batch(request):
+    """Aplica varias operaciones add/set/remove (JSON) y devuelve los totales.
+
+    Cuerpo: ``{"operations": [{"op": "add", "product_id": 3, "quantity": 2}, ...]}``.
+    Todo o nada: si una operación falla el carrito queda igual.
+    """
+    try:
+        operations = parse_operations(json.loads(request.body or b'null'))
+        cart = Cart(request)
+        snapshot = apply_operations(cart, operations)
+    except ValueError:
+        return JsonResponse({'success': False, 'errors': [
+            {'index': None, 'product_id': None, 'message': 'JSON inválido'}
+        ]}, status=400)
+    except BatchError as error:
+        return JsonResponse({'success': False, 'errors': error.errors}, status=400)
+    return JsonResponse({'success': True, **summarize(snapshot, evaluate_cart(cart))})
@@ -15,6 +15,29 @@ ALLOWED_HOSTS = config('ALLOWED_HOSTS', default='localhost,127.0.0.1', cast=lamb
 
 # Configuración del carrito
 CART_SESSION_ID = 'cart'
+# Copia persistente del carrito de cada usuario (ver cart/backends.py) y
+# segundos mínimos entre escrituras; 0 = al final de cada petición que lo cambie
+CART_BACKEND = config('CART_BACKEND', default='cart.backends.DatabaseCartBackend')
+CART_SYNC_INTERVAL = config('CART_SYNC_INTERVAL', default=0, cast=float)
+
+# Redondeo del IVA en carritos y pedidos: 'unit', 'line' o 'document' (ver products/money.py)
+IVA_ROUNDING = config('IVA_ROUNDING', default='unit')
+
+# Segundos que se aparta el stock de un pedido pendiente de pago
+STOCK_RESERVATION_TTL = config('STOCK_RESERVATION_TTL', default=15 * 60, cast=int)
+
+# Filas de contador de stock por producto (más filas = menos contención)
+STOCK_COUNTER_SHARDS = config('STOCK_COUNTER_SHARDS', default=1, cast=int)
+
+# Variantes de las imágenes de producto: anchos en px, calidad y procesos
+# que las codifican. Con PRODUCT_IMAGE_ASYNC=False se generan en la petición
+PRODUCT_IMAGE_WIDTHS = (320, 640, 1024)
+PRODUCT_IMAGE_QUALITY = config('PRODUCT_IMAGE_QUALITY', default=80, cast=int)
+PRODUCT_IMAGE_WORKERS = config('PRODUCT_IMAGE_WORKERS', default=2, cast=int)
+PRODUCT_IMAGE_ASYNC = config('PRODUCT_IMAGE_ASYNC', default=True, cast=bool)
+
+# Backend de búsqueda de productos (en MySQL: 'products.search.MySQLFulltextBackend')
+PRODUCT_SEARCH_BACKEND = config('PRODUCT_SEARCH_BACKEND', default='products.search.InvertedIndexBackend')
 
 
 AUTH_USER_MODEL = 'users.CustomUser'
@@ -28,11 +51,13 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'rest_framework',
     # Apps locales
     'users',
     'products',
     'cart',
     'orders',
+    'promotions',
 ]
 
 MIDDLEWARE = [
@@ -41,6 +66,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'cart.middleware.CartSyncMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -78,6 +104,28 @@ DATABASES = {
     }
 }
 
+# Caché
+# La caché del catálogo funciona sin servicios externos: memoria local por
+# defecto o archivos en disco (compartida entre procesos) con
+# CATALOG_CACHE_BACKEND=file.
+CATALOG_CACHE_ALIAS = 'catalog'
+CATALOG_CACHE_TIMEOUT = config('CATALOG_CACHE_TIMEOUT', default=300, cast=int)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalog': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalog',
+    },
+}
+if config('CATALOG_CACHE_BACKEND', default='locmem') == 'file':
+    CACHES['catalog'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('CATALOG_CACHE_LOCATION', default=str(BASE_DIR / 'cache' / 'catalog')),
+    }
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -117,6 +165,26 @@ LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'products:home'
 LOGOUT_REDIRECT_URL = 'users:login'
 
+# API de solo lectura del catálogo (ver products/api.py): pública y solo JSON,
+# sin sesión para que consultarla seguido no toque la tabla de sesiones
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+    'DEFAULT_AUTHENTICATION_CLASSES': [],
+    'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.AllowAny'],
+    'UNAUTHENTICATED_USER': None,
+    'DEFAULT_VERSIONING_CLASS': 'rest_framework.versioning.NamespaceVersioning',
+    'ALLOWED_VERSIONS': ['v1'],
+}
+
+# Autocompletado del buscador: snapshot compartido entre procesos y cada
+# cuántos segundos un proceso revisa si otro lo cambió (ver products/autocomplete.py)
+AUTOCOMPLETE_SNAPSHOT = config('AUTOCOMPLETE_SNAPSHOT', default=str(BASE_DIR / 'cache' / 'autocomplete.pickle'))
+AUTOCOMPLETE_CHECK_INTERVAL = config('AUTOCOMPLETE_CHECK_INTERVAL', default=1.0, cast=float)
+
+# Feed de cambios: segundos que se espera antes de servir un cambio, para no
+# saltarse transacciones que confirman tarde (ver products/changes.py)
+CATALOG_CHANGES_LAG = config('CATALOG_CHANGES_LAG', default=5, cast=float)
+
 # Session settings for cart
 CART_SESSION_ID = 'cart'
 SESSION_COOKIE_AGE = 86400  # 24 horas
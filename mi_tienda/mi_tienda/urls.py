@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from products.views import serve_blob
 
 urlpatterns = [
     # Panel de administración
@@ -18,6 +19,15 @@ urlpatterns = [
     
     # URLs de la aplicación de pedidos
     path('orders/', include('orders.urls', namespace='orders')),
+
+    # Cupones de descuento del carrito
+    path('promotions/', include('promotions.urls', namespace='promotions')),
+
+    # API JSON de solo lectura del catálogo
+    path('api/v1/', include('products.api_urls', namespace='v1')),
+
+    # Imágenes direccionadas por contenido (caché inmutable, ver products/storage.py)
+    path(f'{settings.MEDIA_URL.strip("/")}/blobs/<path:path>', serve_blob, name='media_blob'),
 ]
 
 # Servir archivos multimedia en desarrollo
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Order, OrderItem
+from .models import Order, OrderItem, StockReservation
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
@@ -35,7 +35,7 @@ class OrderAdmin(admin.ModelAdmin):
             'fields': ('payment_status', 'get_payment_status_display', 'payment_method', 'payment_date', 'transaction_id')
         }),
         ('Totales', {
-            'fields': ('subtotal', 'iva_total', 'total')
+            'fields': ('subtotal', 'discount', 'coupon', 'iva_total', 'total')
         }),
         ('Información de Envío', {
             'fields': ('shipping_address', 'shipping_city', 'shipping_zipcode', 'shipping_country', 'phone_number', 'notes')
@@ -69,4 +69,10 @@ class OrderItemAdmin(admin.ModelAdmin):
 
     def get_iva_amount(self, obj):
         return f"${obj.get_iva_amount:,.2f}"
-    get_iva_amount.short_description = 'IVA'
\ No newline at end of file
+    get_iva_amount.short_description = 'IVA'
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ['order', 'product', 'quantity', 'status', 'created_at', 'expires_at']
+    list_filter = ['status', 'expires_at']
+    raw_id_fields = ['order', 'product']
@@ -0,0 +1,71 @@
+"""Pipeline de checkout: del carrito al pedido en una sola transacción."""
+from django.db import transaction
+
+from products import money
+
+from .models import OrderItem
+from .reservations import reserve_stock
+
+
+class EmptyCartError(Exception):
+    pass
+
+
+def compute_totals(cart_items, evaluation=None):
+    """Subtotal, descuento, IVA y total del carrito en una sola pasada en centavos.
+
+    ``evaluation`` es el resultado de ``promotions.engine.evaluate_cart``;
+    el descuento se resta del subtotal y su IVA del IVA (ver ``products.money``).
+    """
+    totals = money.compute(item.line for item in cart_items)
+    discount = evaluation.discount if evaluation else 0
+    discount_iva = evaluation.iva if evaluation else 0
+    return {
+        'subtotal': money.from_cents(totals.subtotal),
+        'discount': money.from_cents(discount),
+        'total_iva': money.from_cents(totals.iva - discount_iva),
+        'total': money.from_cents(totals.total - discount - discount_iva),
+        'promotions': evaluation.promotions if evaluation else (),
+    }
+
+
+def build_order_items(order, cart_items):
+    """OrderItem con los precios ya resueltos (``bulk_create`` no llama a ``save``)"""
+    return [
+        OrderItem(
+            order=order,
+            product=item.product,
+            quantity=item.quantity,
+            price=item.price,
+            unit_price=item.unit_price,
+            iva_percentage=item.iva_percentage,
+        )
+        for item in cart_items
+    ]
+
+
+def place_order(order, cart, evaluation=None):
+    """Guarda ``order`` y sus items a partir de ``cart`` de forma atómica.
+
+    ``cart`` puede ser un ``cart.cart.Cart`` o cualquier iterable de
+    ``CartItem``; se recorre una sola vez y los items se insertan con un
+    único ``bulk_create``. El stock de todas las líneas se reserva en la
+    misma transacción (ver ``reservations``); si alguna no alcanza se lanza
+    ``InsufficientStock`` y no se crea nada. ``evaluation`` son los
+    descuentos de ``promotions`` ya calculados para el carrito.
+    """
+    cart_items = list(cart)
+    if not cart_items:
+        raise EmptyCartError
+
+    totals = compute_totals(cart_items, evaluation)
+    order.subtotal = totals['subtotal']
+    order.discount = totals['discount']
+    order.iva_total = totals['total_iva']
+    order.total = totals['total']
+
+    with transaction.atomic():
+        order.save()
+        reserve_stock(order, ((item.product.pk, item.quantity) for item in cart_items))
+        OrderItem.objects.bulk_create(build_order_items(order, cart_items))
+    return order
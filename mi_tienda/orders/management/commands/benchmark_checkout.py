@@ -0,0 +1,71 @@
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from cart.cart import CartItem
+from orders.checkout import compute_totals, place_order
+from orders.models import Order, OrderItem
+from products.models import Category, Product
+from products.stock import set_stock
+
+
+class Command(BaseCommand):
+    help = 'Compara el checkout item por item con el pipeline bulk (round trips y latencia)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 40, 100])
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(username=f'benchmark-{time.time()}')
+            category = Category.objects.create(name=f'benchmark-{time.time()}')
+            Product.objects.bulk_create([
+                Product(name=f'Producto {i}', description='-', unit_price=Decimal('1000.00'), category=category)
+                for i in range(max(options['sizes']))
+            ])
+            products = list(category.products.order_by('pk'))
+            set_stock({product.pk: 10 ** 6 for product in products})
+
+            self.stdout.write(f'{"líneas":>7} {"legado (consultas / ms)":>26} {"bulk (consultas / ms)":>24}')
+            for size in options['sizes']:
+                cart_items = [CartItem(product, 2, product.price_with_iva) for product in products[:size]]
+                legacy = self.measure(self.legacy_checkout, user, cart_items, options['repeat'])
+                bulk = self.measure(self.bulk_checkout, user, cart_items, options['repeat'])
+                self.stdout.write(
+                    f'{size:>7} {legacy[0]:>15} / {legacy[1]:>8.2f} {bulk[0]:>13} / {bulk[1]:>8.2f}'
+                )
+            # No dejar datos sintéticos en la base de datos
+            transaction.set_rollback(True)
+
+    def measure(self, checkout, user, cart_items, repeat):
+        elapsed = 0
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                checkout(Order(user=user), cart_items)
+                elapsed += time.perf_counter() - start
+        return len(queries), elapsed / repeat * 1000
+
+    def legacy_checkout(self, order, cart_items):
+        """Implementación anterior: dos pasadas y un INSERT por línea"""
+        totals = compute_totals(cart_items)
+        order.subtotal = totals['subtotal']
+        order.iva_total = totals['total_iva']
+        order.total = totals['total']
+        order.save()
+        for item in cart_items:
+            OrderItem.objects.create(
+                order=order,
+                product=item.product,
+                quantity=item.quantity,
+                price=item.product.price_with_iva,
+                unit_price=item.product.unit_price,
+                iva_percentage=item.product.iva_percentage
+            )
+
+    def bulk_checkout(self, order, cart_items):
+        place_order(order, cart_items)
@@ -0,0 +1,45 @@
+import timeit
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from cart.cart import CartItem
+from orders.checkout import compute_totals
+from products import money
+from products.models import Product
+
+
+def legacy_totals(cart_items):
+    """Implementación anterior: suma de ``Decimal`` línea por línea"""
+    subtotal = Decimal('0.00')
+    total_iva = Decimal('0.00')
+    for item in cart_items:
+        subtotal += item.unit_price * item.quantity
+        total_iva += item.iva_amount * item.quantity
+    return {'subtotal': subtotal, 'total_iva': total_iva, 'total': subtotal + total_iva}
+
+
+class Command(BaseCommand):
+    help = 'Compara los totales con Decimal línea por línea contra el motor en centavos (µs por carrito)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 50, 500])
+        parser.add_argument('--repeat', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        products = []
+        for i in range(max(options['sizes'])):
+            product = Product(pk=i + 1, unit_price=Decimal('1000.00') + i, iva_percentage=Decimal('19.00'))
+            product.update_prices()
+            products.append(product)
+
+        self.stdout.write(f'{"líneas":>7} {"Decimal (µs)":>13} {"centavos (µs)":>14} {"compute (µs)":>13}')
+        for size in options['sizes']:
+            cart_items = [CartItem(product, 3) for product in products[:size]]
+            lines = [item.line for item in cart_items]
+            assert legacy_totals(cart_items) == compute_totals(cart_items)
+            repeat = max(1, options['repeat'] // size)
+            legacy = timeit.timeit(lambda: legacy_totals(cart_items), number=repeat) / repeat
+            engine = timeit.timeit(lambda: compute_totals(cart_items), number=repeat) / repeat
+            raw = timeit.timeit(lambda: money.compute(lines), number=repeat) / repeat
+            self.stdout.write(f'{size:>7} {legacy * 1e6:>13.1f} {engine * 1e6:>14.1f} {raw * 1e6:>13.1f}')
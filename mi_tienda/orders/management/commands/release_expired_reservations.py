@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+from orders.reservations import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = 'Libera en bloque las reservas de stock vencidas (ejecutar periódicamente, p. ej. con cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Si es mayor que 0, repite el barrido cada N segundos')
+
+    def handle(self, *args, **options):
+        while True:
+            released = release_expired_reservations(batch_size=options['batch_size'])
+            self.stdout.write(f'{released} reservas liberadas')
+            if options['interval'] <= 0:
+                return
+            time.sleep(options['interval'])
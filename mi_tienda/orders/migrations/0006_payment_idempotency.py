@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def empty_transaction_ids_to_null(apps, schema_editor):
+    # Los pedidos sin pagar tenían '' y el índice único no admite repetidos
+    Order = apps.get_model('orders', 'Order')
+    Order.objects.filter(transaction_id='').update(transaction_id=None)
+
+
+def null_transaction_ids_to_empty(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    Order.objects.filter(transaction_id=None).update(transaction_id='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_coupon_order_discount'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='transaction_id',
+            field=models.CharField(blank=True, max_length=100, null=True, verbose_name='ID de transacción'),
+        ),
+        migrations.RunPython(empty_transaction_ids_to_null, null_transaction_ids_to_empty),
+        migrations.AlterField(
+            model_name='order',
+            name='transaction_id',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True, verbose_name='ID de transacción'),
+        ),
+        migrations.CreateModel(
+            name='PaymentAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True, verbose_name='Clave de idempotencia')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payment_attempts', to='orders.order', verbose_name='Pedido')),
+            ],
+            options={
+                'verbose_name': 'Intento de pago',
+                'verbose_name_plural': 'Intentos de pago',
+            },
+        ),
+    ]
@@ -1,10 +1,8 @@
 from django.db import models
 from django.conf import settings
-from django.utils import timezone
+from products import money
 from products.models import Product
 from decimal import Decimal
-import random
-import string
 
 class Order(models.Model):
     STATUS_CHOICES = [
@@ -38,10 +36,13 @@ class Order(models.Model):
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHODS, blank=True, verbose_name="Método de pago")
     payment_status = models.BooleanField(default=False, verbose_name="Estado de pago")
     payment_date = models.DateTimeField(null=True, blank=True, verbose_name="Fecha de pago")
-    transaction_id = models.CharField(max_length=100, blank=True, verbose_name="ID de transacción")
+    # Único (``NULL`` mientras no se paga) y ordenable por fecha, ver ``payments.new_transaction_id``
+    transaction_id = models.CharField(max_length=100, unique=True, null=True, blank=True, verbose_name="ID de transacción")
     
     # Totales
     subtotal = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Subtotal")
+    discount = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Descuento")
+    coupon = models.CharField(max_length=32, blank=True, verbose_name="Cupón")
     iva_total = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="IVA total")
     total = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Total")
     
@@ -61,6 +62,8 @@ class Order(models.Model):
             models.Index(fields=['created_at']),
             models.Index(fields=['status']),
             models.Index(fields=['user', 'created_at']),
+            # Recorrido de pedidos pagados de ``build_recommendations``
+            models.Index(fields=['payment_date', 'id']),
         ]
 
     def __str__(self):
@@ -78,21 +81,18 @@ class Order(models.Model):
         return colors.get(self.status, 'bg-gray-100 text-gray-800')
 
     def generate_transaction_id(self):
-        """Genera un ID de transacción único"""
+        """Genera un ID de transacción único si el pedido no tiene uno"""
+        from .payments import new_transaction_id
+
         if not self.transaction_id:
-            timestamp = timezone.now().strftime('%Y%m%d%H%M%S')
-            random_str = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-            self.transaction_id = f'TX-{timestamp}-{random_str}'
+            self.transaction_id = new_transaction_id()
         return self.transaction_id
 
-    def mark_as_paid(self, payment_method):
-        """Marca el pedido como pagado"""
-        self.status = 'paid'
-        self.payment_status = True
-        self.payment_method = payment_method
-        self.payment_date = timezone.now()
-        self.generate_transaction_id()
-        self.save()
+    def mark_as_paid(self, payment_method, key=None):
+        """Marca el pedido como pagado si sigue pendiente (ver ``payments.pay_order``)"""
+        from .payments import pay_order
+
+        return pay_order(self, key, payment_method)
 
     def get_payment_status_display(self):
         """Texto descriptivo del estado de pago"""
@@ -126,6 +126,11 @@ class OrderItem(models.Model):
     def get_cost(self):
         """Costo total del item (precio con IVA * cantidad)"""
         return self.price * self.quantity
+
+    @property
+    def total_price(self):
+        """Alias de ``get_cost``, igual que ``CartItem.total_price``"""
+        return self.get_cost
         
     @property
     def get_subtotal(self):
@@ -134,8 +139,13 @@ class OrderItem(models.Model):
         
     @property
     def get_iva_amount(self):
-        """Monto de IVA del item"""
-        return (self.unit_price * self.iva_percentage / 100) * self.quantity
+        """Monto de IVA del item, con el mismo redondeo que los totales del pedido"""
+        return money.from_cents(money.compute([self.line]).iva)
+
+    @property
+    def line(self):
+        """``(precio_unitario, tasa, cantidad)`` para ``money.compute``"""
+        return money.to_cents(self.unit_price), money.to_basis_points(self.iva_percentage), self.quantity
 
     def save(self, *args, **kwargs):
         """Auto-calcular precios si no están establecidos"""
@@ -145,4 +155,46 @@ class OrderItem(models.Model):
             self.unit_price = self.product.unit_price
         if not self.iva_percentage and self.product:
             self.iva_percentage = self.product.iva_percentage
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+class StockReservation(models.Model):
+    """Stock apartado para un pedido pendiente de pago, con vencimiento"""
+    STATUS_CHOICES = [
+        ('active', 'Activa'),
+        ('converted', 'Convertida en venta'),
+        ('released', 'Liberada'),
+    ]
+
+    order = models.ForeignKey(Order, related_name='reservations', on_delete=models.CASCADE, verbose_name="Pedido")
+    product = models.ForeignKey(Product, related_name='reservations', on_delete=models.CASCADE, verbose_name="Producto")
+    quantity = models.PositiveIntegerField(verbose_name="Cantidad")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active', verbose_name="Estado")
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(verbose_name="Vence")
+
+    class Meta:
+        verbose_name = "Reserva de stock"
+        verbose_name_plural = "Reservas de stock"
+        indexes = [
+            # Suma de reservas activas por producto resuelta solo con el índice
+            models.Index(fields=['product', 'status', 'expires_at', 'quantity']),
+            # Barrido de reservas vencidas
+            models.Index(fields=['status', 'expires_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.quantity} x {self.product_id} (Orden #{self.order_id}, {self.status})'
+
+
+class PaymentAttempt(models.Model):
+    """Clave de idempotencia de un pago ya realizado"""
+    key = models.CharField(max_length=64, unique=True, verbose_name="Clave de idempotencia")
+    order = models.ForeignKey(Order, related_name='payment_attempts', on_delete=models.CASCADE, verbose_name="Pedido")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Intento de pago"
+        verbose_name_plural = "Intentos de pago"
+
+    def __str__(self):
+        return f'{self.key} (Orden #{self.order_id})'
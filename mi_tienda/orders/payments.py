@@ -0,0 +1,76 @@
+"""Pago idempotente de pedidos.
+
+Cada formulario de pago lleva una clave de idempotencia. El pago es un solo
+``UPDATE`` condicionado a que el pedido siga pendiente: de dos peticiones
+simultáneas (doble clic, reintento del navegador) solo una cambia la fila y
+convierte las reservas; la otra no toca nada. La clave se guarda en
+``PaymentAttempt`` (índice único) junto con el pago, así un reenvío del
+mismo formulario se reconoce con una consulta aunque la sesión ya no tenga
+el pedido.
+"""
+import secrets
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Order, PaymentAttempt
+from .reservations import convert_reservations
+
+# Base32 de Crockford: sin I, L, O ni U, y en orden ASCII
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+
+
+class PaymentConflict(Exception):
+    """La clave de idempotencia ya se usó para pagar otro pedido"""
+
+
+def new_transaction_id(now=None):
+    """``TX-`` y 26 caracteres: 48 bits de milisegundos y 80 aleatorios (como un ULID).
+
+    El orden alfabético de los IDs es el orden en que se generaron.
+    """
+    now = now or timezone.now()
+    value = int(now.timestamp() * 1000) << 80 | secrets.randbits(80)
+    chars = []
+    for _ in range(26):
+        value, index = divmod(value, 32)
+        chars.append(ALPHABET[index])
+    return 'TX-' + ''.join(reversed(chars))
+
+
+def previous_payment(user, key):
+    """Pago ya hecho por ``user`` con la clave ``key``, o ``None``"""
+    if not key:
+        return None
+    return PaymentAttempt.objects.filter(key=key, order__user=user).select_related('order').first()
+
+
+def pay_order(order, key, payment_method=None):
+    """Marca ``order`` como pagado si sigue pendiente.
+
+    Devuelve ``True`` si este llamado lo pagó y ``False`` si ya estaba
+    pagado (reintento o petición concurrente), sin convertir las reservas
+    de nuevo. En los dos casos ``order`` queda con los datos guardados.
+    Lanza ``InsufficientStock`` si la reserva venció y ya no hay stock, y
+    ``PaymentConflict`` si ``key`` ya pagó otro pedido; en ambos no cambia nada.
+    """
+    now = timezone.now()
+    fields = {
+        'status': 'paid',
+        'payment_status': True,
+        'payment_date': now,
+        'transaction_id': new_transaction_id(now),
+        'updated_at': now,
+    }
+    if payment_method:
+        fields['payment_method'] = payment_method
+    try:
+        with transaction.atomic():
+            paid = Order.objects.filter(pk=order.pk, status='pending', payment_status=False).update(**fields)
+            if paid:
+                PaymentAttempt.objects.create(key=key or f'order-{order.pk}', order=order)
+                convert_reservations(order)
+    except IntegrityError:
+        raise PaymentConflict(key)
+    order.refresh_from_db(fields=['status', 'payment_status', 'payment_date', 'payment_method', 'transaction_id'])
+    return bool(paid)
@@ -0,0 +1,126 @@
+"""Reservas temporales de stock entre el checkout y el pago.
+
+Al crear el pedido se aparta el stock con una reserva que vence a los
+``STOCK_RESERVATION_TTL`` segundos. El stock disponible para la venta es
+``Product.stock`` menos la suma de reservas activas y vigentes, que se
+resuelve con el índice ``(product, status, expires_at, quantity)``. Al pagar
+la reserva se convierte (se descuenta el stock real) y las reservas vencidas
+se marcan como liberadas en bloque con ``release_expired_reservations``.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from products import cache as catalog_cache
+from products.stock import (
+    InsufficientStock, decrement_stock, get_stock, lock_stock, normalize_lines, shortages,
+)
+from .models import StockReservation
+
+
+def get_ttl():
+    return timedelta(seconds=getattr(settings, 'STOCK_RESERVATION_TTL', 15 * 60))
+
+
+def active_reservations(now=None):
+    return StockReservation.objects.filter(status='active', expires_at__gt=now or timezone.now())
+
+
+def reserved_quantities(product_ids, now=None, exclude_order=None):
+    """``{product_id: unidades reservadas}`` por reservas activas y vigentes"""
+    reservations = active_reservations(now).filter(product_id__in=list(product_ids))
+    if exclude_order is not None:
+        reservations = reservations.exclude(order=exclude_order)
+    return dict(
+        reservations.order_by().values('product_id')
+        .annotate(total=Sum('quantity'))
+        .values_list('product_id', 'total')
+    )
+
+
+def available_to_sell(product_ids, now=None):
+    """``{product_id: stock - reservas}`` para mostrar en el catálogo"""
+    product_ids = list(product_ids)
+    stock = get_stock(product_ids)
+    reserved = reserved_quantities(product_ids, now)
+    return {pk: max(units - reserved.get(pk, 0), 0) for pk, units in stock.items()}
+
+
+def _locked_available(quantities, exclude_order=None):
+    """Stock disponible con los contadores de stock bloqueados"""
+    stock = lock_stock(quantities.keys())
+    reserved = reserved_quantities(quantities.keys(), exclude_order=exclude_order)
+    return {pk: units - reserved.get(pk, 0) for pk, units in stock.items()}
+
+
+def reserve_stock(order, lines):
+    """Aparta ``lines`` para ``order`` (ya guardado).
+
+    Todo o nada: si alguna línea no alcanza lanza ``InsufficientStock`` sin
+    crear reservas. Los contadores de stock se bloquean mientras se comprueba
+    el disponible, así dos checkouts no pueden apartar las mismas unidades.
+    """
+    quantities = normalize_lines(lines)
+    if not quantities:
+        return []
+
+    with transaction.atomic():
+        failed = shortages(quantities, _locked_available(quantities))
+        if failed:
+            raise InsufficientStock(failed)
+        expires_at = timezone.now() + get_ttl()
+        return StockReservation.objects.bulk_create([
+            StockReservation(order=order, product_id=product_id, quantity=quantity, expires_at=expires_at)
+            for product_id, quantity in quantities.items()
+        ])
+
+
+def convert_reservations(order):
+    """Convierte las reservas de ``order`` en venta y descuenta el stock.
+
+    Si la reserva venció se vuelve a comprobar el disponible sin contar las
+    reservas de otros pedidos. Lanza ``InsufficientStock`` si ya no alcanza.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        reservations = list(order.reservations.select_for_update().exclude(status='converted'))
+        quantities = normalize_lines((r.product_id, r.quantity) for r in reservations)
+        if not quantities:
+            return 0
+
+        if any(r.status != 'active' or r.expires_at <= now for r in reservations):
+            failed = shortages(quantities, _locked_available(quantities, exclude_order=order))
+            if failed:
+                raise InsufficientStock(failed)
+
+        failed = decrement_stock(quantities)
+        if failed:
+            raise InsufficientStock(failed)
+        if any(units <= 0 for units in get_stock(quantities).values()):
+            # Un producto agotado cambia la faceta "En stock" cacheada del catálogo
+            transaction.on_commit(catalog_cache.bump_generation)
+        return StockReservation.objects.filter(
+            pk__in=[r.pk for r in reservations]
+        ).update(status='converted')
+
+
+def release_expired_reservations(now=None, batch_size=1000):
+    """Marca como liberadas las reservas vencidas, en lotes. Devuelve cuántas."""
+    now = now or timezone.now()
+    released = 0
+    while True:
+        batch = list(
+            StockReservation.objects.filter(status='active', expires_at__lte=now)
+            .order_by('expires_at')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not batch:
+            return released
+        released += StockReservation.objects.filter(pk__in=batch, status='active').update(status='released')
+
+
+def release_order_reservations(order):
+    return order.reservations.filter(status='active').update(status='released')
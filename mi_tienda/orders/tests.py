@@ -1,8 +1,16 @@
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from products import cache as catalog_cache
 from products.models import Product, Category
-from orders.models import Order, OrderItem
+from orders.models import Order, OrderItem, PaymentAttempt
+from orders.checkout import place_order
+from orders.payments import PaymentConflict, new_transaction_id, pay_order
+from orders.reservations import available_to_sell, convert_reservations, release_expired_reservations
+from products.stock import InsufficientStock
+from cart.cart import CartItem
+from datetime import timedelta
 from decimal import Decimal
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -41,3 +49,159 @@ class OrderTest(TestCase):
     def test_order_total_calculation(self):
         total = sum(item.total_price for item in [self.order_item])
         self.assertEqual(total, self.order_item.price * self.order_item.quantity)
+
+
+class CheckoutTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="kevin", password="123456")
+        self.category = Category.objects.create(name="Calzado")
+        self.products = [
+            Product.objects.create(
+                name=f"Producto {i}",
+                description="Calzado",
+                unit_price=Decimal('100000.00'),
+                iva_percentage=Decimal('19.00'),
+                stock=10,
+                category=self.category
+            )
+            for i in range(5)
+        ]
+
+    def test_place_order_inserts_all_items_at_once(self):
+        cart_items = [CartItem(product, 2, product.price_with_iva) for product in self.products]
+        order = Order(user=self.user)
+        # Constante: pedido, stock y reservas (2 SELECT + INSERT), items y savepoints
+        with self.assertNumQueries(9):
+            place_order(order, cart_items)
+        self.assertEqual(order.items.count(), 5)
+        self.assertEqual(order.subtotal, Decimal('1000000.00'))
+        self.assertEqual(order.iva_total, Decimal('190000.00'))
+        self.assertEqual(order.total, Decimal('1190000.00'))
+
+    def test_order_create_view(self):
+        self.client.force_login(self.user)
+        for product in self.products[:2]:
+            self.client.post(f'/cart/add/{product.id}/', {'quantity': 1})
+        response = self.client.post('/orders/create/', {
+            'shipping_address': 'Calle 1',
+            'phone_number': '300000000',
+        })
+        self.assertRedirects(response, '/orders/payment/method/')
+        order = Order.objects.get(user=self.user)
+        self.assertEqual(order.items.count(), 2)
+        self.assertEqual(order.total, Decimal('238000.00'))
+
+    def test_insufficient_stock_creates_nothing(self):
+        cart_items = [CartItem(product, 2, product.price_with_iva) for product in self.products]
+        cart_items.append(CartItem(self.products[0], 9, self.products[0].price_with_iva))
+        with self.assertRaises(InsufficientStock) as cm:
+            place_order(Order(user=self.user), cart_items)
+        self.assertEqual(cm.exception.failed, {self.products[0].pk: 10})
+        self.assertFalse(Order.objects.exists())
+        self.products[1].refresh_from_db()
+        self.assertEqual(self.products[1].stock, 10)
+
+
+class StockReservationTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="kevin", password="123456")
+        self.category = Category.objects.create(name="Calzado")
+        self.product = Product.objects.create(
+            name="New Balance",
+            description="Calzado cómodo",
+            unit_price=Decimal('200000.00'),
+            stock=5,
+            category=self.category
+        )
+
+    def checkout(self, quantity):
+        return place_order(Order(user=self.user), [CartItem(self.product, quantity, self.product.price_with_iva)])
+
+    def test_checkout_holds_stock_until_payment(self):
+        order = self.checkout(3)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+        self.assertEqual(available_to_sell([self.product.pk]), {self.product.pk: 2})
+        with self.assertRaises(InsufficientStock):
+            self.checkout(3)
+
+        convert_reservations(order)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 2)
+        self.assertEqual(available_to_sell([self.product.pk]), {self.product.pk: 2})
+
+    def test_selling_out_invalidates_the_catalog_cache(self):
+        order = self.checkout(5)
+        generation = catalog_cache.get_generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            convert_reservations(order)
+        self.assertGreater(catalog_cache.get_generation(), generation)
+
+    def test_expired_reservations_are_released(self):
+        order = self.checkout(5)
+        later = timezone.now() + timedelta(hours=1)
+        self.assertEqual(available_to_sell([self.product.pk], now=later), {self.product.pk: 5})
+        self.assertEqual(release_expired_reservations(now=later), 1)
+        self.assertFalse(order.reservations.filter(status='active').exists())
+
+
+class PaymentTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="kevin", password="123456")
+        self.client.force_login(self.user)
+        self.category = Category.objects.create(name="Calzado")
+        self.product = Product.objects.create(
+            name="New Balance",
+            description="Calzado cómodo",
+            unit_price=Decimal('200000.00'),
+            stock=5,
+            category=self.category
+        )
+        self.order = place_order(Order(user=self.user), [CartItem(self.product, 2, self.product.price_with_iva)])
+        session = self.client.session
+        session['order_id'] = self.order.pk
+        session.save()
+
+    def test_transaction_ids_are_unique_and_time_sortable(self):
+        now = timezone.now()
+        earlier = [new_transaction_id(now - timedelta(milliseconds=1)) for _ in range(50)]
+        later = [new_transaction_id(now) for _ in range(50)]
+        self.assertEqual(len(set(earlier + later)), 100)
+        self.assertLess(max(earlier), min(later))
+
+    def test_double_submit_pays_once(self):
+        first = self.client.post('/orders/payment/process/', {'idempotency_key': 'abc'})
+        self.assertRedirects(first, f'/orders/{self.order.pk}/')
+        self.order.refresh_from_db()
+        transaction_id = self.order.transaction_id
+        self.assertEqual(self.order.status, 'paid')
+        self.assertTrue(transaction_id.startswith('TX-'))
+
+        second = self.client.post('/orders/payment/process/', {'idempotency_key': 'abc'})
+        self.assertRedirects(second, f'/orders/{self.order.pk}/')
+        self.order.refresh_from_db()
+        self.product.refresh_from_db()
+        self.assertEqual(self.order.transaction_id, transaction_id)
+        self.assertEqual(self.product.stock, 3)
+        self.assertEqual(PaymentAttempt.objects.count(), 1)
+
+    def test_paying_twice_with_another_key_is_a_noop(self):
+        self.assertTrue(pay_order(self.order, 'one'))
+        transaction_id = self.order.transaction_id
+        retry = Order.objects.get(pk=self.order.pk)
+        # UPDATE condicionado que no cambia nada y relectura, más el savepoint
+        with self.assertNumQueries(4):
+            self.assertFalse(pay_order(retry, 'two'))
+        self.order.refresh_from_db()
+        self.product.refresh_from_db()
+        self.assertEqual(self.order.transaction_id, transaction_id)
+        self.assertEqual(self.product.stock, 3)
+
+    def test_key_cannot_pay_another_order(self):
+        other = place_order(Order(user=self.user), [CartItem(self.product, 1, self.product.price_with_iva)])
+        pay_order(self.order, 'same')
+        with self.assertRaises(PaymentConflict):
+            pay_order(other, 'same')
+        other.refresh_from_db()
+        self.assertEqual(other.status, 'pending')
+        self.assertIsNone(other.transaction_id)
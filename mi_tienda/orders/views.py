@@ -2,12 +2,15 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
-from django.utils import timezone
-from decimal import Decimal
-import random
-import string
+from django.db.models import Prefetch
+import uuid
+from .checkout import compute_totals, place_order
 from .models import Order, OrderItem
+from .payments import PaymentConflict, pay_order, previous_payment
 from cart.cart import Cart
+from products.pagination import CursorPaginator
+from products.stock import InsufficientStock
+from promotions.engine import COUPON_KEY, evaluate_cart, get_coupon
 from .forms import OrderCreateForm
 
 @login_required
@@ -23,32 +26,17 @@ def order_create(request):
         if form.is_valid():
             order = form.save(commit=False)
             order.user = request.user
-            
-            # Calcular totales
-            subtotal = Decimal('0.00')
-            total_iva = Decimal('0.00')
-            
-            for item in cart:
-                item_subtotal = item['product'].unit_price * item['quantity']
-                item_iva = item['product'].iva_amount * item['quantity']
-                subtotal += item_subtotal
-                total_iva += item_iva
-            
-            order.subtotal = subtotal
-            order.iva_total = total_iva
-            order.total = subtotal + total_iva
-            order.save()
-            
-            # Crear items del pedido
-            for item in cart:
-                OrderItem.objects.create(
-                    order=order,
-                    product=item['product'],
-                    quantity=item['quantity'],
-                    price=item['product'].price_with_iva,
-                    unit_price=item['product'].unit_price,
-                    iva_percentage=item['product'].iva_percentage
+            evaluation = evaluate_cart(cart)
+            if evaluation.discount:
+                order.coupon = get_coupon(request) or ''
+            try:
+                place_order(order, cart, evaluation)
+            except InsufficientStock as exc:
+                names = ', '.join(
+                    item.product.name for item in cart if item.product.pk in exc.failed
                 )
+                messages.error(request, f'No hay stock suficiente para: {names}')
+                return redirect('cart:cart_detail')
             
             request.session['order_id'] = order.id
             return redirect('orders:payment_method')
@@ -65,7 +53,8 @@ def order_create(request):
     
     return render(request, 'orders/order_create.html', {
         'cart': cart,
-        'form': form
+        'form': form,
+        **compute_totals(cart, evaluate_cart(cart)),
     })
 
 @login_required
@@ -77,15 +66,24 @@ def payment_method(request):
     order = get_object_or_404(Order, id=order_id, user=request.user)
     
     if request.method == 'POST':
-        payment_method = request.POST.get('payment_method')
-        order.payment_method = payment_method
-        order.save()
+        # Un pedido ya pagado no cambia de método
+        Order.objects.filter(pk=order.pk, status='pending').update(
+            payment_method=request.POST.get('payment_method') or ''
+        )
         return redirect('orders:payment_process')
     
     return render(request, 'orders/payment_method.html', {'order': order})
 
 @login_required
 def payment_process(request):
+    key = request.POST.get('idempotency_key') if request.method == 'POST' else None
+    # Reenvío de un pago ya hecho (doble clic, recarga): la sesión puede no tener ya el pedido
+    attempt = previous_payment(request.user, key)
+    if attempt is not None:
+        request.session.pop('order_id', None)
+        messages.info(request, f'Este pedido ya está pagado. ID de transacción: {attempt.order.transaction_id}')
+        return redirect('orders:order_detail', order_id=attempt.order_id)
+
     order_id = request.session.get('order_id')
     if not order_id:
         return redirect('cart:cart_detail')
@@ -94,35 +92,45 @@ def payment_process(request):
     
     # Simulación de procesamiento de pago
     if request.method == 'POST':
-        # Generar ID de transacción simulado
-        transaction_id = ''.join(random.choices(string.ascii_uppercase + string.digits, k=12))
+        try:
+            paid = pay_order(order, key)
+        except InsufficientStock:
+            messages.error(request, 'Tu reserva venció y ya no hay stock suficiente para completar el pedido')
+            return redirect('cart:cart_detail')
+        except PaymentConflict:
+            messages.error(request, 'No se pudo procesar el pago, inténtalo de nuevo')
+            return redirect('orders:payment_process')
         
-        # Actualizar orden
-        order.payment_status = True
-        order.payment_date = timezone.now()
-        order.status = 'paid'
-        order.transaction_id = transaction_id
-        order.save()
+        # Eliminar order_id de la sesión
+        request.session.pop('order_id', None)
+        if not paid:
+            messages.info(request, f'Este pedido ya está pagado. ID de transacción: {order.transaction_id}')
+            return redirect('orders:order_detail', order_id=order.id)
         
         # Limpiar carrito
         cart = Cart(request)
         cart.clear()
+        request.session.pop(COUPON_KEY, None)
         
-        # Eliminar order_id de la sesión
-        if 'order_id' in request.session:
-            del request.session['order_id']
-        
-        messages.success(request, f'¡Pago realizado exitosamente! ID de transacción: {transaction_id}')
+        messages.success(request, f'¡Pago realizado exitosamente! ID de transacción: {order.transaction_id}')
         return redirect('orders:order_detail', order_id=order.id)
     
-    return render(request, 'orders/payment_process.html', {'order': order})
+    return render(request, 'orders/payment_process.html', {
+        'order': order,
+        'idempotency_key': uuid.uuid4().hex,
+    })
 
 @login_required
 def order_detail(request, order_id):
-    order = get_object_or_404(Order, id=order_id, user=request.user)
+    items = OrderItem.objects.select_related('product').prefetch_related('product__image_variants')
+    order = get_object_or_404(
+        Order.objects.prefetch_related(Prefetch('items', queryset=items)), id=order_id, user=request.user
+    )
     return render(request, 'orders/order_detail.html', {'order': order})
 
 @login_required
 def order_list(request):
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
-    return render(request, 'orders/order_list.html', {'orders': orders})
\ No newline at end of file
+    orders = Order.objects.filter(user=request.user)
+    paginator = CursorPaginator(orders, 20)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    return render(request, 'orders/order_list.html', {'orders': page_obj, 'page_obj': page_obj})
\ No newline at end of file
@@ -1,4 +1,6 @@
+from django import forms
 from django.contrib import admin
+from .forms import ProductStockForm
 from .models import Category, Product
 
 @admin.register(Category)
@@ -7,26 +9,50 @@ class CategoryAdmin(admin.ModelAdmin):
     search_fields = ['name']
     list_filter = ['created_at']
 
+class ProductChangeListForm(ProductStockForm):
+    stock = forms.IntegerField(
+        min_value=0,
+        label="Stock disponible",
+        widget=forms.NumberInput(attrs={'class': 'vIntegerField', 'style': 'width: 6em'})
+    )
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ['name', 'category', 'unit_price', 'price_with_iva', 'stock', 'is_active', 'created_at']
+    form = ProductStockForm
+    list_display = ['name', 'sku', 'category', 'unit_price', 'price_with_iva', 'stock', 'is_active', 'created_at']
     list_filter = ['category', 'is_active', 'created_at']
-    search_fields = ['name', 'description']
-    list_editable = ['is_active', 'stock']
-    readonly_fields = ['created_at', 'updated_at']
+    search_fields = ['name', 'sku', 'description']
+    # 'stock' también es editable en el listado: no es una columna del modelo,
+    # así que lo aporta el formulario de get_changelist_form
+    list_editable = ['is_active']
+    readonly_fields = ['iva_amount', 'price_with_iva', 'created_at', 'updated_at']
     
     fieldsets = (
         ('Información básica', {
-            'fields': ('name', 'description', 'category')
+            'fields': ('name', 'sku', 'description', 'category')
         }),
         ('Detalles', {
             'fields': ('additional_info', 'image', 'stock', 'is_active')
         }),
         ('Precios', {
-            'fields': ('unit_price', 'iva_percentage')
+            'fields': ('unit_price', 'iva_percentage', 'iva_amount', 'price_with_iva')
         }),
         ('Fechas', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
         })
-    )
\ No newline at end of file
+    )
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_stock()
+
+    def get_changelist_form(self, request, **kwargs):
+        kwargs.setdefault('form', ProductChangeListForm)
+        return super().get_changelist_form(request, **kwargs)
+
+    def save_model(self, request, obj, form, change):
+        """Si solo cambió el stock se escribe el contador sin reescribir el producto"""
+        if change and form.changed_data == ['stock']:
+            obj.save_stock()
+        else:
+            super().save_model(request, obj, form, change)
@@ -0,0 +1,151 @@
+"""API JSON de solo lectura del catálogo (``/api/v1/``).
+
+Pensada para que los clientes consulten el catálogo a menudo sin volver a
+descargarlo: las listas se paginan por cursor (``?cursor=``), ``?fields=``
+recorta los campos y cada respuesta lleva ``ETag`` y ``Last-Modified``
+calculados a partir de ``updated_at`` de las filas devueltas. Si el cliente
+los reenvía (``If-None-Match`` / ``If-Modified-Since``) y nada cambió, la
+respuesta es un 304 sin cuerpo y no se serializa nada.
+
+``/api/v1/changes/`` es el feed incremental de ``products.changes``.
+"""
+import hashlib
+
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework import viewsets
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .changes import InvalidCheckpoint, decode_checkpoint, iter_lines
+from .models import Category, Product
+from .pagination import CursorPaginator, InvalidCursor
+from .serializers import CategorySerializer, ProductSerializer
+
+
+class KeysetPagination(BasePagination):
+    """Adapta ``CursorPaginator`` a DRF: ``?cursor=`` y ``?page_size=``"""
+    page_size = 50
+    max_page_size = 200
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get('page_size', self.page_size))
+        except ValueError:
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        paginator = CursorPaginator(queryset, self.get_page_size(request), ordering=view.cursor_ordering)
+        try:
+            self.page = paginator.page(request.query_params.get('cursor'))
+        except InvalidCursor:
+            raise NotFound('Cursor inválido.')
+        return list(self.page)
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), 'cursor', cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_link(self.page.next_cursor),
+            'previous': self.get_link(self.page.previous_cursor),
+            'results': data,
+        })
+
+
+class ConditionalReadOnlyViewSet(viewsets.ReadOnlyModelViewSet):
+    """``ReadOnlyModelViewSet`` que responde 304 si las filas no cambiaron"""
+    pagination_class = KeysetPagination
+    cursor_ordering = ('-created_at', '-id')
+
+    def get_versions(self, obj):
+        """Marcas de tiempo de las que depende la representación de ``obj``"""
+        return [obj.updated_at]
+
+    def conditional_response(self, objects, *extra, exact_dates=True):
+        """``(304 o None, etag, last_modified)`` para ``objects``.
+
+        En las listas una fila que sale de la página no cambia la fecha más
+        reciente, así que ahí solo se valida con ``ETag`` (``exact_dates=False``).
+        """
+        versions = [(obj.pk, *self.get_versions(obj)) for obj in objects]
+        key = repr([self.request.version, self.request.get_full_path(), versions, extra])
+        etag = quote_etag(hashlib.sha1(key.encode()).hexdigest())
+        last_modified = max((max(v[1:]) for v in versions), default=None)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(
+            self.request, etag=etag, last_modified=timestamp if exact_dates else None
+        )
+        return response, etag, timestamp
+
+    def finish(self, response, etag, timestamp):
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        # Se puede guardar, pero hay que revalidar en cada uso
+        patch_cache_control(response, public=True, no_cache=True)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        objects = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        page = self.paginator.page
+        not_modified, etag, timestamp = self.conditional_response(
+            objects, page.has_next(), page.has_previous(), exact_dates=False
+        )
+        if not_modified is not None:
+            return self.finish(not_modified, etag, timestamp)
+        data = self.get_serializer(objects, many=True).data
+        return self.finish(self.get_paginated_response(data), etag, timestamp)
+
+    def retrieve(self, request, *args, **kwargs):
+        obj = self.get_object()
+        not_modified, etag, timestamp = self.conditional_response([obj])
+        if not_modified is not None:
+            return self.finish(not_modified, etag, timestamp)
+        return self.finish(Response(self.get_serializer(obj).data), etag, timestamp)
+
+
+class CategoryViewSet(ConditionalReadOnlyViewSet):
+    serializer_class = CategorySerializer
+    queryset = Category.objects.all()
+    cursor_ordering = ('name',)
+
+
+class ProductViewSet(ConditionalReadOnlyViewSet):
+    serializer_class = ProductSerializer
+
+    def get_queryset(self):
+        queryset = Product.objects.filter(is_active=True).select_related('category')
+        category = self.request.query_params.get('category')
+        if category:
+            if not category.isdigit():
+                raise ValidationError({'category': 'Debe ser un número.'})
+            queryset = queryset.filter(category_id=category)
+        return queryset
+
+    def get_versions(self, product):
+        # La categoría va anidada en la respuesta: renombrarla también cuenta
+        return [product.updated_at, product.category.updated_at]
+
+
+MAX_CHANGES = 10000
+
+
+def change_feed(request):
+    """Cambios desde ``?since=<checkpoint>`` en JSON Lines (``?limit=``, máx. 10000)"""
+    since = request.GET.get('since')
+    try:
+        decode_checkpoint(since)
+        limit = min(max(int(request.GET.get('limit', 1000)), 1), MAX_CHANGES)
+    except (InvalidCheckpoint, ValueError):
+        return JsonResponse({'detail': 'Parámetros inválidos.'}, status=400)
+    response = StreamingHttpResponse(iter_lines(since, limit), content_type='application/x-ndjson')
+    response['Cache-Control'] = 'no-store'
+    return response
@@ -0,0 +1,14 @@
+from django.urls import path
+from rest_framework.routers import SimpleRouter
+
+from . import api
+
+app_name = 'api'
+
+router = SimpleRouter()
+router.register('categories', api.CategoryViewSet, basename='category')
+router.register('products', api.ProductViewSet, basename='product')
+
+urlpatterns = [
+    path('changes/', api.change_feed, name='changes'),
+] + router.urls
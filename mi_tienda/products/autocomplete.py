@@ -0,0 +1,298 @@
+"""Autocompletado del buscador por prefijo, en memoria.
+
+Los nombres de productos activos y de categorías se guardan en un arreglo
+ordenado de claves normalizadas (sin tildes, en minúsculas), una por cada
+palabra del nombre: ``"Tenis Nike Air"`` genera ``"tenis nike air"``,
+``"nike air"`` y ``"air"``. Un prefijo es un rango contiguo del arreglo que
+se encuentra con ``bisect``, así que responder no toca la base de datos.
+
+Cada proceso tiene su copia y la comparte con los demás mediante un archivo
+de snapshot (``AUTOCOMPLETE_SNAPSHOT``). Al guardar o eliminar un producto o
+una categoría se actualizan solo esas entradas y se reescribe el snapshot;
+los demás procesos notan el cambio (como mucho una vez por
+``AUTOCOMPLETE_CHECK_INTERVAL`` segundos) y lo vuelven a cargar.
+"""
+import os
+import pickle
+import threading
+import time
+import uuid
+from array import array
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
+
+from .search import SPANISH_STOPWORDS, TOKEN_RE, normalize
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+MAX_KEY_LENGTH = 64
+SNAPSHOT_VERSION = 1
+
+_lock = threading.Lock()
+_state = {'index': None, 'path': None, 'stamp': None, 'checked': 0.0}
+_pending = set()
+
+
+def normalize_query(text):
+    return ' '.join(TOKEN_RE.findall(normalize(text)))
+
+
+def index_keys(label):
+    """Claves de ``label``: el nombre normalizado desde cada palabra"""
+    words = normalize_query(label).split()
+    return sorted({
+        ' '.join(words[i:])[:MAX_KEY_LENGTH]
+        for i, word in enumerate(words) if word not in SPANISH_STOPWORDS
+    })
+
+
+class PrefixIndex:
+    """Claves ordenadas con el id al que apuntan (arreglos paralelos)"""
+
+    def __init__(self, keys=None, ids=None, labels=None):
+        self.keys = keys if keys is not None else []
+        self.ids = ids if ids is not None else array('q')
+        self.labels = labels if labels is not None else {}
+
+    @classmethod
+    def build(cls, items):
+        """Índice a partir de ``[(id, nombre)]``"""
+        labels = dict(items)
+        entries = sorted((key, pk) for pk, label in labels.items() for key in index_keys(label))
+        return cls([key for key, _ in entries], array('q', (pk for _, pk in entries)), labels)
+
+    def copy(self):
+        return PrefixIndex(list(self.keys), array('q', self.ids), dict(self.labels))
+
+    def __len__(self):
+        return len(self.labels)
+
+    def remove(self, pk):
+        label = self.labels.pop(pk, None)
+        if label is None:
+            return
+        for key in index_keys(label):
+            start, end = bisect_left(self.keys, key), bisect_right(self.keys, key)
+            for i in range(start, end):
+                if self.ids[i] == pk:
+                    del self.keys[i]
+                    del self.ids[i]
+                    break
+
+    def add(self, pk, label):
+        self.remove(pk)
+        self.labels[pk] = label
+        for key in index_keys(label):
+            # Entre claves iguales se ordena por id, como en ``build``
+            start, end = bisect_left(self.keys, key), bisect_right(self.keys, key)
+            position = start + bisect_left(self.ids[start:end], pk)
+            self.keys.insert(position, key)
+            self.ids.insert(position, pk)
+
+    def complete(self, prefix, limit=8):
+        """``[(id, nombre)]`` cuyas claves empiezan por ``prefix`` (ya normalizado)"""
+        results, seen = [], set()
+        if not prefix:
+            return results
+        keys, ids = self.keys, self.ids
+        for i in range(bisect_left(keys, prefix), len(keys)):
+            if not keys[i].startswith(prefix):
+                break
+            pk = ids[i]
+            if pk not in seen:
+                seen.add(pk)
+                results.append((pk, self.labels[pk]))
+                if len(results) == limit:
+                    break
+        return results
+
+
+class Autocomplete:
+    def __init__(self, products, categories):
+        self.products = products
+        self.categories = categories
+
+    def copy(self):
+        return Autocomplete(self.products.copy(), self.categories.copy())
+
+
+def get_snapshot_path():
+    return str(getattr(settings, 'AUTOCOMPLETE_SNAPSHOT', settings.BASE_DIR / 'cache' / 'autocomplete.pickle'))
+
+
+def get_check_interval():
+    return getattr(settings, 'AUTOCOMPLETE_CHECK_INTERVAL', 1.0)
+
+
+def build_index():
+    """Índice completo leído de la base de datos"""
+    from .models import Category, Product
+
+    return Autocomplete(
+        PrefixIndex.build(Product.objects.filter(is_active=True).values_list('pk', 'name').iterator()),
+        PrefixIndex.build(Category.objects.values_list('pk', 'name').iterator()),
+    )
+
+
+def _stamp(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def read_snapshot(path):
+    with open(path, 'rb') as source:
+        version, index = pickle.load(source)
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f'Versión de snapshot desconocida: {version}')
+    return index
+
+
+def write_snapshot(index, path):
+    """Escribe el snapshot con un nombre temporal y lo renombra (atómico)"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temporary = f'{path}.{uuid.uuid4().hex}.tmp'
+    with open(temporary, 'wb') as destination:
+        pickle.dump((SNAPSHOT_VERSION, index), destination, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, path)
+    return _stamp(path)
+
+
+@contextmanager
+def snapshot_lock(path):
+    """Serializa entre procesos la escritura del snapshot"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(f'{path}.lock', 'a') as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _publish(index, path, stamp):
+    _state.update(index=index, path=path, stamp=stamp, checked=time.monotonic())
+
+
+def rebuild():
+    """Reconstruye el índice desde la base de datos y reescribe el snapshot"""
+    path = get_snapshot_path()
+    with snapshot_lock(path):
+        index = build_index()
+        stamp = write_snapshot(index, path)
+    with _lock:
+        _publish(index, path, stamp)
+    return index
+
+
+def get_index():
+    """Índice de este proceso, recargado si otro proceso cambió el snapshot"""
+    path = get_snapshot_path()
+    if (
+        _state['index'] is not None and _state['path'] == path
+        and time.monotonic() - _state['checked'] < get_check_interval()
+    ):
+        return _state['index']
+    with _lock:
+        stamp = _stamp(path)
+        if _state['index'] is not None and _state['path'] == path and stamp == _state['stamp']:
+            _state['checked'] = time.monotonic()
+            return _state['index']
+        if stamp is not None:
+            try:
+                _publish(read_snapshot(path), path, stamp)
+                return _state['index']
+            except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+                pass
+    return rebuild()
+
+
+@lru_cache(maxsize=None)
+def _url_parts(name):
+    # ``reverse`` cuesta más que la búsqueda en el índice: se resuelve una vez
+    return tuple(reverse(name, args=[987654321]).split('987654321'))
+
+
+def _url(name, pk):
+    before, after = _url_parts(name)
+    return f'{before}{pk}{after}'
+
+
+def complete(query, limit=8, index=None):
+    """Sugerencias ``{'products': [...], 'categories': [...]}`` para ``query``"""
+    index = index or get_index()
+    prefix = normalize_query(query)[:MAX_KEY_LENGTH]
+    return {
+        'categories': [
+            {'id': pk, 'name': name, 'url': _url('products:category_detail', pk)}
+            for pk, name in index.categories.complete(prefix, limit)
+        ],
+        'products': [
+            {'id': pk, 'name': name, 'url': _url('products:product_detail', pk)}
+            for pk, name in index.products.complete(prefix, limit)
+        ],
+    }
+
+
+def refresh(product_ids=(), category_ids=()):
+    """Actualiza en el índice y en el snapshot solo las entradas indicadas"""
+    from .models import Category, Product
+
+    path = get_snapshot_path()
+    with snapshot_lock(path):
+        stamp = _stamp(path)
+        if stamp is None:
+            index = build_index()
+        else:
+            # Partir del snapshot vigente, que puede traer cambios de otro proceso
+            index = _state['index'] if stamp == _state['stamp'] and _state['path'] == path else None
+            index = (index or read_snapshot(path)).copy()
+            products = dict(Product.objects.filter(pk__in=product_ids, is_active=True).values_list('pk', 'name'))
+            for pk in product_ids:
+                if pk in products:
+                    index.products.add(pk, products[pk])
+                else:
+                    index.products.remove(pk)
+            categories = dict(Category.objects.filter(pk__in=category_ids).values_list('pk', 'name'))
+            for pk in category_ids:
+                if pk in categories:
+                    index.categories.add(pk, categories[pk])
+                else:
+                    index.categories.remove(pk)
+        stamp = write_snapshot(index, path)
+    with _lock:
+        _publish(index, path, stamp)
+
+
+def flush_pending():
+    with _lock:
+        pending = set(_pending)
+        _pending.clear()
+    if pending:
+        refresh(
+            product_ids=[pk for kind, pk in pending if kind == 'product'],
+            category_ids=[pk for kind, pk in pending if kind == 'category'],
+        )
+
+
+def schedule_refresh(kind, pk):
+    """Encola ``(kind, pk)`` y lo aplica al confirmarse la transacción.
+
+    Un borrado en cascada encola muchos ids pero el primer ``on_commit`` que
+    corre los aplica todos juntos; los demás no encuentran nada pendiente.
+    """
+    with _lock:
+        _pending.add((kind, pk))
+    transaction.on_commit(flush_pending)
@@ -0,0 +1,79 @@
+"""Caché versionada del catálogo.
+
+Las claves incluyen un contador de generación que se incrementa cada vez que
+se guarda o elimina un ``Product`` o una ``Category`` (ver ``signals.py``).
+Así no hace falta borrar claves una a una: al cambiar la generación todas
+las entradas anteriores dejan de usarse y expiran solas.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+
+GENERATION_KEY = 'catalog:generation'
+HITS_KEY = 'catalog:stats:hits'
+MISSES_KEY = 'catalog:stats:misses'
+
+
+def get_cache():
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+
+def _incr(key, delta=1):
+    cache = get_cache()
+    cache.add(key, 0, timeout=None)
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # La clave expiró o se borró entre ``add`` e ``incr``
+        cache.set(key, delta, timeout=None)
+        return delta
+
+
+def get_generation():
+    generation = get_cache().get(GENERATION_KEY)
+    if generation is None:
+        get_cache().add(GENERATION_KEY, 1, timeout=None)
+        generation = get_cache().get(GENERATION_KEY, 1)
+    return generation
+
+
+def bump_generation():
+    """Invalida todo el contenido cacheado del catálogo"""
+    return _incr(GENERATION_KEY)
+
+
+def make_key(name, *parts):
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f'catalog:{get_generation()}:{name}:{digest}'
+
+
+def get_or_set(name, parts, compute):
+    """Devuelve el valor cacheado de ``(name, parts)`` o lo calcula con ``compute``"""
+    cache = get_cache()
+    key = make_key(name, *parts)
+    value = cache.get(key)
+    if value is not None:
+        _incr(HITS_KEY)
+        return value
+    _incr(MISSES_KEY)
+    value = compute()
+    cache.set(key, value, getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300))
+    return value
+
+
+def get_stats():
+    cache = get_cache()
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'generation': get_generation(),
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else None,
+    }
+
+
+def reset_stats():
+    get_cache().delete_many([HITS_KEY, MISSES_KEY])
@@ -0,0 +1,366 @@
+"""Importación y exportación masiva del catálogo en CSV y JSON Lines.
+
+Los archivos se leen y escriben línea a línea, así la memoria no depende
+del tamaño del archivo. La importación agrupa las filas en lotes y hace un
+upsert por ``sku`` con un único ``bulk_create(update_conflicts=True)`` por
+lote (en MySQL, que no admite indicar la columna del conflicto, un
+``bulk_create`` de los nuevos y un ``bulk_update`` de los existentes), en
+una transacción junto con el stock y el índice de búsqueda. Para
+repartir un archivo grande entre procesos se divide por rangos de bytes;
+solo en ese caso cada registro debe ocupar una sola línea (un CSV leído
+entero admite saltos de línea entre comillas).
+"""
+import csv
+import io
+import json
+import os
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from . import autocomplete
+from . import cache as catalog_cache
+from .models import Category, Product
+from .pricing import bump_price_version
+from .search import get_backend
+from .stock import set_stock
+
+FIELDS = [
+    'sku', 'name', 'description', 'additional_info', 'category',
+    'unit_price', 'iva_percentage', 'is_active', 'stock',
+]
+UPDATE_FIELDS = [
+    'name', 'description', 'additional_info', 'category', 'unit_price',
+    'iva_percentage', 'iva_amount', 'price_with_iva', 'is_active', 'updated_at', 'price_version',
+]
+# Errores que se guardan con detalle (el resto solo se cuenta)
+MAX_REPORTED_ERRORS = 100
+TRUE_VALUES = {'1', 'true', 't', 'si', 'sí', 's', 'yes', 'y'}
+FALSE_VALUES = {'0', 'false', 'f', 'no', 'n'}
+
+
+class RowError(ValueError):
+    pass
+
+
+def detect_format(path, format=None):
+    if format:
+        return format
+    return 'jsonl' if path.endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def _decimal(value, field):
+    try:
+        number = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise RowError(f'{field} inválido: {value!r}')
+    if not number.is_finite() or number < 0:
+        raise RowError(f'{field} inválido: {value!r}')
+    return number
+
+
+def _bool(value):
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise RowError(f'is_active inválido: {value!r}')
+
+
+def parse_row(row):
+    """Valida una fila del archivo y la convierte a valores de ``Product``"""
+    def text(field, required=False):
+        value = row.get(field)
+        value = '' if value is None else str(value).strip()
+        if required and not value:
+            raise RowError(f'falta {field}')
+        return value
+
+    unit_price = _decimal(text('unit_price', required=True), 'unit_price')
+    if unit_price < Decimal('0.01'):
+        raise RowError('unit_price debe ser mayor que 0')
+    iva_percentage = text('iva_percentage')
+    iva_percentage = _decimal(iva_percentage, 'iva_percentage') if iva_percentage else Decimal('19.00')
+    if iva_percentage > 100:
+        raise RowError('iva_percentage debe estar entre 0 y 100')
+    is_active = text('is_active')
+    stock = text('stock')
+    try:
+        stock = int(stock) if stock else None
+    except ValueError:
+        raise RowError(f'stock inválido: {stock!r}')
+    if stock is not None and stock < 0:
+        raise RowError(f'stock inválido: {stock!r}')
+
+    sku = text('sku', required=True)
+    if len(sku) > 64:
+        raise RowError('sku demasiado largo')
+    return {
+        'sku': sku,
+        'name': text('name', required=True)[:200],
+        'description': text('description'),
+        'additional_info': text('additional_info'),
+        'category': text('category', required=True)[:100],
+        'unit_price': unit_price.quantize(Decimal('0.01')),
+        'iva_percentage': iva_percentage.quantize(Decimal('0.01')),
+        'is_active': _bool(is_active) if is_active else True,
+        'stock': stock,
+    }
+
+
+class CategoryMap:
+    """Nombre de categoría -> id, cargado una vez y completado sobre la marcha"""
+
+    def __init__(self, create=True):
+        self.create = create
+        self.ids = dict(Category.objects.values_list('name', 'id'))
+
+    def get(self, name):
+        if name not in self.ids:
+            if not self.create:
+                raise RowError(f'no existe la categoría {name!r}')
+            try:
+                with transaction.atomic():
+                    self.ids[name] = Category.objects.get_or_create(name=name)[0].pk
+            except IntegrityError:
+                # Otro proceso la creó a la vez
+                self.ids[name] = Category.objects.get(name=name).pk
+        return self.ids[name]
+
+
+class ProductImporter:
+    """Upsert por lotes de filas ya leídas (diccionarios campo -> texto)"""
+
+    def __init__(self, batch_size=1000, create_categories=True):
+        self.batch_size = batch_size
+        self.categories = CategoryMap(create=create_categories)
+        self.batch = {}
+        self.rows = self.created = self.updated = self.error_count = 0
+        self.errors = []
+
+    def add(self, row, line=None):
+        self.rows += 1
+        try:
+            if isinstance(row, RowError):
+                raise row
+            if not isinstance(row, dict):
+                raise RowError('la línea no es un objeto JSON')
+            values = parse_row(row)
+            values['category'] = self.categories.get(values['category'])
+        except RowError as error:
+            self.error_count += 1
+            if len(self.errors) < MAX_REPORTED_ERRORS:
+                self.errors.append((line, str(error)))
+            return
+        # Si un SKU se repite en el lote gana la última fila
+        self.batch[values['sku']] = values
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.batch:
+            return
+        batch, self.batch = self.batch, {}
+        now = timezone.now()
+        products = []
+        for sku, values in batch.items():
+            product = Product(
+                sku=sku,
+                name=values['name'],
+                description=values['description'],
+                additional_info=values['additional_info'],
+                category_id=values['category'],
+                unit_price=values['unit_price'],
+                iva_percentage=values['iva_percentage'],
+                is_active=values['is_active'],
+                created_at=now,
+                updated_at=now,
+            )
+            product.update_prices()
+            products.append(product)
+
+        with transaction.atomic():
+            existing = dict(Product.objects.filter(sku__in=list(batch)).values_list('sku', 'pk'))
+            if existing:
+                # Los carritos revaloran las líneas de los productos actualizados
+                version = bump_price_version()
+                for product in products:
+                    product.price_version = version
+            created = [sku for sku in batch if sku not in existing]
+            if connection.features.supports_update_conflicts_with_target:
+                # INSERT ... ON CONFLICT (sku) DO UPDATE (SQLite/PostgreSQL)
+                Product.objects.bulk_create(
+                    products, update_conflicts=True, unique_fields=['sku'], update_fields=UPDATE_FIELDS
+                )
+            else:
+                Product.objects.bulk_create([product for product in products if product.sku not in existing])
+                updated = [product for product in products if product.sku in existing]
+                for product in updated:
+                    product.pk = existing[product.sku]
+                Product.objects.bulk_update(updated, UPDATE_FIELDS)
+            if created:
+                existing.update(Product.objects.filter(sku__in=created).values_list('sku', 'pk'))
+            for product in products:
+                product.pk = existing[product.sku]
+
+            # bulk_create no envía señales: stock e índice de búsqueda a mano
+            set_stock({
+                product.pk: batch[product.sku]['stock']
+                for product in products if batch[product.sku]['stock'] is not None
+            })
+            get_backend().index_products(products)
+        self.created += len(created)
+        self.updated += len(batch) - len(created)
+
+    def finish(self):
+        self.flush()
+        if self.created or self.updated:
+            catalog_cache.bump_generation()
+            # bulk_create no envía señales: el autocompletado se reconstruye entero
+            transaction.on_commit(autocomplete.rebuild)
+        return self.stats()
+
+    def stats(self):
+        return {
+            'rows': self.rows, 'created': self.created, 'updated': self.updated,
+            'error_count': self.error_count, 'errors': self.errors,
+        }
+
+
+def split_ranges(path, parts):
+    """Divide el archivo en ``parts`` rangos de bytes ``(inicio, fin)`` sin la cabecera CSV"""
+    size = os.path.getsize(path)
+    step = max(size // parts, 1)
+    return [(i * step, size if i == parts - 1 else (i + 1) * step) for i in range(parts)]
+
+
+def read_header(path):
+    with open(path, encoding='utf-8-sig', newline='') as source:
+        return next(csv.reader([source.readline()]), [])
+
+
+def iter_lines(path, start, end):
+    """Líneas ``(número de byte, texto)`` que empiezan dentro de ``[start, end)``"""
+    with open(path, 'rb') as source:
+        if start:
+            # Si ``start`` cae a mitad de una línea, esa línea es del rango anterior
+            source.seek(start - 1)
+            source.readline()
+        position = source.tell()
+        while position < end:
+            line = source.readline()
+            if not line:
+                break
+            yield position, line.decode('utf-8-sig' if position == 0 else 'utf-8')
+            position += len(line)
+
+
+def has_multiline_records(path):
+    """``True`` si algún registro CSV sigue en la línea siguiente (comillas sin cerrar)"""
+    with open(path, 'rb') as source:
+        return any(line.count(b'"') % 2 for line in source)
+
+
+def iter_csv(path):
+    """Filas ``(ubicación, diccionario)`` de todo el CSV, con saltos de línea entre comillas"""
+    with open(path, encoding='utf-8-sig', newline='') as source:
+        reader = csv.DictReader(source)
+        line = reader.line_num + 1
+        for row in reader:
+            # Valores de más (sin columna) se descartan, como al leer por rangos
+            row.pop(None, None)
+            yield f'línea {line}', {key: value for key, value in row.items() if value is not None}
+            line = reader.line_num + 1
+
+
+def iter_rows(path, format, start=0, end=None):
+    """Filas ``(ubicación, diccionario)`` del rango ``[start, end)`` del archivo.
+
+    Un CSV sin rango se lee entero con ``csv.DictReader``. Por rangos cada
+    registro debe ocupar una línea: una línea con comillas sin cerrar se
+    informa como error en lugar de leerse a medias.
+    """
+    if format == 'csv' and not start and end is None:
+        yield from iter_csv(path)
+        return
+    end = os.path.getsize(path) if end is None else end
+    header = read_header(path) if format == 'csv' else None
+    for position, line in iter_lines(path, start, end):
+        if not line.strip():
+            continue
+        if format == 'csv':
+            if position == 0:
+                continue
+            if line.count('"') % 2:
+                yield f'byte {position}', RowError(
+                    'registro con salto de línea entre comillas: importe con un solo proceso'
+                )
+                continue
+            values = next(csv.reader([line]))
+            yield f'byte {position}', dict(zip(header, values))
+        else:
+            try:
+                yield f'byte {position}', json.loads(line)
+            except ValueError:
+                yield f'byte {position}', None
+
+
+def import_range(path, format, start=0, end=None, batch_size=1000, create_categories=True):
+    """Importa el rango ``[start, end)`` de ``path`` (todo el archivo por defecto). Devuelve las estadísticas."""
+    importer = ProductImporter(batch_size=batch_size, create_categories=create_categories)
+    for location, row in iter_rows(path, format, start, end):
+        importer.add(row, line=location)
+    return importer.finish()
+
+
+def export_rows(queryset, batch_size=1000):
+    """Productos de ``queryset`` como diccionarios, por lotes de clave primaria"""
+    last_pk = 0
+    queryset = queryset.with_stock().select_related('category').order_by('pk')
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return
+        for product in batch:
+            yield {
+                'sku': product.sku or '',
+                'name': product.name,
+                'description': product.description,
+                'additional_info': product.additional_info,
+                'category': product.category.name,
+                'unit_price': str(product.unit_price),
+                'iva_percentage': str(product.iva_percentage),
+                'is_active': product.is_active,
+                'stock': product.stock,
+            }
+        last_pk = batch[-1].pk
+
+
+def write_rows(rows, output, format):
+    """Escribe ``rows`` en ``output`` (texto) y devuelve cuántas filas escribió"""
+    count = 0
+    if format == 'csv':
+        writer = csv.DictWriter(output, fieldnames=FIELDS, lineterminator='\n')
+        writer.writeheader()
+        for row in rows:
+            # Una línea por registro para poder dividir el archivo por bytes
+            writer.writerow({
+                key: value.replace('\r\n', ' ').replace('\n', ' ') if isinstance(value, str) else value
+                for key, value in row.items()
+            })
+            count += 1
+    else:
+        for row in rows:
+            output.write(json.dumps(row, ensure_ascii=False) + '\n')
+            count += 1
+    return count
+
+
+def open_output(path):
+    if path in (None, '-'):
+        return None
+    return io.open(path, 'w', encoding='utf-8', newline='')
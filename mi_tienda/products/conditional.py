@@ -0,0 +1,61 @@
+"""Respuestas condicionales (ETag / 304) para las páginas HTML del catálogo.
+
+Las vistas reúnen primero los datos que muestra la página (``updated_at`` de
+las filas, stock, ids de la página) y con ellos más lo que cambia por
+visitante (usuario, carrito, token CSRF) calculan el ``ETag``. Si coincide
+con el ``If-None-Match`` del navegador o del proxy se responde 304 sin
+renderizar la plantilla.
+
+``Last-Modified`` se envía como referencia, pero no basta para validar: el
+stock o el carrito cambian sin mover ningún ``updated_at``. Por eso un
+``If-Modified-Since`` sin ``ETag`` recibe la página completa.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from cart.cart import decode_cart
+
+
+def visitor_state(request):
+    """Lo que cambia la página según quién la pide (menú, carrito, formulario)"""
+    user = request.user
+    quantities = decode_cart(request.session.get(settings.CART_SESSION_ID))[0]
+    # El formulario lleva el token CSRF: get_token asegura que el secreto ya
+    # exista (y que se envíe la cookie) para que la segunda visita coincida
+    get_token(request)
+    return (
+        user.pk, user.is_staff,
+        sorted(quantities.items()),
+        request.META.get('CSRF_COOKIE'),
+    )
+
+
+def page_etag(request, *parts):
+    key = repr([request.get_full_path(), visitor_state(request), parts])
+    return quote_etag(hashlib.sha1(key.encode()).hexdigest())
+
+
+def not_modified(request, etag, last_modified):
+    """Respuesta 304 si el cliente ya tiene esta versión, ``None`` si hay que renderizar"""
+    if len(get_messages(request)):
+        # Hay mensajes pendientes: solo se consumen al renderizar
+        return None
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        add_validators(request, response, etag, last_modified)
+    return response
+
+
+def add_validators(request, response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # El navegador o el proxy pueden guardarla, pero revalidan en cada visita
+    patch_cache_control(response, no_cache=True, private=request.user.is_authenticated)
+    patch_vary_headers(response, ['Cookie'])
+    return response
@@ -0,0 +1,197 @@
+"""Navegación por facetas del catálogo: categoría, rango de precio, stock e IVA.
+
+Los conteos salen de una sola consulta agrupada por las cuatro facetas a la
+vez (un "cubo" de pocas celdas) que se guarda en la caché del catálogo. El
+conteo de cada valor se calcula en Python sumando las celdas que cumplen los
+filtros de las demás facetas, así agregar filtros no agrega consultas ni un
+``COUNT`` por valor.
+
+La faceta de stock se invalida con la generación de la caché: al guardar un
+producto, al importar y cuando una venta agota un producto (ver
+``orders.reservations.convert_reservations``). Devolver stock con
+``increment_stock`` no invalida: un producto repuesto puede tardar hasta
+``CATALOG_CACHE_TIMEOUT`` en volver a contar como "En stock".
+"""
+from decimal import Decimal, InvalidOperation
+from urllib.parse import urlencode
+
+from django.db.models import Case, CharField, Count, Exists, OuterRef, Q, Value, When
+
+from . import cache as catalog_cache
+from .models import ProductStock
+from .search import search_products
+
+# (desde, hasta) sobre el precio con IVA; ``None`` = sin límite
+PRICE_BANDS = [
+    (None, Decimal('100000')),
+    (Decimal('100000'), Decimal('250000')),
+    (Decimal('250000'), Decimal('500000')),
+    (Decimal('500000'), None),
+]
+
+FACETS = ['category', 'price', 'in_stock', 'iva']
+
+
+def band_key(low, high):
+    return f'{low or ""}-{high or ""}'
+
+
+def band_label(low, high):
+    def money(value):
+        return f'${value:,.0f}'.replace(',', '.')
+    if low is None:
+        return f'Hasta {money(high)}'
+    if high is None:
+        return f'Desde {money(low)}'
+    return f'{money(low)} - {money(high)}'
+
+
+BANDS = {band_key(low, high): (low, high) for low, high in PRICE_BANDS}
+
+
+def band_q(low, high):
+    condition = Q()
+    if low is not None:
+        condition &= Q(price_with_iva__gte=low)
+    if high is not None:
+        condition &= Q(price_with_iva__lt=high)
+    return condition
+
+
+def parse_filters(params):
+    """Filtros activos ``{faceta: frozenset(valores)}`` a partir de ``request.GET``"""
+    filters = {}
+    categories = {value for value in params.getlist('category') if value.isdigit()}
+    if categories:
+        filters['category'] = frozenset(categories)
+    bands = {value for value in params.getlist('price') if value in BANDS}
+    if bands:
+        filters['price'] = frozenset(bands)
+    if params.get('in_stock') == '1':
+        filters['in_stock'] = frozenset(['1'])
+    rates = set()
+    for value in params.getlist('iva'):
+        try:
+            rates.add(str(Decimal(value).quantize(Decimal('0.01'))))
+        except (InvalidOperation, ValueError):
+            pass
+    if rates:
+        filters['iva'] = frozenset(rates)
+    return filters
+
+
+def filters_key(filters):
+    """Forma estable de ``filters`` para claves de caché (el orden de un ``frozenset`` varía entre procesos)"""
+    return tuple((facet, tuple(sorted(filters[facet]))) for facet in FACETS if facet in filters)
+
+
+def filters_query(filters, search=None):
+    """Query string normalizado de ``filters`` y la búsqueda, sin cursor ni otros parámetros"""
+    query = [(facet, value) for facet, values in filters_key(filters) for value in values]
+    if search:
+        query.append(('search', search))
+    return urlencode(query)
+
+
+def in_stock_expression():
+    return Exists(ProductStock.objects.filter(product=OuterRef('pk'), quantity__gt=0))
+
+
+def apply_filters(queryset, filters):
+    """Aplica los filtros de facetas a un queryset de ``Product``"""
+    if 'category' in filters:
+        queryset = queryset.filter(category_id__in=[int(value) for value in filters['category']])
+    if 'price' in filters:
+        bands = Q()
+        for key in filters['price']:
+            bands |= band_q(*BANDS[key])
+        queryset = queryset.filter(bands)
+    if 'in_stock' in filters:
+        queryset = queryset.filter(in_stock_expression())
+    if 'iva' in filters:
+        queryset = queryset.filter(iva_percentage__in=[Decimal(value) for value in filters['iva']])
+    return queryset
+
+
+def compute_cube(queryset):
+    """``[(categoría, rango, en_stock, iva, productos)]`` en una consulta agrupada"""
+    band = Case(
+        *[When(band_q(low, high), then=Value(band_key(low, high))) for low, high in PRICE_BANDS],
+        output_field=CharField(),
+    )
+    rows = queryset.order_by().annotate(
+        price_band=band, has_stock=in_stock_expression()
+    ).values('category_id', 'price_band', 'has_stock', 'iva_percentage').annotate(total=Count('pk'))
+    return [
+        (str(row['category_id']), row['price_band'], '1' if row['has_stock'] else '0',
+         str(row['iva_percentage']), row['total'])
+        for row in rows
+    ]
+
+
+def get_cube(queryset, search):
+    """Cubo de ``queryset`` (sin filtros de facetas), cacheado por búsqueda"""
+    def compute():
+        base = queryset
+        if search:
+            base = queryset.filter(pk__in=search_products(queryset, search).values('pk'))
+        return compute_cube(base)
+    return catalog_cache.get_or_set('facet_cube', (search or '',), compute)
+
+
+def count_facets(cube, filters):
+    """``{faceta: {valor: productos}}`` con los filtros de las demás facetas aplicados"""
+    counts = {facet: {} for facet in FACETS}
+    for cell in cube:
+        values, total = dict(zip(FACETS, cell[:4])), cell[4]
+        for facet in FACETS:
+            matches = all(
+                values[other] in filters[other]
+                for other in FACETS if other != facet and other in filters
+            )
+            if matches:
+                counts[facet][values[facet]] = counts[facet].get(values[facet], 0) + total
+    return counts
+
+
+def toggle_url(params, facet, value):
+    """Query string con ``value`` agregado o quitado de ``facet`` (sin cursor)"""
+    query = params.copy()
+    query.pop('cursor', None)
+    values = query.getlist(facet)
+    if value in values:
+        values.remove(value)
+    else:
+        values.append(value)
+    query.setlist(facet, values)
+    return f'?{query.urlencode()}'
+
+
+def build_facets(cube, filters, params, categories):
+    """Estructura para la plantilla: por faceta, opciones con etiqueta, conteo y URL"""
+    counts = count_facets(cube, filters)
+
+    def options(facet, choices):
+        selected = filters.get(facet, frozenset())
+        return [
+            {
+                'value': value,
+                'label': label,
+                'count': counts[facet].get(value, 0),
+                'selected': value in selected,
+                'url': toggle_url(params, facet, value),
+            }
+            for value, label in choices
+            if counts[facet].get(value, 0) or value in selected
+        ]
+
+    rates = sorted(set(counts['iva']) | filters.get('iva', frozenset()), key=Decimal)
+    return [
+        {'name': 'category', 'title': 'Categoría',
+         'options': options('category', [(str(c['id']), c['name']) for c in categories])},
+        {'name': 'price', 'title': 'Precio',
+         'options': options('price', [(band_key(low, high), band_label(low, high)) for low, high in PRICE_BANDS])},
+        {'name': 'in_stock', 'title': 'Disponibilidad', 'options': options('in_stock', [('1', 'En stock')])},
+        {'name': 'iva', 'title': 'IVA',
+         'options': options('iva', [(rate, f'{Decimal(rate).normalize():f}%') for rate in rates])},
+    ]
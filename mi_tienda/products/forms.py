@@ -17,7 +17,36 @@ class CategoryForm(forms.ModelForm):
             })
         }
 
-class ProductForm(forms.ModelForm):
+class ProductStockForm(forms.ModelForm):
+    """Campo ``stock`` para formularios de producto.
+
+    ``Product.stock`` ya no es una columna del modelo: el campo se declara
+    aquí, se inicializa desde el contador y se asigna a la instancia al
+    guardar, que lo escribe en ``ProductStock``.
+    """
+    stock = forms.IntegerField(min_value=0, initial=0, label="Stock disponible")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk and 'stock' in self.fields:
+            self.initial.setdefault('stock', self.instance.stock)
+
+    def save(self, commit=True):
+        if 'stock' in self.cleaned_data:
+            self.instance.stock = self.cleaned_data['stock']
+        return super().save(commit)
+
+class ProductForm(ProductStockForm):
+    stock = forms.IntegerField(
+        min_value=0,
+        initial=0,
+        label="Stock disponible",
+        widget=forms.NumberInput(attrs={
+            'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500',
+            'placeholder': '0'
+        })
+    )
+
     class Meta:
         model = Product
         fields = ['name', 'description', 'additional_info', 'image', 'unit_price', 
@@ -50,10 +79,6 @@ class ProductForm(forms.ModelForm):
             'category': forms.Select(attrs={
                 'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500'
             }),
-            'stock': forms.NumberInput(attrs={
-                'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500',
-                'placeholder': '0'
-            }),
             'image': forms.FileInput(attrs={
                 'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500'
             })
@@ -0,0 +1,219 @@
+"""Variantes redimensionadas de las imágenes de producto.
+
+Al guardar un producto con una imagen nueva se programa, tras el commit, la
+generación de variantes WebP y JPEG para cada ancho de
+``PRODUCT_IMAGE_WIDTHS``. La codificación corre en un pool de procesos
+(``PRODUCT_IMAGE_WORKERS``) y un hilo despachador guarda los archivos y las
+filas ``ProductImageVariant``, así la petición que subió la imagen no espera.
+Con ``PRODUCT_IMAGE_ASYNC = False`` todo se hace en línea (útil en tests).
+"""
+import hashlib
+import io
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import (
+    ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait,
+)
+from functools import partial
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import Exists, OuterRef
+
+logger = logging.getLogger(__name__)
+
+PIL_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+_lock = threading.Lock()
+_process_pool = None
+_dispatcher = None
+
+
+def get_widths():
+    return tuple(getattr(settings, 'PRODUCT_IMAGE_WIDTHS', (320, 640, 1024)))
+
+
+def get_formats():
+    return tuple(getattr(settings, 'PRODUCT_IMAGE_FORMATS', ('webp', 'jpeg')))
+
+
+def get_quality():
+    return getattr(settings, 'PRODUCT_IMAGE_QUALITY', 80)
+
+
+def get_workers():
+    return max(int(getattr(settings, 'PRODUCT_IMAGE_WORKERS', 2)), 1)
+
+
+def render_variants(data, widths, formats, quality=80):
+    """Redimensiona ``data`` (bytes de una imagen) a cada ancho y formato.
+
+    Devuelve ``[(formato, ancho, alto, bytes)]``. No usa Django para poder
+    ejecutarse en otro proceso. Nunca amplía: los anchos mayores que el
+    original se generan con el ancho original.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original)
+        has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    results = []
+    for width in sorted({min(width, image.width) for width in widths}):
+        height = max(round(image.height * width / image.width), 1)
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for format in formats:
+            output = resized
+            if format == 'jpeg' and output.mode == 'RGBA':
+                # JPEG no admite transparencia: se compone sobre fondo blanco
+                output = Image.new('RGB', resized.size, 'white')
+                output.paste(resized, mask=resized.getchannel('A'))
+            buffer = io.BytesIO()
+            output.save(buffer, PIL_FORMATS[format], quality=quality, optimize=True, progressive=True)
+            results.append((format, width, height, buffer.getvalue()))
+    return results
+
+
+def _spawn_pool(workers):
+    # ``spawn`` y no ``fork``: el proceso web tiene hilos y conexiones abiertas
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def get_process_pool():
+    global _process_pool
+    with _lock:
+        if _process_pool is None:
+            _process_pool = _spawn_pool(get_workers())
+        return _process_pool
+
+
+def get_dispatcher():
+    global _dispatcher
+    with _lock:
+        if _dispatcher is None:
+            _dispatcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix='product-images')
+        return _dispatcher
+
+
+def read_source(name):
+    from .models import Product
+
+    with Product._meta.get_field('image').storage.open(name, 'rb') as source:
+        return source.read()
+
+
+def store_variants(product_id, source, rendered):
+    """Reemplaza las variantes de ``product_id`` por ``rendered``.
+
+    No hace nada si mientras tanto la imagen del producto cambió o el
+    producto se eliminó. Devuelve las variantes creadas.
+    """
+    from . import cache as catalog_cache
+    from .models import Product, ProductImageVariant
+
+    digest = hashlib.sha1(source.encode()).hexdigest()[:10]
+    with transaction.atomic():
+        current = Product.objects.select_for_update().filter(pk=product_id).values_list('image', flat=True)
+        if list(current) != [source]:
+            return []
+        variants = []
+        for format, width, height, data in rendered:
+            variant = ProductImageVariant(
+                product_id=product_id, source=source, format=format, width=width, height=height
+            )
+            variant.file.save(f'{product_id}-{digest}-{width}.{EXTENSIONS[format]}', ContentFile(data), save=False)
+            variants.append(variant)
+        # Los archivos anteriores se borran al confirmar (ver signals.py)
+        ProductImageVariant.objects.filter(product_id=product_id).delete()
+        ProductImageVariant.objects.bulk_create(variants)
+    catalog_cache.bump_generation()
+    return variants
+
+
+def generate_variants(product_id):
+    """Genera y guarda las variantes de la imagen actual de ``product_id``"""
+    from .models import Product, ProductImageVariant
+
+    source = Product.objects.filter(pk=product_id).values_list('image', flat=True).first()
+    if not source:
+        ProductImageVariant.objects.filter(product_id=product_id).delete()
+        return []
+    args = (read_source(source), get_widths(), get_formats(), get_quality())
+    if getattr(settings, 'PRODUCT_IMAGE_ASYNC', True):
+        rendered = get_process_pool().submit(render_variants, *args).result()
+    else:
+        rendered = render_variants(*args)
+    return store_variants(product_id, source, rendered)
+
+
+def _generate_in_background(product_id):
+    try:
+        generate_variants(product_id)
+    except Exception:
+        logger.exception('No se pudieron generar las variantes de imagen del producto %s', product_id)
+    finally:
+        close_old_connections()
+
+
+def _submit(product_id):
+    if getattr(settings, 'PRODUCT_IMAGE_ASYNC', True):
+        get_dispatcher().submit(_generate_in_background, product_id)
+    else:
+        generate_variants(product_id)
+
+
+def schedule_variants(product):
+    """Programa la generación de variantes al confirmarse la transacción actual"""
+    transaction.on_commit(partial(_submit, product.pk))
+
+
+def backfill_variants(queryset, workers=None, force=False):
+    """Genera en paralelo las variantes que falten en ``queryset``.
+
+    Con ``force=True`` también regenera las que ya existen. Devuelve
+    ``(procesados, fallidos)``.
+    """
+    from .models import ProductImageVariant
+
+    products = queryset.exclude(image='').exclude(image__isnull=True)
+    if not force:
+        products = products.exclude(Exists(
+            ProductImageVariant.objects.filter(product=OuterRef('pk'), source=OuterRef('image'))
+        ))
+    rows = list(products.order_by('pk').values_list('pk', 'image'))
+    workers = workers or get_workers()
+    options = (get_widths(), get_formats(), get_quality())
+    processed = failed = 0
+
+    def drain(pending, return_when):
+        nonlocal processed, failed
+        done, _ = wait(pending, return_when=return_when)
+        for future in done:
+            product_id, source = pending.pop(future)
+            try:
+                store_variants(product_id, source, future.result())
+                processed += 1
+            except Exception:
+                logger.exception('No se pudieron generar las variantes de imagen del producto %s', product_id)
+                failed += 1
+
+    with _spawn_pool(workers) as pool:
+        pending = {}
+        for product_id, source in rows:
+            try:
+                data = read_source(source)
+            except OSError:
+                logger.warning('Imagen no encontrada para el producto %s: %s', product_id, source)
+                failed += 1
+                continue
+            pending[pool.submit(render_variants, data, *options)] = (product_id, source)
+            # Acotar la memoria: como mucho dos imágenes en cola por proceso
+            if len(pending) >= workers * 2:
+                drain(pending, FIRST_COMPLETED)
+        if pending:
+            drain(pending, ALL_COMPLETED)
+    return processed, failed
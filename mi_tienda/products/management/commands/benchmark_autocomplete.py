@@ -0,0 +1,71 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from products import autocomplete
+from products.models import Category, Product
+
+from .benchmark_search import SYLLABLES, WORDS
+
+
+def percentile(samples, fraction):
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)]
+
+
+class Command(BaseCommand):
+    help = 'Mide la latencia del autocompletado (p50/p99) con prefijos de 1 a 6 letras'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=0,
+                            help='Productos sintéticos a crear (se revierten al terminar)')
+        parser.add_argument('--queries', type=int, default=20000)
+        parser.add_argument('--limit', type=int, default=8)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['products']:
+                self.seed(options['products'])
+            start = time.perf_counter()
+            index = autocomplete.build_index()
+            build = (time.perf_counter() - start) * 1000
+            # No dejar datos sintéticos en la base de datos
+            transaction.set_rollback(True)
+
+        names = list(index.products.labels.values()) + list(index.categories.labels.values())
+        if not names:
+            self.stderr.write('No hay productos ni categorías para medir')
+            return
+        self.stdout.write(f'Índice: {len(index.products)} productos, {len(index.categories)} categorías, '
+                          f'{len(index.products.keys)} claves, construido en {build:.0f} ms')
+
+        rng = random.Random(42)
+        queries = []
+        for _ in range(options['queries']):
+            words = rng.choice(names).split()
+            word = rng.choice(words)
+            queries.append(word[:rng.randint(1, 6)])
+
+        samples = []
+        for query in queries:
+            start = time.perf_counter_ns()
+            autocomplete.complete(query, options['limit'], index=index)
+            samples.append(time.perf_counter_ns() - start)
+        samples.sort()
+        p50, p99 = percentile(samples, 0.5) / 1000, percentile(samples, 0.99) / 1000
+        style = self.style.SUCCESS if p99 < 1000 else self.style.WARNING
+        self.stdout.write(style(
+            f'{len(samples)} consultas: p50 {p50:.0f} µs, p99 {p99:.0f} µs, máx {samples[-1] / 1000:.0f} µs'
+        ))
+
+    def seed(self, count):
+        rng = random.Random(7)
+        vocabulary = WORDS + [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES]
+        category = Category.objects.create(name=f'benchmark-{time.time()}')
+        Product.objects.bulk_create([
+            Product(name=' '.join(rng.sample(vocabulary, 3)), description='-',
+                    unit_price=Decimal('1000.00'), category=category)
+            for _ in range(count)
+        ], batch_size=1000)
+        self.stdout.write(f'{count} productos sintéticos creados')
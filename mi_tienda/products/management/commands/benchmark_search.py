@@ -0,0 +1,80 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from products.models import Category, Product
+from products.search import MySQLFulltextBackend, get_backend, search_products
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'ru', 'ta', 'vi', 'zo', 'pe', 'su']
+
+WORDS = [
+    'zapatilla', 'running', 'camión', 'clásica', 'cuero', 'negro', 'blanco',
+    'talla', 'niño', 'mujer', 'hombre', 'deportiva', 'suela', 'ligera',
+    'montaña', 'algodón', 'edición', 'especial', 'adidas', 'nike',
+]
+
+
+class Command(BaseCommand):
+    help = 'Compara la búsqueda indexada con el filtro name__icontains'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=0,
+                            help='Productos sintéticos a crear (se revierten al terminar)')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('queries', nargs='*',
+                            default=['zapatilla', 'cuero negro', 'kaloru', 'ref 12345'])
+
+    def handle(self, *args, **options):
+        if options['products'] and isinstance(get_backend(), MySQLFulltextBackend):
+            # InnoDB agrega las filas al índice FULLTEXT al confirmar la transacción:
+            # los productos sintéticos, que se revierten, nunca aparecerían en él
+            self.stderr.write(
+                'El backend FULLTEXT de MySQL no se puede medir con productos sintéticos '
+                '(no se indexan hasta el COMMIT). Ejecute sin --products sobre datos reales.'
+            )
+            return
+        with transaction.atomic():
+            if options['products']:
+                self.seed(options['products'])
+            for query in options['queries']:
+                self.compare(query, options['repeat'])
+            # No dejar datos sintéticos en la base de datos
+            transaction.set_rollback(True)
+
+    def seed(self, count):
+        rng = random.Random(42)
+        # Vocabulario amplio para que haya términos comunes y términos raros
+        vocabulary = WORDS + [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES]
+        category = Category.objects.create(name=f'benchmark-{time.time()}')
+        Product.objects.bulk_create([
+            Product(
+                name=' '.join(rng.sample(vocabulary, 3)),
+                description=' '.join(rng.choices(vocabulary, k=20)),
+                additional_info=f'ref {n} ' + ' '.join(rng.choices(WORDS, k=4)),
+                unit_price=Decimal('1000.00'),
+                category=category,
+            )
+            for n in range(count)
+        ], batch_size=1000)
+        # En MySQL bulk_create no devuelve los ids, por eso se vuelven a leer
+        get_backend().index_products(category.products.all())
+        self.stdout.write(f'{count} productos sintéticos creados')
+
+    def compare(self, query, repeat):
+        base = Product.objects.filter(is_active=True)
+        timings = {}
+        for label, build in (
+            ('icontains', lambda: base.filter(name__icontains=query)),
+            ('índice', lambda: search_products(base, query)),
+        ):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                results = list(build()[:12])
+            timings[label] = (time.perf_counter() - start) / repeat * 1000
+            timings[f'{label}_n'] = len(results)
+        self.stdout.write(
+            f'"{query}": icontains {timings["icontains"]:.2f} ms ({timings["icontains_n"]} resultados), '
+            f'índice {timings["índice"]:.2f} ms ({timings["índice_n"]} resultados)'
+        )
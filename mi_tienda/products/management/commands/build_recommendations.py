@@ -0,0 +1,23 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from products.recommendations import build_co_purchases
+
+
+class Command(BaseCommand):
+    help = 'Acumula los pares de productos comprados juntos en los pedidos pagados nuevos (ejecutar periódicamente)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--lag', type=int, default=300,
+                            help='Segundos de antigüedad mínima de los pagos procesados')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        orders, pairs = build_co_purchases(
+            batch_size=options['batch_size'], lag=timedelta(seconds=options['lag'])
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{orders} pedidos procesados, {pairs} pares actualizados en {time.perf_counter() - start:.2f}s'
+        ))
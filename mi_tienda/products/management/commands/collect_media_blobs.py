@@ -0,0 +1,41 @@
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand
+from products.models import Product
+from products.storage import blob_storage, is_blob
+
+
+class Command(BaseCommand):
+    help = 'Mueve las imágenes de producto subidas antes del almacenamiento por contenido a blobs deduplicados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete-originals', action='store_true',
+                            help='Borra los archivos originales que ya no use ningún producto')
+
+    def handle(self, *args, **options):
+        legacy = FileSystemStorage(location=blob_storage.location)
+        originals = set()
+        moved = missing = 0
+        for product in Product.objects.exclude(image='').exclude(image__isnull=True).order_by('pk'):
+            name = product.image.name
+            if is_blob(name):
+                continue
+            if not legacy.exists(name):
+                self.stderr.write(f'Producto {product.pk}: no existe {name}')
+                missing += 1
+                continue
+            with legacy.open(name, 'rb') as original:
+                product.image.name = blob_storage.save(name, original)
+            # save() actualiza las referencias y regenera las variantes
+            product.save(update_fields=['image', 'updated_at'])
+            originals.add(name)
+            moved += 1
+
+        deleted = 0
+        if options['delete_originals']:
+            for name in originals:
+                if not Product.objects.filter(image=name).exists():
+                    legacy.delete(name)
+                    deleted += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'{moved} imágenes movidas a blobs, {missing} no encontradas, {deleted} originales eliminados'
+        ))
@@ -0,0 +1,60 @@
+import json
+import os
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from products.catalog_io import open_output
+from products.changes import InvalidCheckpoint, decode_checkpoint, iter_changes
+
+
+class Command(BaseCommand):
+    help = 'Escribe en JSON Lines los cambios del catálogo desde un punto de control'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help="Archivo de salida ('-' para stdout)")
+        parser.add_argument('--since', help='Punto de control de la sincronización anterior')
+        parser.add_argument(
+            '--state', help='Archivo con el punto de control: se lee al empezar y se actualiza al terminar'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--lag', type=float, help='Ignorar cambios de los últimos N segundos (por defecto CATALOG_CHANGES_LAG)'
+        )
+
+    def handle(self, *args, **options):
+        checkpoint = options['since']
+        state = options['state']
+        if checkpoint is None and state and os.path.exists(state):
+            with open(state, encoding='utf-8') as source:
+                checkpoint = source.read().strip() or None
+        lag = None if options['lag'] is None else timedelta(seconds=options['lag'])
+        try:
+            decode_checkpoint(checkpoint)
+        except InvalidCheckpoint:
+            raise CommandError('Punto de control inválido')
+
+        start = time.perf_counter()
+        output = open_output(options['path'])
+        target = output or self.stdout
+        changes = 0
+        try:
+            more = True
+            while more:
+                for change in iter_changes(checkpoint, options['batch_size'], lag):
+                    if change['type'] == 'checkpoint':
+                        checkpoint, more = change['checkpoint'], change['more']
+                    else:
+                        target.write(json.dumps(change, ensure_ascii=False) + '\n')
+                        changes += 1
+        finally:
+            if output:
+                output.close()
+
+        if state:
+            with open(state, 'w', encoding='utf-8') as destination:
+                destination.write(checkpoint + '\n')
+        elapsed = time.perf_counter() - start
+        # A stderr para no mezclarse con los cambios por stdout
+        self.stderr.write(f'{changes} cambios en {elapsed:.2f}s', style_func=self.style.SUCCESS)
+        self.stderr.write(f'Punto de control: {checkpoint}')
@@ -0,0 +1,40 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+from products.catalog_io import detect_format, export_rows, open_output, write_rows
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Exporta el catálogo a CSV o JSON Lines (en streaming, por lotes de clave primaria)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help="Archivo de salida ('-' para stdout)")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Por defecto según la extensión')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--category', help='Solo los productos de esta categoría (nombre)')
+        parser.add_argument('--active', action='store_true', help='Solo productos activos')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = detect_format(path, options['format'])
+        products = Product.objects.all()
+        if options['category']:
+            products = products.filter(category__name=options['category'])
+        if options['active']:
+            products = products.filter(is_active=True)
+
+        start = time.perf_counter()
+        output = open_output(path)
+        try:
+            rows = write_rows(export_rows(products, options['batch_size']), output or self.stdout, format)
+        finally:
+            if output:
+                output.close()
+        elapsed = time.perf_counter() - start
+        # El resumen va a stderr para no mezclarse con la exportación por stdout
+        self.stderr.write(
+            f'{rows} filas en {elapsed:.2f}s ({rows / elapsed if elapsed else 0:.0f} filas/s)',
+            style_func=self.style.SUCCESS,
+        )
@@ -0,0 +1,17 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from products.storage import collect_garbage
+
+
+class Command(BaseCommand):
+    help = 'Borra en lotes los blobs de imágenes que ya no usa ningún producto (ejecutar periódicamente)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--grace', type=int, default=3600,
+                            help='Segundos que un blob debe llevar sin referencias antes de borrarse')
+
+    def handle(self, *args, **options):
+        deleted = collect_garbage(batch_size=options['batch_size'], grace=timedelta(seconds=options['grace']))
+        self.stdout.write(self.style.SUCCESS(f'{deleted} blobs eliminados'))
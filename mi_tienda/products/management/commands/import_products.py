@@ -0,0 +1,68 @@
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from products.catalog_io import detect_format, has_multiline_records, import_range, split_ranges
+
+
+def _import_part(args):
+    path, format, start, end, batch_size, create_categories = args
+    try:
+        return import_range(path, format, start, end, batch_size, create_categories)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Importa productos desde CSV o JSON Lines (upsert por SKU, en lotes y en paralelo)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Por defecto según la extensión')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Procesos; el archivo se reparte por rangos de bytes')
+        parser.add_argument('--no-create-categories', action='store_true',
+                            help='Rechaza las filas cuya categoría no exista')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = detect_format(path, options['format'])
+        workers = max(options['workers'], 1)
+        create_categories = not options['no_create_categories']
+        if workers > 1 and connections['default'].vendor == 'sqlite':
+            self.stderr.write('SQLite no admite escrituras concurrentes: se importa con un solo proceso')
+            workers = 1
+        start = time.perf_counter()
+        try:
+            if workers > 1 and format == 'csv' and has_multiline_records(path):
+                self.stderr.write('El CSV tiene registros de varias líneas y no se puede dividir: '
+                                  'se importa con un solo proceso')
+                workers = 1
+            if workers == 1:
+                results = [import_range(path, format, batch_size=options['batch_size'],
+                                        create_categories=create_categories)]
+            else:
+                parts = [
+                    (path, format, begin, end, options['batch_size'], create_categories)
+                    for begin, end in split_ranges(path, workers)
+                ]
+                # Cada proceso abre su propia conexión
+                connections.close_all()
+                with multiprocessing.get_context('fork').Pool(workers) as pool:
+                    results = pool.map(_import_part, parts)
+        except OSError as error:
+            raise CommandError(error)
+        elapsed = time.perf_counter() - start
+
+        rows = sum(result['rows'] for result in results)
+        error_count = sum(result['error_count'] for result in results)
+        for result in results:
+            for line, message in result['errors']:
+                self.stderr.write(f'{line}: {message}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{rows} filas en {elapsed:.2f}s ({rows / elapsed if elapsed else 0:.0f} filas/s): '
+            f'{sum(r["created"] for r in results)} creados, {sum(r["updated"] for r in results)} actualizados, '
+            f'{error_count} con errores'
+        ))
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+from products.images import backfill_variants
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Genera en paralelo las variantes redimensionadas de las imágenes de producto que falten'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help='Procesos (por defecto PRODUCT_IMAGE_WORKERS)')
+        parser.add_argument('--force', action='store_true', help='Regenera también las variantes existentes')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        processed, failed = backfill_variants(
+            Product.objects.all(), workers=options['workers'], force=options['force']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{processed} productos procesados, {failed} con errores en {time.perf_counter() - start:.2f}s'
+        ))
@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+from products import autocomplete
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de autocompletado y su snapshot compartido'
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        index = autocomplete.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(index.products)} productos y {len(index.categories)} categorías en '
+            f'{(time.perf_counter() - start) * 1000:.0f} ms -> {autocomplete.get_snapshot_path()}'
+        ))
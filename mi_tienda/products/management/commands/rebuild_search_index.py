@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from products.models import Product
+from products.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda de productos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        batch_size = options['batch_size']
+        batch = []
+        total = 0
+        for product in Product.objects.order_by('pk').iterator(chunk_size=batch_size):
+            batch.append(product)
+            if len(batch) >= batch_size:
+                backend.index_products(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            backend.index_products(batch)
+            total += len(batch)
+        self.stdout.write(self.style.SUCCESS(f'{total} productos indexados'))
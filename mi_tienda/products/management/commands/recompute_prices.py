@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Recalcula iva_amount y price_with_iva de los productos (tras updates masivos de precios o IVA)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--category', type=int, help='Solo los productos de esta categoría')
+
+    def handle(self, *args, **options):
+        products = Product.objects.all()
+        if options['category']:
+            products = products.filter(category_id=options['category'])
+        changed = products.recompute_prices(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{changed} productos actualizados'))
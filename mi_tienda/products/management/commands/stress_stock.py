@@ -0,0 +1,75 @@
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+from products.models import Category, Product
+from products.stock import decrement_stock
+
+
+class Command(BaseCommand):
+    help = 'Descuenta stock de un mismo producto desde muchos hilos y verifica que no se sobrevenda'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--attempts', type=int, default=25, help='Intentos por hilo')
+        parser.add_argument('--stock', type=int, default=100)
+        parser.add_argument('--quantity', type=int, default=1)
+        parser.add_argument('--retries', type=int, default=20,
+                            help='Reintentos ante errores de bloqueo de la base de datos')
+
+    def handle(self, *args, **options):
+        category = Category.objects.create(name=f'stress-{time.time()}')
+        product = Product.objects.create(
+            name='Producto de prueba de concurrencia',
+            description='-',
+            unit_price=Decimal('1.00'),
+            stock=options['stock'],
+            category=category,
+        )
+        try:
+            sold, rejected, errors = self.hammer(product.pk, options)
+            product.refresh_from_db()
+        finally:
+            category.delete()
+
+        expected = options['stock'] - sold * options['quantity']
+        self.stdout.write(
+            f'vendidos={sold} rechazados={rejected} errores={errors} '
+            f'stock_final={product.stock} esperado={expected}'
+        )
+        if product.stock != expected or product.stock < 0 or sold * options['quantity'] > options['stock']:
+            raise CommandError('Sobreventa detectada')
+        self.stdout.write(self.style.SUCCESS('Sin sobreventa'))
+
+    def hammer(self, product_id, options):
+        counters = {'sold': 0, 'rejected': 0, 'errors': 0}
+        lock = threading.Lock()
+        start = threading.Barrier(options['threads'])
+
+        def worker():
+            start.wait()
+            try:
+                for _ in range(options['attempts']):
+                    outcome = 'errors'
+                    for _ in range(options['retries']):
+                        try:
+                            with transaction.atomic():
+                                failed = decrement_stock({product_id: options['quantity']})
+                            outcome = 'rejected' if failed else 'sold'
+                            break
+                        except OperationalError:
+                            # Tabla bloqueada (SQLite) o deadlock: se reintenta
+                            time.sleep(0.001)
+                    with lock:
+                        counters[outcome] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return counters['sold'], counters['rejected'], counters['errors']
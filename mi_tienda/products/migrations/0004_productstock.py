@@ -0,0 +1,54 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Sum
+
+
+def copy_stock_to_counters(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductStock = apps.get_model('products', 'ProductStock')
+    ProductStock.objects.bulk_create(
+        (
+            ProductStock(product_id=pk, shard=0, quantity=stock)
+            for pk, stock in Product.objects.values_list('pk', 'stock').iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+def copy_counters_to_stock(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductStock = apps.get_model('products', 'ProductStock')
+    totals = ProductStock.objects.values('product_id').annotate(total=Sum('quantity'))
+    for row in totals.iterator():
+        Product.objects.filter(pk=row['product_id']).update(stock=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_product_cursor_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField(default=0)),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_counters', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'Contador de stock',
+                'verbose_name_plural': 'Contadores de stock',
+                'unique_together': {('product', 'shard')},
+            },
+        ),
+        migrations.RunPython(copy_stock_to_counters, copy_counters_to_stock),
+        migrations.RemoveField(
+            model_name='product',
+            name='stock',
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:11
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def fill_price_columns(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    cent = Decimal('0.01')
+    products = []
+    for product in Product.objects.only('unit_price', 'iva_percentage').iterator():
+        product.iva_amount = (product.unit_price * product.iva_percentage / 100).quantize(cent)
+        product.price_with_iva = (product.unit_price + product.iva_amount).quantize(cent)
+        products.append(product)
+    Product.objects.bulk_update(products, ['iva_amount', 'price_with_iva'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_productstock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='iva_amount',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=12, verbose_name='Monto IVA'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='price_with_iva',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=12, verbose_name='Precio con IVA'),
+        ),
+        migrations.RunPython(fill_price_columns, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['price_with_iva', 'id'], name='products_pr_price_w_e65f5b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'price_with_iva', 'id'], name='products_pr_categor_f0a9fe_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:12
+
+from django.db import migrations, models
+
+
+def reset_co_purchases(apps, schema_editor):
+    # Las cuentas anteriores incluían pedidos sin pagar: se recalculan desde cero
+    apps.get_model('products', 'CoPurchase').objects.all().delete()
+    apps.get_model('products', 'CoPurchaseCheckpoint').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_product_price_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='copurchasecheckpoint',
+            name='last_paid_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(reset_co_purchases, migrations.RunPython.noop),
+    ]
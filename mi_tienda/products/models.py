@@ -1,6 +1,18 @@
 from django.db import models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 from decimal import Decimal
+from . import money
+from .storage import get_blob_storage
+
+def calculate_prices(unit_price, iva_percentage):
+    """Devuelve ``(iva_amount, price_with_iva)`` redondeados a centavos (ver ``money.py``)"""
+    unit_cents = money.to_cents(str(unit_price))
+    iva_cents = money.unit_iva(unit_cents, money.to_basis_points(str(iva_percentage)))
+    return money.from_cents(iva_cents), money.from_cents(unit_cents + iva_cents)
+
 
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True, verbose_name="Nombre")
@@ -16,8 +28,57 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+class ProductQuerySet(models.QuerySet):
+    def with_stock(self):
+        """Anota el stock total para que ``Product.stock`` no haga una consulta por fila"""
+        totals = ProductStock.objects.filter(product=OuterRef('pk')).order_by().values(
+            'product'
+        ).annotate(total=Sum('quantity')).values('total')
+        return self.annotate(stock_total=Coalesce(Subquery(totals), 0))
+
+    def recompute_prices(self, batch_size=1000):
+        """Recalcula las columnas de precio en lotes y devuelve cuántas filas cambiaron.
+
+        Necesario después de ``update()`` o ``bulk_update()`` sobre
+        ``unit_price`` o ``iva_percentage``, que no pasan por ``save()``.
+        """
+        changed = 0
+        last_pk = 0
+        version = None
+        while True:
+            batch = list(
+                self.filter(pk__gt=last_pk).order_by('pk')
+                .only('unit_price', 'iva_percentage', 'iva_amount', 'price_with_iva', 'price_version')[:batch_size]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            stale = []
+            now = timezone.now()
+            for product in batch:
+                prices = calculate_prices(product.unit_price, product.iva_percentage)
+                if prices != (product.iva_amount, product.price_with_iva):
+                    product.iva_amount, product.price_with_iva = prices
+                    # bulk_update no aplica auto_now y la API valida con updated_at
+                    product.updated_at = now
+                    stale.append(product)
+            if stale and version is None:
+                from .pricing import bump_price_version
+                version = bump_price_version()
+            for product in stale:
+                product.price_version = version
+            self.model.objects.bulk_update(stale, ['iva_amount', 'price_with_iva', 'updated_at', 'price_version'])
+            changed += len(stale)
+        if changed:
+            from .cache import bump_generation
+            bump_generation()
+        return changed
+
+
 class Product(models.Model):
     name = models.CharField(max_length=200, verbose_name="Nombre")
+    # Código del proveedor; clave estable para import_products/export_products
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True, verbose_name="SKU")
     description = models.TextField(verbose_name="Descripción")
     additional_info = models.TextField(
         blank=True, 
@@ -26,6 +87,7 @@ class Product(models.Model):
     )
     image = models.ImageField(
         upload_to='products/',
+        storage=get_blob_storage,
         blank=True,
         null=True,
         verbose_name="Imagen"
@@ -43,36 +105,316 @@ class Product(models.Model):
         validators=[MinValueValidator(Decimal('0')), MaxValueValidator(Decimal('100'))],
         verbose_name="IVA (%)"
     )
+    # Columnas derivadas de unit_price e iva_percentage, recalculadas en save()
+    # (o con ``manage.py recompute_prices`` tras updates masivos) para poder
+    # ordenar y filtrar por precio final con índice
+    iva_amount = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        editable=False,
+        verbose_name="Monto IVA"
+    )
+    price_with_iva = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        editable=False,
+        verbose_name="Precio con IVA"
+    )
+    # Versión de precios (ver ``pricing.py``) del último cambio de precio o disponibilidad
+    price_version = models.PositiveBigIntegerField(default=0, editable=False)
     category = models.ForeignKey(
         Category,
         on_delete=models.CASCADE,
         related_name='products',
         verbose_name="Categoría"
     )
-    stock = models.PositiveIntegerField(default=0, verbose_name="Stock disponible")
     is_active = models.BooleanField(default=True, verbose_name="Activo")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
+    # Valor de stock asignado y pendiente de escribir en ``ProductStock``
+    _pending_stock = None
+    # Nombre de la imagen tal como se leyó de la base de datos
+    _loaded_image = ''
+    # ``(name, is_active)`` leídos: si no cambian no se toca el autocompletado
+    _loaded_suggestion = None
+    # ``(unit_price, iva_percentage, is_active)`` leídos: si cambian sube la versión de precios
+    _loaded_prices = None
+
     class Meta:
         verbose_name = "Producto"
         verbose_name_plural = "Productos"
         ordering = ['-created_at']
+        indexes = [
+            # Paginación por cursor sobre (created_at, id)
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['category', 'created_at', 'id']),
+            # Orden y rango por precio final
+            models.Index(fields=['price_with_iva', 'id']),
+            models.Index(fields=['category', 'price_with_iva', 'id']),
+            # Feed de cambios (ver ``products.changes``)
+            models.Index(fields=['updated_at', 'id']),
+        ]
 
     def __str__(self):
         return self.name
 
-    @property
-    def iva_amount(self):
-        """Calcula el monto del IVA"""
-        return (self.unit_price * self.iva_percentage / 100).quantize(Decimal('0.01'))
+    def update_prices(self):
+        """Recalcula ``iva_amount`` y ``price_with_iva``"""
+        self.iva_amount, self.price_with_iva = calculate_prices(self.unit_price, self.iva_percentage)
 
     @property
-    def price_with_iva(self):
-        """Calcula el precio con IVA incluido"""
-        return (self.unit_price + self.iva_amount).quantize(Decimal('0.01'))
+    def stock(self):
+        """Stock disponible, guardado fuera de la fila del producto (ver ``ProductStock``)"""
+        if self._pending_stock is not None:
+            return self._pending_stock
+        if 'stock_total' not in self.__dict__:
+            from .stock import get_stock
+            self.stock_total = get_stock([self.pk]).get(self.pk, 0) if self.pk else 0
+        return self.stock_total
+
+    @stock.setter
+    def stock(self, value):
+        self._pending_stock = int(value)
+
+    def save_stock(self):
+        """Escribe el stock asignado (si lo hay) sin tocar la fila del producto"""
+        if self._pending_stock is not None:
+            from .stock import set_stock
+            set_stock({self.pk: self._pending_stock})
+            self.stock_total = self._pending_stock
+            self._pending_stock = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'image' in instance.__dict__:
+            instance._loaded_image = instance.image.name or ''
+        if 'name' in instance.__dict__ and 'is_active' in instance.__dict__:
+            instance._loaded_suggestion = (instance.name, instance.is_active)
+        if {'unit_price', 'iva_percentage', 'is_active'} <= instance.__dict__.keys():
+            instance._loaded_prices = (instance.unit_price, instance.iva_percentage, instance.is_active)
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.update_prices()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'unit_price', 'iva_percentage'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'iva_amount', 'price_with_iva'}
+        prices = (self.unit_price, self.iva_percentage, self.is_active)
+        if self._loaded_prices is not None and self._loaded_prices != prices:
+            # Los carritos con esta línea la revaloran (ver ``pricing.py``)
+            from .pricing import bump_price_version
+            self.price_version = bump_price_version()
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'price_version'}
+        super().save(*args, **kwargs)
+        self.save_stock()
+        self._loaded_prices = prices
+        image = self.image.name or ''
+        if image != self._loaded_image:
+            # Las variantes se generan fuera de la petición (ver ``images.py``)
+            from .images import schedule_variants
+            schedule_variants(self)
+            self._loaded_image = image
+        if self._loaded_suggestion != (self.name, self.is_active):
+            # Las sugerencias se actualizan al confirmar (ver ``autocomplete.py``)
+            from .autocomplete import schedule_refresh
+            schedule_refresh('product', self.pk)
+            self._loaded_suggestion = (self.name, self.is_active)
+
+    def refresh_from_db(self, *args, **kwargs):
+        self.__dict__.pop('stock_total', None)
+        self._pending_stock = None
+        super().refresh_from_db(*args, **kwargs)
+        if 'image' in self.__dict__:
+            self._loaded_image = self.image.name or ''
+        if 'name' in self.__dict__ and 'is_active' in self.__dict__:
+            self._loaded_suggestion = (self.name, self.is_active)
+        if {'unit_price', 'iva_percentage', 'is_active'} <= self.__dict__.keys():
+            self._loaded_prices = (self.unit_price, self.iva_percentage, self.is_active)
 
     def get_image_url(self):
         if self.image:
             return self.image.url
-        return '/static/images/no-image.png'
\ No newline at end of file
+        return '/static/images/no-image.png'
+
+    def get_image_variants(self):
+        """Variantes de la imagen actual (usa ``prefetch_related('image_variants')`` si está)"""
+        if not self.image:
+            return []
+        return [v for v in self.image_variants.all() if v.source == self.image.name]
+
+    def image_srcset(self, format='webp'):
+        """Valor para el atributo ``srcset``: ``"url 320w, url 640w"``"""
+        return ', '.join(
+            f'{variant.file.url} {variant.width}w'
+            for variant in sorted(self.get_image_variants(), key=lambda v: v.width)
+            if variant.format == format
+        )
+
+    @property
+    def webp_srcset(self):
+        return self.image_srcset('webp')
+
+    @property
+    def jpeg_srcset(self):
+        return self.image_srcset('jpeg')
+
+    def get_thumbnail_url(self, width=320):
+        """JPEG más pequeño de al menos ``width`` px; el original si aún no hay variantes"""
+        variants = sorted(
+            (v for v in self.get_image_variants() if v.format == 'jpeg'), key=lambda v: v.width
+        )
+        for variant in variants:
+            if variant.width >= width:
+                return variant.file.url
+        return variants[-1].file.url if variants else self.get_image_url()
+
+class CatalogVersion(models.Model):
+    """Contador que crece con cada cambio de un aspecto del catálogo (ver ``products.pricing``)"""
+    name = models.CharField(max_length=32, unique=True)
+    value = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Versión del catálogo"
+        verbose_name_plural = "Versiones del catálogo"
+
+    def __str__(self):
+        return f'{self.name} v{self.value}'
+
+
+class ProductTombstone(models.Model):
+    """Marca de un producto eliminado, para que el feed de cambios informe el borrado"""
+    product_id = models.BigIntegerField()
+    sku = models.CharField(max_length=64, null=True, blank=True)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Producto eliminado"
+        verbose_name_plural = "Productos eliminados"
+        indexes = [
+            models.Index(fields=['deleted_at', 'id']),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} eliminado {self.deleted_at:%Y-%m-%d %H:%M}'
+
+
+class ProductImageVariant(models.Model):
+    """Versión redimensionada de ``Product.image`` (ver ``products.images``)"""
+    FORMAT_CHOICES = [
+        ('webp', 'WebP'),
+        ('jpeg', 'JPEG'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='image_variants')
+    # Nombre de la imagen original de la que salió la variante
+    source = models.CharField(max_length=255)
+    format = models.CharField(max_length=4, choices=FORMAT_CHOICES)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    file = models.FileField(upload_to='products/variants/', max_length=255)
+
+    class Meta:
+        verbose_name = "Variante de imagen"
+        verbose_name_plural = "Variantes de imagen"
+        ordering = ['product', 'format', 'width']
+
+    def __str__(self):
+        return f'{self.product_id} {self.format} {self.width}x{self.height}'
+
+
+class MediaBlob(models.Model):
+    """Archivo guardado una sola vez bajo su hash (ver ``products.storage``)"""
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Blob de medios"
+        verbose_name_plural = "Blobs de medios"
+        indexes = [
+            # Candidatos del recolector: sin referencias y más antiguos primero
+            models.Index(fields=['refcount', 'updated_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.refcount})'
+
+
+class ProductStock(models.Model):
+    """Contador de inventario de un producto.
+
+    El stock vive en esta tabla estrecha para que los cambios frecuentes no
+    reescriban la fila de ``Product`` (ni su ``updated_at``) ni compitan con
+    la edición del catálogo. Con ``STOCK_COUNTER_SHARDS`` > 1 cada producto
+    tiene varias filas que se suman al leer, repartiendo la contención.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_counters')
+    shard = models.PositiveSmallIntegerField(default=0)
+    quantity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Contador de stock"
+        verbose_name_plural = "Contadores de stock"
+        unique_together = ['product', 'shard']
+
+    def __str__(self):
+        return f'{self.product_id}[{self.shard}] = {self.quantity}'
+
+
+class ProductSearchTerm(models.Model):
+    """Entrada del índice invertido de búsqueda (ver ``products.search``)"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='search_terms')
+    term = models.CharField(max_length=64, db_index=True)
+    weight = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        unique_together = ['term', 'product']
+
+    def __str__(self):
+        return f'{self.term} -> {self.product_id}'
+
+
+class CoPurchase(models.Model):
+    """Cuántos pedidos incluyeron ``product`` y ``related`` a la vez.
+
+    Se guarda en ambas direcciones para que las recomendaciones de un
+    producto sean un único rango sobre el índice ``(product, -count)``.
+    La tabla la mantiene ``manage.py build_recommendations``.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='co_purchases')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Compra conjunta"
+        verbose_name_plural = "Compras conjuntas"
+        unique_together = ['product', 'related']
+        indexes = [
+            models.Index(fields=['product', '-count', 'related']),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} + {self.related_id} ({self.count})'
+
+
+class CoPurchaseCheckpoint(models.Model):
+    """Último pedido pagado procesado por ``build_recommendations`` (una sola fila).
+
+    La posición es ``(last_paid_at, last_order_id)``: los pedidos se recorren
+    por fecha de pago y el id desempata.
+    """
+    last_order_id = models.BigIntegerField(default=0)
+    last_paid_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Pagos procesados hasta {self.last_paid_at} (#{self.last_order_id})'
@@ -0,0 +1,97 @@
+"""Aritmética de dinero en centavos enteros.
+
+Precios e IVA se llevan como enteros: centavos para los montos y puntos
+básicos para las tasas (19,00 % = 1900). Los totales de un carrito o un
+pedido se calculan con :func:`compute` en una sola pasada y sin ``Decimal``;
+solo al final se convierten con :func:`from_cents`.
+
+Redondeo (``settings.IVA_ROUNDING``), siempre al centavo y al par más
+cercano en los empates (como ``Decimal.quantize``):
+
+- ``'unit'`` (por defecto): el IVA se redondea por unidad y se multiplica
+  por la cantidad. Es el ``iva_amount`` que guarda el catálogo, así que el
+  total coincide con ``price_with_iva × cantidad`` que ve el cliente.
+- ``'line'``: el IVA se redondea una vez por línea (precio × cantidad).
+- ``'document'``: el IVA se calcula por tasa sobre la base de todo el
+  documento y se redondea una vez por tasa. El IVA por línea de
+  ``Totals.lines`` se informa redondeado por línea y puede no sumar
+  exactamente el total.
+"""
+from collections import namedtuple
+from decimal import ROUND_HALF_EVEN, Decimal
+
+from django.conf import settings
+
+UNIT, LINE, DOCUMENT = 'unit', 'line', 'document'
+ROUNDING_MODES = (UNIT, LINE, DOCUMENT)
+
+# Montos en centavos; ``lines`` es ``[(subtotal, iva)]`` en el orden recibido (o ``None``)
+Totals = namedtuple('Totals', ['subtotal', 'iva', 'total', 'lines'])
+
+
+def to_cents(value):
+    """``Decimal('1190.50')`` -> ``119050``"""
+    return int(Decimal(value).scaleb(2).to_integral_value(ROUND_HALF_EVEN))
+
+
+def to_basis_points(percentage):
+    """``Decimal('19.00')`` -> ``1900``"""
+    return to_cents(percentage)
+
+
+def from_cents(cents):
+    """``119050`` -> ``Decimal('1190.50')``"""
+    return Decimal(cents).scaleb(-2)
+
+
+def _divide(numerator, denominator):
+    """División entera redondeada al par más cercano (montos no negativos)"""
+    quotient, remainder = divmod(numerator, denominator)
+    if remainder * 2 > denominator or (remainder * 2 == denominator and quotient % 2):
+        quotient += 1
+    return quotient
+
+
+def unit_iva(unit_cents, rate):
+    """IVA de una unidad, en centavos"""
+    return _divide(unit_cents * rate, 10000)
+
+
+def get_rounding():
+    rounding = getattr(settings, 'IVA_ROUNDING', UNIT)
+    if rounding not in ROUNDING_MODES:
+        raise ValueError(f'IVA_ROUNDING desconocido: {rounding!r}')
+    return rounding
+
+
+def compute(lines, rounding=None, per_line=False):
+    """Totales de ``lines``, un iterable de ``(precio_unitario, tasa, cantidad)``.
+
+    Precio en centavos y tasa en puntos básicos. Devuelve ``Totals`` con
+    todos los montos en centavos; ``lines`` solo se llena con ``per_line``.
+    """
+    rounding = rounding or get_rounding()
+    subtotal = iva = 0
+    results = [] if per_line else None
+    bases = {}
+    for unit_cents, rate, quantity in lines:
+        line_subtotal = unit_cents * quantity
+        # ``_divide`` en línea: esta es la parte caliente del cálculo
+        if rounding == UNIT:
+            line_iva, remainder = divmod(unit_cents * rate, 10000)
+            if remainder > 5000 or (remainder == 5000 and line_iva & 1):
+                line_iva += 1
+            line_iva *= quantity
+        else:
+            line_iva, remainder = divmod(line_subtotal * rate, 10000)
+            if remainder > 5000 or (remainder == 5000 and line_iva & 1):
+                line_iva += 1
+            if rounding == DOCUMENT:
+                bases[rate] = bases.get(rate, 0) + line_subtotal
+        subtotal += line_subtotal
+        iva += line_iva
+        if per_line:
+            results.append((line_subtotal, line_iva))
+    if rounding == DOCUMENT:
+        iva = sum(_divide(base * rate, 10000) for rate, base in bases.items())
+    return Totals(subtotal, iva, subtotal + iva, results)
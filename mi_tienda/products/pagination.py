@@ -0,0 +1,193 @@
+"""Paginación por cursor (keyset).
+
+En lugar de ``OFFSET`` y ``COUNT(*)`` se recuerda la posición del último
+elemento mostrado y la siguiente página se pide con ``WHERE (created_at, id)
+< (...)``, de modo que la página N cuesta lo mismo que la primera.
+"""
+import base64
+import datetime
+import json
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder recorta los microsegundos y el cursor necesita el
+    # valor exacto de ``created_at`` para no saltarse filas
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+# Precisión de la cuenta de ``approximate_count``
+EXACT, AT_LEAST, ESTIMATE = 'exact', 'at_least', 'estimate'
+
+
+def approximate_count(queryset, limit=1000):
+    """Cuenta aproximada y barata de ``queryset``.
+
+    Si la consulta no tiene filtros y la base de datos es MySQL se usa la
+    estadística de la tabla, una estimación de InnoDB que puede quedar por
+    encima o por debajo (``ESTIMATE``); en otro caso se cuentan como máximo
+    ``limit`` + 1 filas y, si las hay, la cuenta es ``limit`` (``AT_LEAST``:
+    hay más). Devuelve ``(cuenta, precisión)``.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'mysql' and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT TABLE_ROWS FROM information_schema.TABLES '
+                'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row and row[0] is not None:
+            return row[0], ESTIMATE
+    count = queryset.order_by()[:limit + 1].count()
+    if count > limit:
+        return limit, AT_LEAST
+    return count, EXACT
+
+
+class CursorPage:
+    def __init__(self, paginator, object_list, has_next, has_previous):
+        self.paginator = paginator
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __repr__(self):
+        return f'<CursorPage: {len(self)} objetos>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next:
+            return self.paginator.encode_cursor(self.object_list[-1], 'next')
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous:
+            return self.paginator.encode_cursor(self.object_list[0], 'previous')
+        return None
+
+
+class CursorPaginator:
+    """Paginador keyset sobre ``ordering`` (por defecto ``(-created_at, -id)``).
+
+    El último campo del ordenamiento debe ser único para que el cursor
+    identifique una posición exacta. Con ``approximate_count=True`` la
+    propiedad ``count`` usa :func:`approximate_count` en lugar de ``COUNT(*)``.
+    """
+
+    def __init__(self, queryset, per_page, ordering=('-created_at', '-id'), approximate_count=False):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.approximate_count = approximate_count
+
+    @cached_property
+    def count_info(self):
+        if self.approximate_count:
+            return approximate_count(self.queryset)
+        return self.queryset.count(), EXACT
+
+    @property
+    def count(self):
+        return self.count_info[0]
+
+    @property
+    def count_precision(self):
+        return self.count_info[1]
+
+    @property
+    def count_is_exact(self):
+        return self.count_info[1] == EXACT
+
+    def _fields(self):
+        return [(field.lstrip('-'), field.startswith('-')) for field in self.ordering]
+
+    def encode_cursor(self, obj, direction):
+        values = [getattr(obj, name) for name, _ in self._fields()]
+        payload = json.dumps([direction[0], values], cls=CursorEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        except (ValueError, TypeError):
+            raise InvalidCursor(cursor)
+        if direction not in ('n', 'p') or not isinstance(values, list) or len(values) != len(self.ordering):
+            raise InvalidCursor(cursor)
+        return direction == 'p', values
+
+    def _seek_filter(self, values, backwards):
+        """``(a, b, c) > (va, vb, vc)`` respetando la dirección de cada campo."""
+        conditions = []
+        fields = self._fields()
+        for i, (name, descending) in enumerate(fields):
+            lookup = 'gt' if descending == backwards else 'lt'
+            equal = {fields[j][0]: values[j] for j in range(i)}
+            conditions.append(Q(**equal, **{f'{name}__{lookup}': values[i]}))
+        return reduce(or_, conditions)
+
+    def page(self, cursor=None):
+        backwards = False
+        queryset = self.queryset
+        if cursor:
+            backwards, values = self.decode_cursor(cursor)
+            try:
+                queryset = queryset.filter(self._seek_filter(values, backwards))
+            except (ValidationError, ValueError, TypeError):
+                raise InvalidCursor(cursor)
+
+        ordering = self.ordering
+        if backwards:
+            ordering = [f[1:] if f.startswith('-') else f'-{f}' for f in ordering]
+        rows = list(queryset.order_by(*ordering)[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if backwards:
+            if not rows:
+                return self.page()
+            rows.reverse()
+            return CursorPage(self, rows, has_next=True, has_previous=has_more)
+        return CursorPage(self, rows, has_next=has_more, has_previous=bool(cursor))
+
+    def get_page(self, cursor=None):
+        """Como :meth:`page`, pero un cursor inválido devuelve la primera página."""
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page()
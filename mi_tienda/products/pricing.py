@@ -0,0 +1,50 @@
+"""Versión de precios del catálogo.
+
+Un contador en ``CatalogVersion`` que sube cada vez que cambia el precio de
+algún producto o deja de estar a la venta (``Product.save``,
+``recompute_prices``, importaciones, borrados). El producto cambiado guarda
+el valor nuevo en ``Product.price_version``.
+
+Los carritos guardan los precios de sus líneas junto con la versión con la
+que los fijaron: si la versión vigente es la misma, los precios siguen
+valiendo sin consultar los productos; si no, solo se revaloran las líneas
+cuyo producto tiene un ``price_version`` posterior (ver ``cart.cart``).
+
+``get_version`` y ``bump_version`` sirven igual para otros contadores,
+como el de las reglas de ``promotions``.
+
+El contador se lee siempre de la base de datos (una consulta por el índice
+único de ``name``): la caché del catálogo puede ser local a cada proceso y
+un cambio hecho en otro (una importación, ``recompute_prices``, otro
+worker) no se vería. Con ``request`` la lectura se hace una sola vez por
+petición.
+"""
+from django.db.models import F
+
+from .models import CatalogVersion
+
+PRICES = 'prices'
+
+
+def get_version(name, request=None):
+    """Valor vigente del contador ``name``; con ``request``, leído una vez por petición"""
+    versions = request.__dict__.setdefault('_catalog_versions', {}) if request is not None else {}
+    if name not in versions:
+        versions[name] = CatalogVersion.objects.filter(name=name).values_list('value', flat=True).first() or 0
+    return versions[name]
+
+
+def bump_version(name):
+    """Incrementa el contador ``name`` y devuelve el valor nuevo"""
+    CatalogVersion.objects.get_or_create(name=name)
+    CatalogVersion.objects.filter(name=name).update(value=F('value') + 1)
+    return CatalogVersion.objects.get(name=name).value
+
+
+def get_price_version(request=None):
+    return get_version(PRICES, request)
+
+
+def bump_price_version():
+    """Incrementa la versión de precios y devuelve el valor nuevo"""
+    return bump_version(PRICES)
@@ -0,0 +1,123 @@
+"""Recomendaciones "comprados juntos frecuentemente".
+
+``build_co_purchases`` recorre en lotes los pedidos pagados desde el último
+punto de control y acumula en ``CoPurchase`` cuántas veces aparece cada par
+de productos en un mismo pedido. ``get_related_products`` sirve los vecinos
+más frecuentes desde la caché del catálogo y completa con productos de la
+misma categoría cuando no hay suficientes datos.
+"""
+from datetime import timedelta
+from itertools import permutations
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from orders.models import Order, OrderItem
+from . import cache as catalog_cache
+from .models import CoPurchase, CoPurchaseCheckpoint, Product
+
+# Pedidos con más líneas que esto no se usan: aportan n² pares poco útiles
+MAX_ORDER_LINES = 50
+
+
+def count_pairs(order_products):
+    """``{(a, b): pedidos}`` a partir de ``{order_id: {product_id, ...}}``"""
+    counts = {}
+    for products in order_products.values():
+        if len(products) > MAX_ORDER_LINES:
+            continue
+        for pair in permutations(sorted(products), 2):
+            counts[pair] = counts.get(pair, 0) + 1
+    return counts
+
+
+def _merge_counts(counts):
+    """Suma ``counts`` a las filas de ``CoPurchase`` (crea las que falten)"""
+    existing = {
+        (row.product_id, row.related_id): row
+        for row in CoPurchase.objects.filter(
+            product_id__in={a for a, _ in counts}, related_id__in={b for _, b in counts}
+        )
+    }
+    to_update, to_create = [], []
+    for (product_id, related_id), count in counts.items():
+        row = existing.get((product_id, related_id))
+        if row is None:
+            to_create.append(CoPurchase(product_id=product_id, related_id=related_id, count=count))
+        else:
+            row.count += count
+            to_update.append(row)
+    CoPurchase.objects.bulk_update(to_update, ['count'], batch_size=1000)
+    CoPurchase.objects.bulk_create(to_create, batch_size=1000)
+
+
+def build_co_purchases(batch_size=500, lag=timedelta(minutes=5)):
+    """Procesa los pedidos pagados nuevos y devuelve ``(pedidos, pares)`` procesados.
+
+    Solo cuentan los pedidos pagados, recorridos por ``payment_date``: un
+    pedido puede pagarse mucho después de creado (incluso con la reserva
+    vencida) y uno abandonado nunca se cuenta. Solo se leen pagos de hace
+    más de ``lag``, para no saltarse uno cuya transacción todavía no se
+    confirmó. Cada lote se confirma junto con el punto de control, así que
+    una ejecución interrumpida no cuenta dos veces ningún pedido.
+    """
+    paid = Order.objects.filter(payment_status=True, payment_date__lte=timezone.now() - lag)
+    orders = pairs = 0
+    while True:
+        with transaction.atomic():
+            checkpoint, _ = CoPurchaseCheckpoint.objects.select_for_update().get_or_create(pk=1)
+            pending = paid
+            if checkpoint.last_paid_at is not None:
+                pending = paid.filter(
+                    Q(payment_date__gt=checkpoint.last_paid_at)
+                    | Q(payment_date=checkpoint.last_paid_at, pk__gt=checkpoint.last_order_id)
+                )
+            batch = list(pending.order_by('payment_date', 'pk').values_list('pk', 'payment_date')[:batch_size])
+            if not batch:
+                break
+            order_ids = [pk for pk, _ in batch]
+
+            order_products = {}
+            for order_id, product_id in OrderItem.objects.filter(order_id__in=order_ids).values_list(
+                'order_id', 'product_id'
+            ):
+                order_products.setdefault(order_id, set()).add(product_id)
+            counts = count_pairs(order_products)
+            _merge_counts(counts)
+
+            checkpoint.last_order_id, checkpoint.last_paid_at = batch[-1]
+            checkpoint.save()
+        orders += len(order_ids)
+        pairs += len(counts)
+
+    if pairs:
+        catalog_cache.bump_generation()
+    return orders, pairs
+
+
+def related_product_ids(product, limit=4):
+    """Ids de los productos comprados junto a ``product``, completando con su categoría"""
+    ids = list(
+        CoPurchase.objects.filter(product=product, related__is_active=True)
+        .order_by('-count', 'related_id')
+        .values_list('related_id', flat=True)[:limit]
+    )
+    if len(ids) < limit:
+        ids += Product.objects.filter(
+            category_id=product.category_id, is_active=True
+        ).exclude(pk__in=[product.pk, *ids]).order_by('-created_at', '-id').values_list(
+            'pk', flat=True
+        )[:limit - len(ids)]
+    return ids
+
+
+def get_related_products(product, limit=4):
+    """Productos recomendados para ``product``, en orden de relevancia"""
+    ids = catalog_cache.get_or_set(
+        'related_products', (product.pk, limit), lambda: related_product_ids(product, limit)
+    )
+    if not ids:
+        return []
+    products = Product.objects.in_bulk(ids)
+    return [products[pk] for pk in ids if pk in products]
@@ -0,0 +1,178 @@
+"""Búsqueda de productos con índice invertido.
+
+El backend se elige con ``settings.PRODUCT_SEARCH_BACKEND``. En local se usa
+``InvertedIndexBackend`` (tabla ``ProductSearchTerm``, funciona en cualquier
+base de datos) y en producción puede usarse ``MySQLFulltextBackend``, que se
+apoya en el índice FULLTEXT creado por la migración 0002.
+"""
+import re
+import unicodedata
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+# Peso de cada campo del producto en el ranking
+FIELD_WEIGHTS = {
+    'name': 5,
+    'additional_info': 2,
+    'description': 1,
+}
+
+SPANISH_STOPWORDS = frozenset("""
+    a al algo ante antes como con contra cual cuando de del desde donde durante
+    e el ella ellas ellos en entre era es esa ese eso esta este esto hasta la las
+    le les lo los mas me mi muy ni no nos o otra otro para pero poco por que se
+    sin sobre su sus tambien te tu un una uno unos unas y ya
+""".split())
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def normalize(text):
+    """Pasa a minúsculas y elimina tildes (``Camión`` -> ``camion``)."""
+    text = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def stem(token):
+    """Stemming mínimo para plurales en español."""
+    if len(token) > 4 and token.endswith('es') and token[-3] not in 'aeiou':
+        return token[:-2]
+    if len(token) > 3 and token.endswith('s'):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    """Lista de términos normalizados, sin stopwords."""
+    return [
+        stem(token)
+        for token in TOKEN_RE.findall(normalize(text))
+        if token not in SPANISH_STOPWORDS
+    ]
+
+
+class BaseSearchBackend:
+    """Interfaz común de los backends de búsqueda."""
+
+    def index_products(self, products):
+        """Indexa (o reindexa) una colección de productos."""
+
+    def remove_products(self, product_ids):
+        """Elimina productos del índice."""
+
+    def search(self, queryset, query):
+        """Filtra ``queryset`` por ``query`` y lo ordena por relevancia."""
+        raise NotImplementedError
+
+    def index_product(self, product):
+        self.index_products([product])
+
+    def remove_product(self, product_id):
+        self.remove_products([product_id])
+
+
+class InvertedIndexBackend(BaseSearchBackend):
+    """Índice invertido en la tabla ``ProductSearchTerm``.
+
+    Cada término apunta a los productos que lo contienen con un peso que
+    combina la frecuencia y el campo donde aparece. Las búsquedas son por
+    prefijo y se resuelven con un rango sobre el índice de ``term``.
+    """
+
+    def build_terms(self, product):
+        weights = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(getattr(product, field)):
+                term = term[:64]
+                weights[term] = weights.get(term, 0) + weight
+        return weights
+
+    def index_products(self, products):
+        from .models import ProductSearchTerm
+
+        products = list(products)
+        rows = [
+            ProductSearchTerm(product_id=product.pk, term=term, weight=weight)
+            for product in products
+            for term, weight in self.build_terms(product).items()
+        ]
+        with transaction.atomic():
+            self.remove_products([product.pk for product in products])
+            ProductSearchTerm.objects.bulk_create(rows, batch_size=1000)
+
+    def remove_products(self, product_ids):
+        from .models import ProductSearchTerm
+
+        ProductSearchTerm.objects.filter(product_id__in=list(product_ids)).delete()
+
+    @staticmethod
+    def prefix_range(term, field='term'):
+        # ``term LIKE 'x%'`` no usa el índice en SQLite; un rango sí, en
+        # cualquier motor. Los términos solo contienen [a-z0-9] y '{' va
+        # justo después de 'z'.
+        return Q(**{f'{field}__gte': term, f'{field}__lt': term + '{'})
+
+    def search(self, queryset, query):
+        from .models import ProductSearchTerm
+
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return queryset.none()
+
+        # Cada término debe aparecer (AND por prefijo). El primero se resuelve
+        # con el JOIN que da el ranking; el resto con semi-joins sobre el índice
+        for term in terms[1:]:
+            queryset = queryset.filter(pk__in=ProductSearchTerm.objects.filter(
+                self.prefix_range(term)
+            ).values('product_id'))
+
+        # El ranking es el peso acumulado de los términos coincidentes
+        prefixes = reduce(or_, (self.prefix_range(term, 'search_terms__term') for term in terms))
+        return queryset.filter(prefixes).annotate(
+            search_rank=Sum('search_terms__weight')
+        ).order_by('-search_rank', '-created_at', '-id')
+
+
+class MySQLFulltextBackend(BaseSearchBackend):
+    """Búsqueda con ``MATCH ... AGAINST`` sobre el índice FULLTEXT de MySQL.
+
+    MySQL mantiene el índice por sí mismo, así que indexar y eliminar no
+    hacen nada. Las colaciones ``*_ci`` ya ignoran tildes.
+    """
+
+    def search(self, queryset, query):
+        from .models import Product
+
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return queryset.none()
+
+        table = Product._meta.db_table
+        columns = ', '.join(f'{table}.{field}' for field in FIELD_WEIGHTS)
+        against = ' '.join(f'+{term}*' for term in terms)
+        match = RawSQL(f'MATCH ({columns}) AGAINST (%s IN BOOLEAN MODE)', (against,))
+        return queryset.annotate(search_rank=match).filter(
+            search_rank__gt=0
+        ).order_by('-search_rank', '-created_at', '-id')
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'PRODUCT_SEARCH_BACKEND', 'products.search.InvertedIndexBackend')
+        _backend = import_string(path)()
+    return _backend
+
+
+def search_products(queryset, query):
+    """Atajo usado por las vistas."""
+    return get_backend().search(queryset, query)
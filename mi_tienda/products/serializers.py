@@ -0,0 +1,49 @@
+from rest_framework import serializers
+
+from .models import Category, Product
+
+
+class SparseFieldsetMixin:
+    """Con ``?fields=id,name`` la respuesta incluye solo esos campos"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        wanted = request and request.query_params.get('fields')
+        if wanted:
+            wanted = {name.strip() for name in wanted.split(',')}
+            for name in set(self.fields) - wanted:
+                self.fields.pop(name)
+
+
+class CategorySummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Category
+        fields = ['id', 'name']
+
+
+class CategorySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Category
+        fields = ['id', 'name', 'description', 'created_at', 'updated_at']
+
+
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    # El stock no se expone: no cambia ``updated_at`` y dejaría obsoletos los ETag
+    category = CategorySummarySerializer(read_only=True)
+    image = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Product
+        fields = [
+            'id', 'sku', 'name', 'description', 'additional_info', 'category',
+            'unit_price', 'iva_percentage', 'iva_amount', 'price_with_iva',
+            'image', 'created_at', 'updated_at',
+        ]
+
+    def get_image(self, product):
+        if not product.image:
+            return None
+        request = self.context.get('request')
+        url = product.image.url
+        return request.build_absolute_uri(url) if request else url
@@ -0,0 +1,80 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from . import autocomplete
+from . import cache as catalog_cache
+from . import storage as blob_storage
+from .models import Category, Product, ProductImageVariant, ProductTombstone
+from .pricing import bump_price_version
+from .search import get_backend
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    """Mantiene el índice de búsqueda al día al guardar un producto"""
+    if raw:
+        return
+    get_backend().index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    get_backend().remove_product(instance.pk)
+
+
+@receiver(post_delete, sender=Product)
+def record_tombstone(sender, instance, **kwargs):
+    """Deja constancia del borrado para el feed de cambios"""
+    ProductTombstone.objects.create(product_id=instance.pk, sku=instance.sku)
+
+
+@receiver(post_delete, sender=Product)
+def bump_prices_on_delete(sender, instance, **kwargs):
+    """Los carritos que lo tenían dejan de contar esa línea"""
+    bump_price_version()
+
+
+@receiver(post_save, sender=Product)
+def track_image_references(sender, instance, raw=False, **kwargs):
+    """Cuenta las referencias a los blobs cuando cambia la imagen"""
+    image = instance.image.name or ''
+    if raw or image == instance._loaded_image:
+        return
+    blob_storage.retain(image)
+    blob_storage.release(instance._loaded_image)
+
+
+@receiver(post_delete, sender=Product)
+def release_image(sender, instance, **kwargs):
+    blob_storage.release(instance.image.name)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_cache(sender, **kwargs):
+    """Cualquier cambio en el catálogo invalida las páginas cacheadas"""
+    catalog_cache.bump_generation()
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_suggestions(sender, instance, **kwargs):
+    """Quita el producto del autocompletado al confirmar (al guardar lo hace ``save()``)"""
+    autocomplete.schedule_refresh('product', instance.pk)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def refresh_category_suggestions(sender, instance, raw=False, **kwargs):
+    if not raw:
+        autocomplete.schedule_refresh('category', instance.pk)
+
+
+@receiver(post_delete, sender=ProductImageVariant)
+def delete_variant_file(sender, instance, **kwargs):
+    """Borra el archivo de la variante cuando se confirma la eliminación"""
+    if instance.file:
+        transaction.on_commit(partial(instance.file.storage.delete, instance.file.name))
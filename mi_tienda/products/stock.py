@@ -0,0 +1,196 @@
+"""Inventario: lectura, asignación y descuento atómico de stock.
+
+El stock se guarda en ``ProductStock``, repartido en ``STOCK_COUNTER_SHARDS``
+filas por producto que se suman al leer. Las escrituras nunca tocan la fila
+de ``Product``.
+
+Todas las líneas de un pedido se descuentan juntas o ninguna. El camino
+rápido es un único UPDATE condicionado (``quantity >= cantidad``) sobre un
+contador elegido al azar por producto; si algún contador no alcanza, se
+bloquean todos los contadores de los productos en orden ``(product_id,
+shard)`` para no generar deadlocks y se descuenta repartiendo entre ellos.
+"""
+import random
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Sum, Value, When
+
+from .models import ProductStock
+
+
+class InsufficientStock(Exception):
+    """Alguna línea no tiene stock suficiente.
+
+    ``failed`` es un diccionario ``{product_id: disponible}``.
+    """
+    def __init__(self, failed):
+        self.failed = failed
+        super().__init__(f'Stock insuficiente para los productos {sorted(failed)}')
+
+
+def get_shard_count():
+    return max(int(getattr(settings, 'STOCK_COUNTER_SHARDS', 1)), 1)
+
+
+def normalize_lines(lines):
+    """Agrupa las líneas en ``{product_id: cantidad}``"""
+    if isinstance(lines, dict):
+        lines = lines.items()
+    quantities = {}
+    for product_id, quantity in lines:
+        quantities[int(product_id)] = quantities.get(int(product_id), 0) + int(quantity)
+    return quantities
+
+
+def shortages(quantities, available):
+    """Líneas de ``quantities`` que superan ``available``"""
+    return {
+        product_id: available.get(product_id, 0)
+        for product_id, quantity in quantities.items()
+        if available.get(product_id, 0) < quantity
+    }
+
+
+def get_stock(product_ids):
+    """``{product_id: stock}`` sumando los contadores de cada producto"""
+    product_ids = list(product_ids)
+    totals = dict(
+        ProductStock.objects.filter(product_id__in=product_ids).order_by()
+        .values('product_id').annotate(total=Sum('quantity'))
+        .values_list('product_id', 'total')
+    )
+    return {product_id: totals.get(product_id, 0) for product_id in product_ids}
+
+
+def _lock_counters(product_ids):
+    """Bloquea los contadores en orden ``(product_id, shard)`` y los agrupa por producto"""
+    counters = {}
+    for counter in (
+        ProductStock.objects.select_for_update()
+        .filter(product_id__in=list(product_ids))
+        .order_by('product_id', 'shard')
+    ):
+        counters.setdefault(counter.product_id, []).append(counter)
+    return counters
+
+
+def lock_stock(product_ids):
+    """Como :func:`get_stock`, pero con los contadores bloqueados hasta el fin de la transacción"""
+    product_ids = list(product_ids)
+    counters = _lock_counters(product_ids)
+    return {
+        product_id: sum(counter.quantity for counter in counters.get(product_id, []))
+        for product_id in product_ids
+    }
+
+
+def _spread(value, shards):
+    """Reparte ``value`` entre los contadores (el resto va al contador 0)"""
+    base, remainder = divmod(value, shards)
+    return [base + (remainder if shard == 0 else 0) for shard in range(shards)]
+
+
+def set_stock(values):
+    """Asigna el stock total ``{product_id: cantidad}``, repartido entre los contadores"""
+    values = normalize_lines(values)
+    shards = get_shard_count()
+    with transaction.atomic():
+        counters = _lock_counters(values.keys())
+        to_create, to_update = [], []
+        for product_id, value in values.items():
+            existing = {counter.shard: counter for counter in counters.get(product_id, [])}
+            parts = _spread(value, shards)
+            for shard in sorted(set(existing) | set(range(shards))):
+                quantity = parts[shard] if shard < shards else 0
+                counter = existing.get(shard)
+                if counter is None:
+                    to_create.append(ProductStock(product_id=product_id, shard=shard, quantity=quantity))
+                elif counter.quantity != quantity:
+                    counter.quantity = quantity
+                    to_update.append(counter)
+        ProductStock.objects.bulk_create(to_create)
+        ProductStock.objects.bulk_update(to_update, ['quantity'])
+
+
+def _delta(quantities):
+    return Case(
+        *[When(product_id=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+class _FastPathMiss(Exception):
+    pass
+
+
+def _decrement_fast(quantities):
+    """Un UPDATE sobre un contador al azar por producto; falla si alguno no alcanza"""
+    shards = get_shard_count()
+    targets = reduce(or_, (
+        Q(product_id=product_id, shard=random.randrange(shards)) for product_id in quantities
+    ))
+    delta = _delta(quantities)
+    try:
+        with transaction.atomic():
+            updated = ProductStock.objects.filter(
+                targets, quantity__gte=delta
+            ).update(quantity=F('quantity') - delta)
+            if updated != len(quantities):
+                raise _FastPathMiss
+    except _FastPathMiss:
+        return False
+    return True
+
+
+def decrement_stock(lines):
+    """Descuenta ``lines`` (``{product_id: cantidad}`` o pares) del inventario.
+
+    Devuelve ``{product_id: disponible}`` con las líneas que no alcanzan; si
+    hay alguna, no se descuenta nada. Debe llamarse dentro de la transacción
+    del pedido para que el descuento se confirme junto con él.
+    """
+    quantities = normalize_lines(lines)
+    if not quantities:
+        return {}
+    if _decrement_fast(quantities):
+        return {}
+
+    with transaction.atomic():
+        counters = _lock_counters(quantities.keys())
+        available = {
+            product_id: sum(counter.quantity for counter in counters.get(product_id, []))
+            for product_id in quantities
+        }
+        failed = shortages(quantities, available)
+        if failed:
+            return failed
+
+        # Hay stock suficiente pero repartido: se descuenta de varios contadores
+        changed = []
+        for product_id, quantity in quantities.items():
+            for counter in counters[product_id]:
+                taken = min(counter.quantity, quantity)
+                if taken:
+                    counter.quantity -= taken
+                    quantity -= taken
+                    changed.append(counter)
+        ProductStock.objects.bulk_update(changed, ['quantity'])
+    return {}
+
+
+def increment_stock(lines):
+    """Devuelve stock al inventario (pedido cancelado, reserva liberada)"""
+    quantities = normalize_lines(lines)
+    if not quantities:
+        return
+    shards = get_shard_count()
+    with transaction.atomic():
+        for product_id, quantity in sorted(quantities.items()):
+            counter, _ = ProductStock.objects.get_or_create(
+                product_id=product_id, shard=random.randrange(shards)
+            )
+            ProductStock.objects.filter(pk=counter.pk).update(quantity=F('quantity') + quantity)
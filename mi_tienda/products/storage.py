@@ -0,0 +1,114 @@
+"""Almacenamiento direccionado por contenido para las imágenes de producto.
+
+Cada archivo se guarda una sola vez en ``blobs/<aa>/<sha256><ext>``: subir
+la misma imagen dos veces devuelve el mismo nombre en lugar de crear
+``foto_M68Iaoe.jpg``. La tabla ``MediaBlob`` cuenta cuántos productos usan
+cada blob (ver ``signals.py``) y ``collect_garbage`` borra en lotes los que
+llevan un tiempo sin referencias. Como la URL cambia cuando cambia el
+contenido, ``serve_blob`` los sirve con caché inmutable de un año.
+"""
+import hashlib
+import os
+import uuid
+from datetime import timedelta
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+BLOB_PREFIX = 'blobs'
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(f'{BLOB_PREFIX}/')
+
+
+def hash_content(content):
+    """``(sha256, tamaño)`` de un ``File`` leído por bloques"""
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in content.chunks():
+        digest.update(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """``FileSystemStorage`` que nombra cada archivo por el hash de su contenido"""
+
+    def get_available_name(self, name, max_length=None):
+        # El nombre definitivo lo decide _save a partir del contenido
+        return name
+
+    def _save(self, name, content):
+        from .models import MediaBlob
+
+        digest, size = hash_content(content)
+        extension = os.path.splitext(name)[1].lower()
+        blob_name = f'{BLOB_PREFIX}/{digest[:2]}/{digest}{extension}'
+        # Registrar (o renovar) el blob antes de mirar el disco: si el
+        # recolector lo está borrando, esto espera a que termine
+        MediaBlob.objects.update_or_create(name=blob_name, defaults={'size': size})
+        if not self.exists(blob_name):
+            # Se escribe con un nombre temporal y se renombra, así dos
+            # subidas simultáneas del mismo archivo no se pisan a medias
+            temporary = super()._save(f'{BLOB_PREFIX}/tmp/{uuid.uuid4().hex}{extension}', content)
+            os.makedirs(os.path.dirname(self.path(blob_name)), exist_ok=True)
+            os.replace(self.path(temporary), self.path(blob_name))
+        return blob_name
+
+
+blob_storage = ContentAddressedStorage()
+
+
+def get_blob_storage():
+    return blob_storage
+
+
+def retain(name):
+    """Suma una referencia al blob ``name``"""
+    from .models import MediaBlob
+
+    if not is_blob(name):
+        return
+    MediaBlob.objects.get_or_create(name=name)
+    MediaBlob.objects.filter(name=name).update(refcount=F('refcount') + 1, updated_at=timezone.now())
+
+
+def release(name):
+    """Resta una referencia al blob ``name``; a cero queda pendiente de recolección"""
+    from .models import MediaBlob
+
+    if not is_blob(name):
+        return
+    MediaBlob.objects.filter(name=name, refcount__gt=0).update(
+        refcount=F('refcount') - 1, updated_at=timezone.now()
+    )
+
+
+def collect_garbage(batch_size=500, grace=timedelta(hours=1)):
+    """Borra los blobs sin referencias desde hace más de ``grace``. Devuelve cuántos.
+
+    El margen cubre las subidas cuyo producto todavía no se guardó. Cada
+    lote bloquea sus filas mientras borra los archivos, así una subida del
+    mismo contenido espera y vuelve a escribirlo.
+    """
+    from .models import MediaBlob
+
+    deleted = 0
+    while True:
+        cutoff = timezone.now() - grace
+        with transaction.atomic():
+            blobs = list(
+                MediaBlob.objects.select_for_update(skip_locked=True)
+                .filter(refcount=0, updated_at__lte=cutoff)
+                .order_by('updated_at')[:batch_size]
+            )
+            if not blobs:
+                return deleted
+            for blob in blobs:
+                blob_storage.delete(blob.name)
+            MediaBlob.objects.filter(pk__in=[blob.pk for blob in blobs]).delete()
+        deleted += len(blobs)
@@ -1,5 +1,18 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
 from products.models import Product, Category
+from products import cache as catalog_cache, money
+from products.pagination import CursorPaginator
+from products.search import search_products, tokenize
+from products.stock import decrement_stock, get_stock, set_stock
 from decimal import Decimal
 
 class ProductModelTest(TestCase):
@@ -24,3 +37,639 @@ class ProductModelTest(TestCase):
     def test_price_with_iva(self):
         expected = self.product.unit_price + (self.product.unit_price * self.product.iva_percentage / 100)
         self.assertEqual(self.product.price_with_iva, expected.quantize(Decimal('0.01')))
+
+    def test_price_columns_follow_save_and_recompute(self):
+        self.product.unit_price = Decimal('100.00')
+        self.product.save(update_fields=['unit_price'])
+        self.assertTrue(Product.objects.filter(price_with_iva=Decimal('119.00'), iva_amount=Decimal('19.00')).exists())
+
+        # update() no pasa por save(): las columnas quedan viejas hasta recalcular
+        Product.objects.update(iva_percentage=Decimal('5.00'))
+        self.assertEqual(Product.objects.recompute_prices(), 1)
+        self.assertEqual(Product.objects.get().price_with_iva, Decimal('105.00'))
+
+
+class MoneyTest(TestCase):
+    def test_rounding_modes(self):
+        # 3 x $0,05 al 19 %: IVA de 0,95 centavos por unidad
+        lines = [(5, 1900, 3), (5, 1900, 3)]
+        self.assertEqual(money.compute(lines, money.UNIT)[:3], (30, 6, 36))
+        self.assertEqual(money.compute(lines, money.LINE)[:3], (30, 6, 36))
+        self.assertEqual(money.compute(lines, money.DOCUMENT)[:3], (30, 6, 36))
+        lines = [(3, 1900, 1)] * 10
+        self.assertEqual(money.compute(lines, money.UNIT).iva, 10)
+        self.assertEqual(money.compute(lines, money.DOCUMENT).iva, 6)
+
+    def test_matches_catalog_prices(self):
+        product = Product(unit_price=Decimal('1234.57'), iva_percentage=Decimal('19.00'))
+        product.update_prices()
+        totals = money.compute([(money.to_cents(product.unit_price), 1900, 7)])
+        self.assertEqual(money.from_cents(totals.total), product.price_with_iva * 7)
+
+
+class PriceFilterTest(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Calzado")
+        for price in ('300.00', '100.00', '200.00'):
+            Product.objects.create(name=f"Producto {price}", description="-", unit_price=Decimal(price), category=category)
+        self.client.force_login(get_user_model().objects.create_user(username='admin', password='x'))
+
+    def test_price_sort_and_range(self):
+        response = self.client.get('/products/', {'sort': '-price', 'min_price': '120', 'max_price': 'abc'})
+        prices = [product.price_with_iva for product in response.context['page_obj']]
+        self.assertEqual(prices, [Decimal('357.00'), Decimal('238.00')])
+
+
+class ProductSearchTest(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Calzado")
+        self.running = Product.objects.create(
+            name="Zapatillas Running",
+            description="Ideales para correr en montaña",
+            unit_price=Decimal('250000.00'),
+            category=self.category
+        )
+        self.boots = Product.objects.create(
+            name="Botas de cuero",
+            description="Botas clásicas para montaña, también sirven de zapatillas",
+            additional_info="Edición limitada",
+            unit_price=Decimal('400000.00'),
+            category=self.category
+        )
+
+    def test_tokenize_ignores_accents_and_stopwords(self):
+        self.assertEqual(tokenize("Edición de Montaña"), ['edicion', 'montana'])
+
+    def test_search_matches_all_fields_and_ranks_by_name(self):
+        results = list(search_products(Product.objects.all(), "zapatilla"))
+        self.assertEqual(results, [self.running, self.boots])
+        self.assertEqual(list(search_products(Product.objects.all(), "edicion")), [self.boots])
+        self.assertEqual(list(search_products(Product.objects.all(), "montaña botas")), [self.boots])
+
+    def test_index_follows_save_and_delete(self):
+        self.running.name = "Sandalias"
+        self.running.save()
+        self.assertEqual(list(search_products(Product.objects.all(), "zapatillas")), [self.boots])
+        self.boots.delete()
+        self.assertFalse(search_products(Product.objects.all(), "zapatillas").exists())
+
+
+class CursorPaginatorTest(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Calzado")
+        for i in range(25):
+            Product.objects.create(
+                name=f"Zapatilla {i}",
+                description="Zapatilla deportiva",
+                unit_price=Decimal('1000.00'),
+                category=category
+            )
+        # Empates en created_at: el id desempata
+        Product.objects.filter(pk__lte=Product.objects.order_by('pk')[9].pk).update(
+            created_at=Product.objects.order_by('pk')[0].created_at
+        )
+        self.expected = list(Product.objects.order_by('-created_at', '-id'))
+
+    def walk(self, queryset, ordering):
+        paginator = CursorPaginator(queryset, 10, ordering=ordering)
+        page = paginator.page()
+        pages = [list(page)]
+        while page.has_next():
+            page = paginator.page(page.next_cursor)
+            pages.append(list(page))
+        backwards = [list(page)]
+        while page.has_previous():
+            page = paginator.page(page.previous_cursor)
+            backwards.insert(0, list(page))
+        return pages, backwards
+
+    def test_forward_and_backward_cover_every_product_once(self):
+        pages, backwards = self.walk(Product.objects.all(), ('-created_at', '-id'))
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual(sum(pages, []), self.expected)
+        self.assertEqual(backwards, pages)
+
+    def test_search_results_paginate_by_rank(self):
+        results = search_products(Product.objects.all(), "zapatilla")
+        pages, _ = self.walk(results, ('-search_rank', '-created_at', '-id'))
+        self.assertEqual(sum(pages, []), list(results))
+
+    def test_invalid_cursor_returns_first_page(self):
+        page = CursorPaginator(Product.objects.all(), 10).get_page('no-es-un-cursor')
+        self.assertEqual(list(page), self.expected[:10])
+        self.assertFalse(page.has_previous())
+
+    def test_approximate_count_is_a_bounded_count(self):
+        from products.pagination import AT_LEAST, EXACT, approximate_count
+        self.assertEqual(approximate_count(Product.objects.all(), limit=10), (10, AT_LEAST))
+        self.assertEqual(approximate_count(Product.objects.all(), limit=25), (25, EXACT))
+
+
+class CatalogCacheTest(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Calzado")
+        self.product = Product.objects.create(
+            name="Zapatillas Nike",
+            description="Zapatillas deportivas",
+            unit_price=Decimal('250000.00'),
+            category=self.category
+        )
+        catalog_cache.reset_stats()
+
+    def test_home_grid_is_served_from_cache(self):
+        self.client.get('/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/')
+        self.assertContains(response, "Zapatillas Nike")
+        stats = catalog_cache.get_stats()
+        # Categorías, conteos de facetas y grilla
+        self.assertEqual((stats['hits'], stats['misses']), (3, 3))
+
+    def test_saving_a_product_invalidates_the_cache(self):
+        self.client.get('/')
+        generation = catalog_cache.get_generation()
+        self.product.name = "Zapatillas Adidas"
+        self.product.save()
+        self.assertGreater(catalog_cache.get_generation(), generation)
+        self.assertContains(self.client.get('/'), "Zapatillas Adidas")
+
+
+class StockTest(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Calzado")
+        self.first, self.second = [
+            Product.objects.create(
+                name=f"Producto {i}",
+                description="Calzado",
+                unit_price=Decimal('1000.00'),
+                stock=5,
+                category=category
+            )
+            for i in range(2)
+        ]
+
+    def test_decrement_all_lines(self):
+        self.assertEqual(decrement_stock({self.first.pk: 2, self.second.pk: 5}), {})
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((self.first.stock, self.second.stock), (3, 0))
+
+    def test_failed_line_leaves_stock_untouched(self):
+        failed = decrement_stock([(self.first.pk, 1), (self.second.pk, 6)])
+        self.assertEqual(failed, {self.second.pk: 5})
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.stock, 5)
+
+    @override_settings(STOCK_COUNTER_SHARDS=4)
+    def test_sharded_counters_drain_across_shards(self):
+        set_stock({self.first.pk: 10})
+        self.assertEqual(self.first.stock_counters.count(), 4)
+        self.assertEqual(decrement_stock({self.first.pk: 9}), {})
+        self.assertEqual(get_stock([self.first.pk]), {self.first.pk: 1})
+
+    def test_stock_writes_do_not_touch_the_product_row(self):
+        updated_at = self.first.updated_at
+        decrement_stock({self.first.pk: 1})
+        set_stock({self.first.pk: 8})
+        self.first.refresh_from_db()
+        self.assertEqual((self.first.stock, self.first.updated_at), (8, updated_at))
+
+    def test_with_stock_annotates_totals(self):
+        products = Product.objects.with_stock().order_by('pk')
+        with self.assertNumQueries(1):
+            self.assertEqual([p.stock for p in products], [5, 5])
+
+
+class StockConcurrencyTest(TransactionTestCase):
+    def setUp(self):
+        # Aquí los on_commit se ejecutan de verdad: el snapshot del autocompletado no debe ser el real
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        settings_override = override_settings(AUTOCOMPLETE_SNAPSHOT=os.path.join(tmp, 'autocomplete.pickle'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_no_oversell_under_concurrency(self):
+        out = StringIO()
+        call_command('stress_stock', threads=8, attempts=10, stock=30, stdout=out)
+        self.assertIn('vendidos=30 ', out.getvalue())
+
+
+class RecommendationsTest(TestCase):
+    def setUp(self):
+        from orders.models import Order, OrderItem
+        self.Order, self.OrderItem = Order, OrderItem
+        self.user = get_user_model().objects.create_user(username='cliente', password='x')
+        category = Category.objects.create(name="Calzado")
+        self.products = [
+            Product.objects.create(name=f"Producto {i}", description="-", unit_price=Decimal('100.00'), category=category)
+            for i in range(5)
+        ]
+
+    def place(self, *products, paid=True):
+        from django.utils import timezone
+        order = self.Order.objects.create(
+            user=self.user, subtotal=0, iva_total=0, total=0,
+            status='paid' if paid else 'pending', payment_status=paid, payment_date=timezone.now() if paid else None,
+        )
+        for product in products:
+            self.OrderItem.objects.create(order=order, product=product, quantity=1)
+        return order
+
+    def test_incremental_build_ranks_co_purchases(self):
+        from datetime import timedelta
+        from products.recommendations import build_co_purchases, get_related_products
+        shoe, socks, laces, cap, bag = self.products
+        self.place(shoe, socks, laces)
+        self.place(shoe, socks)
+        self.assertEqual(build_co_purchases(lag=timedelta(0)), (2, 6))
+        # Una segunda ejecución solo procesa los pedidos nuevos
+        self.place(shoe, laces)
+        self.assertEqual(build_co_purchases(lag=timedelta(0)), (1, 2))
+        self.assertEqual(build_co_purchases(lag=timedelta(0)), (0, 0))
+
+        related = get_related_products(shoe)
+        # socks y laces por compras conjuntas (empate 2-2 por id), el resto por categoría
+        self.assertEqual(related[:2], [socks, laces])
+        self.assertEqual(set(related[2:]), {cap, bag})
+        with self.assertNumQueries(1):
+            get_related_products(shoe)
+
+    def test_only_paid_orders_count_in_payment_order(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from products.recommendations import build_co_purchases
+        shoe, socks, laces, _, _ = self.products
+        pending = self.place(shoe, socks, paid=False)
+        self.place(shoe, laces)
+        self.assertEqual(build_co_purchases(lag=timedelta(0)), (1, 2))
+        # Un pedido creado antes del punto de control se cuenta cuando se paga
+        self.Order.objects.filter(pk=pending.pk).update(
+            status='paid', payment_status=True, payment_date=timezone.now()
+        )
+        self.assertEqual(build_co_purchases(lag=timedelta(0)), (1, 2))
+        self.assertEqual(build_co_purchases(lag=timedelta(0)), (0, 0))
+
+
+class ProductImageVariantTest(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(
+            MEDIA_ROOT=media.name, PRODUCT_IMAGE_ASYNC=False, PRODUCT_IMAGE_WIDTHS=(320, 640, 1024),
+            AUTOCOMPLETE_SNAPSHOT=os.path.join(media.name, 'autocomplete.pickle'),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.category = Category.objects.create(name="Calzado")
+
+    def upload(self, size=(800, 400)):
+        from io import BytesIO
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from PIL import Image
+        buffer = BytesIO()
+        Image.new('RGBA', size, (255, 0, 0, 128)).save(buffer, 'PNG')
+        return SimpleUploadedFile('captura.png', buffer.getvalue(), content_type='image/png')
+
+    def test_upload_generates_variants_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(
+                name="Zapatilla", description="-", unit_price=Decimal('100.00'),
+                category=self.category, image=self.upload()
+            )
+        variants = product.get_image_variants()
+        # 1024 no amplía: se queda en el ancho original
+        self.assertEqual(
+            sorted((v.format, v.width, v.height) for v in variants),
+            [('jpeg', 320, 160), ('jpeg', 640, 320), ('jpeg', 800, 400),
+             ('webp', 320, 160), ('webp', 640, 320), ('webp', 800, 400)]
+        )
+        self.assertRegex(product.webp_srcset, r'^\S+\.webp 320w, \S+\.webp 640w, \S+\.webp 800w$')
+        self.assertTrue(product.get_thumbnail_url(600).endswith('-640.jpg'))
+
+        # Guardar sin cambiar la imagen no vuelve a generar nada
+        with self.captureOnCommitCallbacks() as callbacks:
+            Product.objects.get(pk=product.pk).save()
+        self.assertEqual(callbacks, [])
+
+    def test_backfill_in_process_pool(self):
+        from products.images import backfill_variants
+        with self.captureOnCommitCallbacks(execute=False):
+            product = Product.objects.create(
+                name="Zapatilla", description="-", unit_price=Decimal('100.00'),
+                category=self.category, image=self.upload((200, 100))
+            )
+        self.assertEqual(product.get_image_variants(), [])
+        self.assertEqual(backfill_variants(Product.objects.all(), workers=2), (1, 0))
+        self.assertEqual(backfill_variants(Product.objects.all(), workers=2), (0, 0))
+        self.assertEqual(product.image_variants.filter(format='webp', width=200, height=100).count(), 1)
+
+
+class BlobStorageTest(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name, PRODUCT_IMAGE_ASYNC=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.category = Category.objects.create(name="Calzado")
+
+    def create(self, content=b'GIF89a\x01\x00\x01\x00\x00\x00\x00;', name='foto.gif'):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        return Product.objects.create(
+            name="Zapatilla", description="-", unit_price=Decimal('100.00'),
+            category=self.category, image=SimpleUploadedFile(name, content)
+        )
+
+    def test_same_content_is_stored_once_and_collected_when_unused(self):
+        from datetime import timedelta
+        from products.models import MediaBlob
+        from products.storage import blob_storage, collect_garbage
+        first, second = self.create(), self.create(name='foto_copia.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^blobs/[0-9a-f]{2}/[0-9a-f]{64}\.gif$')
+        blob = MediaBlob.objects.get()
+        self.assertEqual(blob.refcount, 2)
+
+        first.delete()
+        second.image = None
+        second.save()
+        blob.refresh_from_db()
+        self.assertEqual(blob.refcount, 0)
+        # Dentro del margen de gracia no se borra nada
+        self.assertEqual(collect_garbage(), 0)
+        self.assertEqual(collect_garbage(grace=timedelta(0)), 1)
+        self.assertFalse(blob_storage.exists(blob.name))
+        self.assertFalse(MediaBlob.objects.exists())
+
+    def test_blobs_are_served_with_immutable_cache(self):
+        product = self.create()
+        response = self.client.get(product.image.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+
+
+class CatalogImportExportTest(TestCase):
+    def write(self, name, content):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, name)
+        with open(path, 'w', encoding='utf-8') as output:
+            output.write(content)
+        return path
+
+    def test_upsert_by_sku_and_round_trip(self):
+        Category.objects.create(name="Calzado")
+        path = self.write('catalogo.csv', (
+            'sku,name,description,category,unit_price,iva_percentage,stock,is_active\n'
+            'A-1,"Tenis, rojos",Cómodos,Calzado,100.00,19,5,sí\n'
+            'A-2,Gorra,,Accesorios,50,,,no\n'
+            ',Sin SKU,,Calzado,10,,,\n'
+        ))
+        out = StringIO()
+        call_command('import_products', path, batch_size=1, stdout=out, stderr=StringIO())
+        self.assertIn('2 creados, 0 actualizados, 1 con errores', out.getvalue())
+
+        path = self.write('cambios.jsonl', '{"sku": "A-1", "name": "Tenis rojos", "category": "Calzado", "unit_price": 80, "stock": 7}\n')
+        out = StringIO()
+        call_command('import_products', path, stdout=out)
+        self.assertIn('0 creados, 1 actualizados', out.getvalue())
+
+        shoe = Product.objects.get(sku='A-1')
+        self.assertEqual((shoe.name, shoe.price_with_iva, shoe.stock), ("Tenis rojos", Decimal('95.20'), 7))
+        self.assertFalse(Product.objects.get(sku='A-2').is_active)
+        self.assertEqual(list(search_products(Product.objects.all(), 'rojos')), [shoe])
+
+        out = StringIO()
+        call_command('export_products', format='jsonl', stdout=out, stderr=StringIO())
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([(row['sku'], row['category'], row['stock']) for row in rows],
+                         [('A-1', 'Calzado', 7), ('A-2', 'Accesorios', 0)])
+
+    def test_csv_with_newlines_inside_quotes(self):
+        from products.catalog_io import has_multiline_records, import_range
+        path = self.write('catalogo.csv', (
+            'sku,name,description,category,unit_price\n'
+            'A-1,Tenis,"Línea uno\nlínea dos",Calzado,100\n'
+            'A-2,Gorra,,Calzado,50\n'
+        ))
+        self.assertTrue(has_multiline_records(path))
+        # Por rangos de bytes el registro partido se informa, no se lee a medias
+        stats = import_range(path, 'csv', 0, os.path.getsize(path))
+        self.assertEqual((stats['created'], stats['error_count']), (1, 2))
+        self.assertIn('salto de línea', stats['errors'][0][1])
+
+        out = StringIO()
+        call_command('import_products', path, stdout=out)
+        self.assertIn('1 creados, 1 actualizados, 0 con errores', out.getvalue())
+        self.assertEqual(Product.objects.get(sku='A-1').description, "Línea uno\nlínea dos")
+
+    def test_upsert_without_conflict_target(self):
+        # MySQL: sin ``unique_fields``, insert de los nuevos y update de los existentes
+        Product.objects.create(sku='A-1', name="Viejo", description="-", unit_price=Decimal('10.00'),
+                               category=Category.objects.create(name="Calzado"))
+        path = self.write('catalogo.jsonl', (
+            '{"sku": "A-1", "name": "Tenis", "category": "Calzado", "unit_price": 100, "stock": 3}\n'
+            '{"sku": "A-2", "name": "Gorra", "category": "Calzado", "unit_price": 50}\n'
+        ))
+        out = StringIO()
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False):
+            call_command('import_products', path, stdout=out)
+        self.assertIn('1 creados, 1 actualizados', out.getvalue())
+        shoe = Product.objects.get(sku='A-1')
+        self.assertEqual((shoe.name, shoe.price_with_iva, shoe.stock), ("Tenis", Decimal('119.00'), 3))
+        self.assertEqual(Product.objects.get(sku='A-2').unit_price, Decimal('50.00'))
+
+
+class FacetTest(TestCase):
+    def setUp(self):
+        self.shoes = Category.objects.create(name="Calzado")
+        self.caps = Category.objects.create(name="Gorras")
+        for name, category, price, iva, stock in [
+            ("Tenis A", self.shoes, '50000', '19', 3),
+            ("Tenis B", self.shoes, '150000', '19', 0),
+            ("Tenis C", self.shoes, '300000', '5', 2),
+            ("Gorra", self.caps, '40000', '19', 1),
+        ]:
+            Product.objects.create(name=name, description="-", unit_price=Decimal(price),
+                                   iva_percentage=Decimal(iva), stock=stock, category=category)
+
+    def facet_counts(self, response):
+        return {
+            facet['name']: {option['label']: option['count'] for option in facet['options']}
+            for facet in response.context['facets']
+        }
+
+    def test_counts_exclude_their_own_filter(self):
+        response = self.client.get('/', {'category': self.shoes.pk, 'in_stock': '1'})
+        counts = self.facet_counts(response)
+        # Las categorías se cuentan con el filtro de stock pero sin el de categoría
+        self.assertEqual(counts['category'], {'Calzado': 2, 'Gorras': 1})
+        self.assertEqual(counts['in_stock'], {'En stock': 2})
+        self.assertEqual(counts['price'], {'Hasta $100.000': 1, '$250.000 - $500.000': 1})
+        self.assertEqual(counts['iva'], {'5%': 1, '19%': 1})
+        self.assertEqual([product.name for product in response.context['page_obj']], ["Tenis C", "Tenis A"])
+
+    def test_facet_counts_come_from_one_grouped_query(self):
+        from products.facets import get_cube
+        with self.assertNumQueries(1):
+            cube = get_cube(Product.objects.filter(is_active=True), '')
+        self.assertEqual(sum(cell[-1] for cell in cube), 4)
+
+    def test_grid_key_and_links_are_normalized(self):
+        from django.http import QueryDict
+        from products.facets import filters_key, filters_query, parse_filters
+        first = parse_filters(QueryDict('category=2&category=1&iva=19&utm_source=x'))
+        second = parse_filters(QueryDict('iva=19.00&category=1&category=2'))
+        self.assertEqual(filters_key(first), (('category', ('1', '2')), ('iva', ('19.00',))))
+        self.assertEqual(filters_key(first), filters_key(second))
+        # Los enlaces de la grilla cacheada no llevan parámetros ajenos a los filtros
+        self.assertEqual(filters_query(first, 'tenis'), 'category=1&category=2&iva=19.00&search=tenis')
+
+
+class CatalogApiTest(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Calzado")
+        self.products = [
+            Product.objects.create(name=f"Tenis {i}", description="-", unit_price=Decimal('1000'),
+                                   category=self.category)
+            for i in range(5)
+        ]
+
+    def test_sparse_fields_and_cursor_pagination(self):
+        seen = []
+        url = '/api/v1/products/?fields=id,name,category&page_size=2'
+        while url:
+            with self.assertNumQueries(1):
+                data = self.client.get(url).json()
+            self.assertEqual(set(data['results'][0]), {'id', 'name', 'category'})
+            seen += [item['id'] for item in data['results']]
+            url = data['next']
+        self.assertEqual(seen, [p.pk for p in reversed(self.products)])
+
+    def test_conditional_get(self):
+        url = f'/api/v1/products/{self.products[0].pk}/'
+        response = self.client.get(url)
+        self.assertEqual(response.json()['category'], {'id': self.category.pk, 'name': "Calzado"})
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304
+        )
+        list_etag = self.client.get('/api/v1/products/')['ETag']
+        self.assertEqual(self.client.get('/api/v1/products/', HTTP_IF_NONE_MATCH=list_etag).status_code, 304)
+
+        self.category.name = "Zapatos"
+        self.category.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.client.get('/api/v1/products/', HTTP_IF_NONE_MATCH=list_etag).status_code, 200)
+
+
+@override_settings(CATALOG_CHANGES_LAG=0)
+class ChangeFeedTest(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Calzado")
+        self.products = [
+            Product.objects.create(name=f"Tenis {i}", description="-", unit_price=Decimal('1000'),
+                                   category=self.category, sku=f'T{i}')
+            for i in range(3)
+        ]
+
+    def feed(self, since=None, limit=1000):
+        params = {'limit': limit, **({'since': since} if since else {})}
+        response = self.client.get('/api/v1/changes/', params)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        return lines[:-1], lines[-1]
+
+    def test_incremental_sync_with_deactivations_and_deletes(self):
+        changes, end = self.feed(limit=2)
+        self.assertTrue(end['more'])
+        rest, end = self.feed(end['checkpoint'])
+        self.assertEqual([c['sku'] for c in changes + rest], ['T0', 'T1', 'T2'])
+        self.assertFalse(end['more'])
+        self.assertEqual(self.feed(end['checkpoint'])[0], [])
+
+        self.products[1].is_active = False
+        self.products[1].save()
+        self.products[2].delete()
+        changes, _ = self.feed(end['checkpoint'])
+        self.assertEqual(
+            [(c['type'], c['sku'], c.get('is_active')) for c in changes],
+            [('product', 'T1', False), ('deleted', 'T2', None)],
+        )
+        self.assertEqual(self.client.get('/api/v1/changes/', {'since': 'nada'}).status_code, 400)
+
+
+class AutocompleteTest(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        settings_override = override_settings(AUTOCOMPLETE_SNAPSHOT=os.path.join(self.tmp, 'autocomplete.pickle'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.category = Category.objects.create(name="Calzado")
+        self.nike = Product.objects.create(name="Tenis Nike Air", description="-",
+                                           unit_price=Decimal('1000'), category=self.category)
+        Product.objects.create(name="Balón de fútbol", description="-",
+                               unit_price=Decimal('1000'), category=self.category)
+
+    def names(self, query):
+        data = self.client.get('/autocomplete/', {'q': query}).json()
+        return [item['name'] for item in data['categories'] + data['products']]
+
+    def test_prefix_of_any_word_without_accents(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(self.names('nik'), ["Tenis Nike Air"])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names('futb'), ["Balón de fútbol"])
+            self.assertEqual(self.names('ca'), ["Calzado"])
+            self.assertEqual(self.names(''), [])
+
+    def test_updates_are_incremental_and_shared_through_the_snapshot(self):
+        from products import autocomplete
+        self.names('x')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.nike.name = "Tenis Adidas"
+            self.nike.save()
+            puma = Product.objects.create(name="Tenis Puma", description="-",
+                                          unit_price=Decimal('1000'), category=self.category)
+        self.assertEqual(self.names('tenis'), ["Tenis Adidas", "Tenis Puma"])
+        # Otro proceso carga el mismo estado desde el archivo
+        index = autocomplete.read_snapshot(autocomplete.get_snapshot_path())
+        self.assertEqual(index.products.complete('pum'), [(puma.pk, "Tenis Puma")])
+        self.assertEqual(index.products.complete('nike'), [])
+
+
+class ConditionalPageTest(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Calzado")
+        self.product = Product.objects.create(name="Tenis", description="-", unit_price=Decimal('1000'),
+                                              stock=5, category=self.category)
+
+    def test_product_detail_answers_304_until_something_changes(self):
+        url = f'/products/{self.product.pk}/'
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.templates, [])
+
+        set_stock({self.product.pk: 4})
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_category_detail_depends_on_visitor_and_products(self):
+        user = get_user_model().objects.create_user('ana', password='x')
+        self.client.force_login(user)
+        url = f'/categories/{self.category.pk}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.product.name = "Tenis nuevos"
+        self.product.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, "Tenis nuevos")
+        self.client.logout()
+        self.client.force_login(get_user_model().objects.create_user('luis', password='x'))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
@@ -6,6 +6,8 @@ app_name = 'products'
 urlpatterns = [
     # Home
     path('', views.home, name='home'),
+    path('autocomplete/', views.autocomplete, name='autocomplete'),
+    path('cache/stats/', views.catalog_cache_stats, name='catalog_cache_stats'),
     
     # Categorías
     path('categories/', views.category_list, name='category_list'),
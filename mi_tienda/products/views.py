@@ -1,38 +1,111 @@
+from decimal import Decimal, InvalidOperation
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.paginator import Paginator
+from django.contrib.admin.views.decorators import staff_member_required
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.static import serve
+from django.template.loader import render_to_string
+from . import autocomplete as suggestions
+from . import cache as catalog_cache
+from . import conditional
+from . import facets
 from .models import Product, Category
+from orders.reservations import available_to_sell
 from .forms import ProductForm, CategoryForm
+from .pagination import CursorPaginator
+from .recommendations import get_related_products
+from .search import search_products
+from .storage import BLOB_PREFIX, CACHE_CONTROL
+
+CATALOG_ORDERING = ('-created_at', '-id')
+SEARCH_ORDERING = ('-search_rank', '-created_at', '-id')
+# Orden por precio final; se resuelve con el índice (price_with_iva, id)
+PRICE_ORDERINGS = {
+    'price': ('price_with_iva', 'id'),
+    '-price': ('-price_with_iva', '-id'),
+}
+
+def parse_price(value):
+    try:
+        price = Decimal(value)
+    except (TypeError, InvalidOperation):
+        return None
+    return price if price.is_finite() and price >= 0 else None
+
+def filter_by_price(products, min_price, max_price):
+    """Filtra por rango de precio con IVA (límites inclusivos, ignora valores inválidos)"""
+    min_price, max_price = parse_price(min_price), parse_price(max_price)
+    if min_price is not None:
+        products = products.filter(price_with_iva__gte=min_price)
+    if max_price is not None:
+        products = products.filter(price_with_iva__lte=max_price)
+    return products
 
 def home(request):
-    """Vista principal - listado de productos"""
-    products = Product.objects.filter(is_active=True).select_related('category')
-    categories = Category.objects.all()
-    
-    # Filtro por categoría
-    category_id = request.GET.get('category')
-    if category_id:
-        products = products.filter(category_id=category_id)
-    
-    # Búsqueda por nombre
+    """Vista principal - listado de productos con facetas.
+
+    El listado de categorías, los conteos de facetas y el fragmento HTML de
+    la grilla se guardan en la caché del catálogo, indexados por (filtros,
+    búsqueda, cursor).
+    """
+    filters = facets.parse_filters(request.GET)
     search = request.GET.get('search')
-    if search:
-        products = products.filter(name__icontains=search)
+    cursor = request.GET.get('cursor')
     
-    # Paginación
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    categories = catalog_cache.get_or_set(
+        'categories', (), lambda: list(Category.objects.values('id', 'name'))
+    )
+    cube = facets.get_cube(Product.objects.filter(is_active=True), search)
+    product_grid = catalog_cache.get_or_set(
+        'home_grid', (facets.filters_key(filters), search, cursor),
+        lambda: render_home_grid(filters, search, cursor)
+    )
     
     context = {
-        'page_obj': page_obj,
+        'product_grid': product_grid,
         'categories': categories,
-        'selected_category': category_id,
+        'facets': facets.build_facets(cube, filters, request.GET, categories),
+        'selected_category': request.GET.get('category'),
         'search_query': search or '',
     }
     return render(request, 'products/home.html', context)
 
+def render_home_grid(filters, search, cursor):
+    products = Product.objects.filter(is_active=True).select_related('category').prefetch_related('image_variants')
+    
+    # Filtros de facetas (categoría, precio, stock, IVA)
+    products = facets.apply_filters(products, filters)
+    
+    # Búsqueda en nombre, descripción e información adicional
+    ordering = CATALOG_ORDERING
+    if search:
+        products = search_products(products, search)
+        ordering = SEARCH_ORDERING
+    
+    # Paginación por cursor
+    paginator = CursorPaginator(products, 12, ordering=ordering)
+    page_obj = paginator.get_page(cursor)
+    
+    return render_to_string('products/includes/home_grid.html', {
+        'page_obj': page_obj,
+        # Enlaces armados solo con lo que define la grilla: el fragmento se comparte entre peticiones
+        'filter_query': facets.filters_query(filters, search),
+    })
+
+def autocomplete(request):
+    """Sugerencias para el buscador (``?q=`` prefijo), sin consultar la base de datos"""
+    query = request.GET.get('q', '')[:100]
+    response = JsonResponse({'query': query, **suggestions.complete(query)})
+    response['Cache-Control'] = 'public, max-age=60'
+    return response
+
+@staff_member_required
+def catalog_cache_stats(request):
+    """Contadores de aciertos/fallos de la caché del catálogo (monitoreo)"""
+    return JsonResponse(catalog_cache.get_stats())
+
 # VISTAS DE CATEGORÍAS
 @login_required
 def category_list(request):
@@ -90,42 +163,76 @@ def category_delete(request, pk):
 @login_required
 def category_detail(request, pk):
     category = get_object_or_404(Category, pk=pk)
-    products = category.products.filter(is_active=True)
+    products = category.products.with_stock().filter(is_active=True)
     
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    return render(request, 'products/category_detail.html', {
+    paginator = CursorPaginator(products, 12, ordering=CATALOG_ORDERING)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    product_count = category.products.count()
+
+    # Si la página no cambió se responde 304 sin renderizar la plantilla
+    etag = conditional.page_etag(
+        request, category.pk, category.updated_at, product_count,
+        [(p.pk, p.updated_at, p.stock) for p in page_obj], page_obj.has_next(), page_obj.has_previous(),
+    )
+    last_modified = max([category.updated_at, *(p.updated_at for p in page_obj)])
+    response = conditional.not_modified(request, etag, last_modified)
+    if response is not None:
+        return response
+
+    response = render(request, 'products/category_detail.html', {
         'category': category,
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        'product_count': product_count,
     })
+    return conditional.add_validators(request, response, etag, last_modified)
+
+def serve_blob(request, path):
+    """Sirve un blob de medios; su URL cambia con el contenido, así que se cachea un año.
+
+    En producción conviene que el servidor web sirva ``MEDIA_URL/blobs/``
+    con la misma cabecera ``Cache-Control``.
+    """
+    response = serve(request, f'{BLOB_PREFIX}/{path}', document_root=settings.MEDIA_ROOT)
+    response['Cache-Control'] = CACHE_CONTROL
+    return response
 
 # VISTAS DE PRODUCTOS
 @login_required
 def product_list(request):
-    products = Product.objects.all().select_related('category')
+    products = Product.objects.with_stock().select_related('category')
     
     # Filtros
     category_id = request.GET.get('category')
     if category_id:
         products = products.filter(category_id=category_id)
     
+    min_price = request.GET.get('min_price', '')
+    max_price = request.GET.get('max_price', '')
+    products = filter_by_price(products, min_price, max_price)
+    
     search = request.GET.get('search')
+    ordering = CATALOG_ORDERING
     if search:
-        products = products.filter(name__icontains=search)
+        products = search_products(products, search)
+        ordering = SEARCH_ORDERING
+    
+    sort = request.GET.get('sort', '')
+    if sort in PRICE_ORDERINGS:
+        ordering = PRICE_ORDERINGS[sort]
     
     categories = Category.objects.all()
     
-    paginator = Paginator(products, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = CursorPaginator(products, 10, ordering=ordering, approximate_count=True)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     return render(request, 'products/product_list.html', {
         'page_obj': page_obj,
         'categories': categories,
         'selected_category': category_id,
         'search_query': search or '',
+        'sort': sort,
+        'min_price': min_price,
+        'max_price': max_price,
     })
 
 @login_required
@@ -174,13 +281,24 @@ def product_delete(request, pk):
     return render(request, 'products/product_confirm_delete.html', {'product': product})
 
 def product_detail(request, pk):
-    product = get_object_or_404(Product, pk=pk, is_active=True)
-    related_products = Product.objects.filter(
-        category=product.category, 
-        is_active=True
-    ).exclude(pk=product.pk)[:4]
-    
-    return render(request, 'products/product_detail.html', {
+    product = get_object_or_404(Product.objects.select_related('category'), pk=pk, is_active=True)
+    related_products = get_related_products(product)
+    available_stock = available_to_sell([product.pk]).get(product.pk, 0)
+
+    # Si la página no cambió se responde 304 sin renderizar la plantilla
+    etag = conditional.page_etag(
+        request, product.pk, product.updated_at, product.category.updated_at, available_stock,
+        [(p.pk, p.updated_at) for p in related_products],
+    )
+    last_modified = max([product.updated_at, product.category.updated_at,
+                         *(p.updated_at for p in related_products)])
+    response = conditional.not_modified(request, etag, last_modified)
+    if response is not None:
+        return response
+
+    response = render(request, 'products/product_detail.html', {
         'product': product,
-        'related_products': related_products
-    })
\ No newline at end of file
+        'related_products': related_products,
+        'available_stock': available_stock,
+    })
+    return conditional.add_validators(request, response, etag, last_modified)
\ No newline at end of file
@@ -0,0 +1,29 @@
+from django.contrib import admin
+from .models import Promotion
+
+
+@admin.register(Promotion)
+class PromotionAdmin(admin.ModelAdmin):
+    list_display = ['name', 'kind', 'value', 'code', 'starts_at', 'ends_at', 'is_active']
+    list_filter = ['kind', 'is_active', 'starts_at', 'ends_at']
+    list_editable = ['is_active']
+    search_fields = ['name', 'code']
+    filter_horizontal = ['products', 'categories']
+    readonly_fields = ['created_at', 'updated_at']
+
+    fieldsets = (
+        ('Regla', {
+            'fields': ('name', 'kind', 'value', 'buy_quantity', 'free_quantity', 'code', 'is_active')
+        }),
+        ('Alcance', {
+            'description': 'Sin productos ni categorías, la promoción aplica a todo el catálogo',
+            'fields': ('products', 'categories')
+        }),
+        ('Vigencia', {
+            'fields': ('starts_at', 'ends_at')
+        }),
+        ('Fechas', {
+            'fields': ('created_at', 'updated_at'),
+            'classes': ('collapse',)
+        })
+    )
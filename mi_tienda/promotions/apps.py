@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class PromotionsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'promotions'
+    verbose_name = 'Promociones'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,203 @@
+"""Motor de promociones.
+
+Las reglas vigentes se compilan una vez por proceso en ``CompiledRules``:
+tuplas ``Rule`` con los valores ya en centavos / puntos básicos (ver
+``products.money``), indexadas por producto, por categoría y las que
+aplican a todo el catálogo. Evaluar un carrito es una sola pasada por sus
+líneas: cada línea mira solo las reglas de su producto, de su categoría y
+las generales, y se queda con el mayor descuento (las promociones no se
+acumulan sobre una misma línea).
+
+Los descuentos se calculan sobre el precio sin IVA; el IVA de cada
+descuento se redondea por línea y se resta del IVA del documento.
+
+Guardar o borrar una promoción sube el contador ``promotions`` (ver
+``products.pricing.get_version``), que cada proceso lee de la base de datos
+una vez por petición y recompila sus reglas al notar el cambio. El
+resultado de un carrito se cachea por versión del carrito, cupón y huella
+de las reglas compiladas.
+"""
+import hashlib
+import threading
+from collections import namedtuple
+from itertools import chain
+
+from django.conf import settings
+from django.utils import timezone
+
+from products import money
+from products.cache import get_cache
+from products.pricing import bump_version, get_version
+
+from .models import Promotion
+
+VERSION = 'promotions'
+# Cupón ingresado por el cliente, guardado en la sesión junto al carrito
+COUPON_KEY = 'cart_coupon'
+
+Rule = namedtuple('Rule', ['id', 'name', 'kind', 'value', 'buy', 'free', 'code', 'starts_at', 'ends_at'])
+
+
+class Evaluation(namedtuple('Evaluation', ['discount', 'iva', 'lines', 'promotions'])):
+    """Descuento sin IVA y su IVA en centavos; ``lines`` es ``{product_id: (centavos, promotion_id)}``"""
+    __slots__ = ()
+
+    @property
+    def total(self):
+        return self.discount + self.iva
+
+
+NO_DISCOUNT = Evaluation(0, 0, {}, ())
+
+_lock = threading.Lock()
+_state = {'rules': None}
+
+
+def rule_discount(rule, unit_cents, quantity):
+    """Descuento de ``rule`` sobre una línea, en centavos sin IVA"""
+    if rule.kind == Promotion.PERCENTAGE:
+        return money.unit_iva(unit_cents * quantity, rule.value)
+    if rule.kind == Promotion.AMOUNT:
+        return min(rule.value, unit_cents) * quantity
+    return quantity // (rule.buy + rule.free) * rule.free * unit_cents
+
+
+def is_current(rule, now):
+    return (rule.starts_at is None or rule.starts_at <= now) and (rule.ends_at is None or now < rule.ends_at)
+
+
+class CompiledRules:
+    def __init__(self, version, rules=(), products=(), categories=()):
+        """``products`` y ``categories`` son pares ``(promotion_id, id)``"""
+        self.version = version
+        self.by_product = {}
+        self.by_category = {}
+        self.catalog = []
+        self.coupons = set()
+        rules = {rule.id: rule for rule in rules}
+        scoped = set()
+        for index, links in ((self.by_product, products), (self.by_category, categories)):
+            for promotion_id, pk in links:
+                if promotion_id in rules:
+                    index.setdefault(pk, []).append(rules[promotion_id])
+                    scoped.add(promotion_id)
+        for rule in rules.values():
+            if rule.id not in scoped:
+                self.catalog.append(rule)
+            if rule.code:
+                self.coupons.add(rule.code)
+        self.boundaries = sorted(
+            moment for rule in rules.values() for moment in (rule.starts_at, rule.ends_at) if moment
+        )
+        # Huella del contenido: una versión revertida puede repetirse con otras reglas
+        self.fingerprint = hashlib.sha1(repr((
+            sorted(rules.values()), sorted(self.by_product.items()), sorted(self.by_category.items()),
+        )).encode()).hexdigest()
+
+    def __bool__(self):
+        return bool(self.by_product or self.by_category or self.catalog)
+
+    def timeout(self, now):
+        """Segundos que vale un resultado calculado en ``now``: hasta que empiece o termine una regla"""
+        timeout = getattr(settings, 'PROMOTIONS_CACHE_TIMEOUT', 300)
+        for moment in self.boundaries:
+            if moment > now:
+                return max(1, min(timeout, int((moment - now).total_seconds()) + 1))
+        return timeout
+
+    def is_valid_coupon(self, code, now=None):
+        now = now or timezone.now()
+        return code in self.coupons and any(
+            rule.code == code and is_current(rule, now)
+            for rule in chain(self.catalog, *self.by_product.values(), *self.by_category.values())
+        )
+
+    def evaluate(self, lines, coupon=None, now=None):
+        """``lines`` es un iterable de ``(product_id, category_id, precio_unitario, tasa, cantidad)``"""
+        now = now or timezone.now()
+        discount = iva = 0
+        results, applied = {}, {}
+        empty = ()
+        for product_id, category_id, unit_cents, rate, quantity in lines:
+            best, best_rule = 0, None
+            for rule in chain(
+                self.by_product.get(product_id, empty), self.by_category.get(category_id, empty), self.catalog
+            ):
+                if (rule.code and rule.code != coupon) or not is_current(rule, now):
+                    continue
+                amount = rule_discount(rule, unit_cents, quantity)
+                if amount > best:
+                    best, best_rule = amount, rule
+            if best_rule is not None:
+                discount += best
+                iva += money.unit_iva(best, rate)
+                results[product_id] = (best, best_rule.id)
+                applied[best_rule.id] = best_rule.name
+        return Evaluation(discount, iva, results, tuple(applied.values()))
+
+
+def compile_rules(version):
+    """Reglas activas que no terminaron, con tres consultas"""
+    now = timezone.now()
+    promotions = Promotion.objects.filter(is_active=True).exclude(ends_at__lte=now)
+    rules = []
+    for promotion in promotions:
+        if promotion.kind == Promotion.BUY_X_GET_Y and not (promotion.buy_quantity and promotion.free_quantity):
+            continue
+        if promotion.kind == Promotion.PERCENTAGE:
+            value = money.to_basis_points(promotion.value)
+        else:
+            value = money.to_cents(promotion.value)
+        rules.append(Rule(
+            promotion.pk, promotion.name, promotion.kind, value, promotion.buy_quantity,
+            promotion.free_quantity, promotion.code, promotion.starts_at, promotion.ends_at,
+        ))
+    ids = [rule.id for rule in rules]
+    return CompiledRules(
+        version, rules,
+        Promotion.products.through.objects.filter(promotion_id__in=ids).values_list('promotion_id', 'product_id'),
+        Promotion.categories.through.objects.filter(promotion_id__in=ids).values_list('promotion_id', 'category_id'),
+    )
+
+
+def get_rules(request=None):
+    """Reglas compiladas de este proceso, recompiladas si cambió alguna promoción"""
+    version = get_version(VERSION, request)
+    rules = _state['rules']
+    if rules is None or rules.version != version:
+        with _lock:
+            rules = _state['rules'] = compile_rules(version)
+    return rules
+
+
+def bump_rules():
+    return bump_version(VERSION)
+
+
+def get_coupon(request):
+    return request.session.get(COUPON_KEY)
+
+
+def cart_lines(items):
+    return ((item.product.pk, item.product.category_id, *item.line) for item in items)
+
+
+def evaluate_cart(cart):
+    """Descuentos de ``cart`` (``cart.cart.Cart``), cacheados por versión del carrito"""
+    if not cart.cart:
+        return NO_DISCOUNT
+    rules = get_rules(cart.request)
+    if not rules:
+        return NO_DISCOUNT
+    coupon = get_coupon(cart.request)
+    version = cart.version
+    key = f'promotions:{rules.fingerprint}:{version}:{coupon or ""}'
+    cache = get_cache()
+    evaluation = cache.get(key)
+    if evaluation is None:
+        now = timezone.now()
+        evaluation = rules.evaluate(cart_lines(cart), coupon, now)
+        # Si al cargar los productos se revaloró alguna línea, el carrito ya es otro
+        if cart.version == version:
+            cache.set(key, evaluation, rules.timeout(now))
+    return evaluation
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:51
+
+from decimal import Decimal
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('products', '0012_product_price_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Promotion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Nombre')),
+                ('kind', models.CharField(choices=[('percentage', 'Porcentaje de descuento'), ('amount', 'Monto fijo por unidad'), ('buy_x_get_y', 'Compra N y lleva M gratis')], default='percentage', max_length=20, verbose_name='Tipo')),
+                ('value', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Porcentaje (p. ej. 15) o monto sin IVA por unidad, según el tipo', max_digits=12, validators=[django.core.validators.MinValueValidator(Decimal('0.00'))], verbose_name='Valor')),
+                ('buy_quantity', models.PositiveIntegerField(default=0, help_text='Unidades que se pagan en cada grupo (solo «Compra N y lleva M»)', verbose_name='Compra')),
+                ('free_quantity', models.PositiveIntegerField(default=0, help_text='Unidades sin costo en cada grupo', verbose_name='Gratis')),
+                ('code', models.CharField(blank=True, help_text='Si se indica, la promoción solo aplica con este cupón', max_length=32, null=True, unique=True, verbose_name='Cupón')),
+                ('starts_at', models.DateTimeField(blank=True, null=True, verbose_name='Desde')),
+                ('ends_at', models.DateTimeField(blank=True, null=True, verbose_name='Hasta')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Activa')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('categories', models.ManyToManyField(blank=True, related_name='promotions', to='products.category', verbose_name='Categorías')),
+                ('products', models.ManyToManyField(blank=True, related_name='promotions', to='products.product', verbose_name='Productos')),
+            ],
+            options={
+                'verbose_name': 'Promoción',
+                'verbose_name_plural': 'Promociones',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['is_active', 'ends_at'], name='promotions__is_acti_4afad1_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,78 @@
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.core.validators import MinValueValidator
+from django.db import models
+from django.utils import timezone
+
+from products.models import Category, Product
+
+
+class Promotion(models.Model):
+    """Regla de descuento sobre las líneas del carrito (ver ``engine.py``)"""
+    PERCENTAGE = 'percentage'
+    AMOUNT = 'amount'
+    BUY_X_GET_Y = 'buy_x_get_y'
+    KIND_CHOICES = [
+        (PERCENTAGE, 'Porcentaje de descuento'),
+        (AMOUNT, 'Monto fijo por unidad'),
+        (BUY_X_GET_Y, 'Compra N y lleva M gratis'),
+    ]
+
+    name = models.CharField(max_length=100, verbose_name="Nombre")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default=PERCENTAGE, verbose_name="Tipo")
+    value = models.DecimalField(
+        max_digits=12, decimal_places=2, default=Decimal('0.00'),
+        validators=[MinValueValidator(Decimal('0.00'))],
+        verbose_name="Valor",
+        help_text="Porcentaje (p. ej. 15) o monto sin IVA por unidad, según el tipo",
+    )
+    buy_quantity = models.PositiveIntegerField(
+        default=0, verbose_name="Compra", help_text="Unidades que se pagan en cada grupo (solo «Compra N y lleva M»)"
+    )
+    free_quantity = models.PositiveIntegerField(
+        default=0, verbose_name="Gratis", help_text="Unidades sin costo en cada grupo"
+    )
+    code = models.CharField(
+        max_length=32, unique=True, null=True, blank=True, verbose_name="Cupón",
+        help_text="Si se indica, la promoción solo aplica con este cupón",
+    )
+    # Sin productos ni categorías aplica a todo el catálogo
+    products = models.ManyToManyField(Product, blank=True, related_name='promotions', verbose_name="Productos")
+    categories = models.ManyToManyField(Category, blank=True, related_name='promotions', verbose_name="Categorías")
+    starts_at = models.DateTimeField(null=True, blank=True, verbose_name="Desde")
+    ends_at = models.DateTimeField(null=True, blank=True, verbose_name="Hasta")
+    is_active = models.BooleanField(default=True, verbose_name="Activa")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Promoción"
+        verbose_name_plural = "Promociones"
+        indexes = [
+            models.Index(fields=['is_active', 'ends_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.code})' if self.code else self.name
+
+    def save(self, *args, **kwargs):
+        # Los cupones se comparan sin distinguir mayúsculas
+        self.code = (self.code or '').strip().upper() or None
+        super().save(*args, **kwargs)
+
+    def clean(self):
+        if self.kind == self.PERCENTAGE and self.value > 100:
+            raise ValidationError({'value': 'El porcentaje no puede superar 100'})
+        if self.kind == self.BUY_X_GET_Y and not (self.buy_quantity and self.free_quantity):
+            raise ValidationError('Indica cuántas unidades se compran y cuántas salen gratis')
+        if self.starts_at and self.ends_at and self.ends_at <= self.starts_at:
+            raise ValidationError({'ends_at': 'Debe ser posterior a la fecha de inicio'})
+
+    def is_current(self, now=None):
+        now = now or timezone.now()
+        return (
+            self.is_active and (self.starts_at is None or self.starts_at <= now)
+            and (self.ends_at is None or now < self.ends_at)
+        )
@@ -0,0 +1,20 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .engine import bump_rules
+from .models import Promotion
+
+
+@receiver(post_save, sender=Promotion)
+@receiver(post_delete, sender=Promotion)
+def invalidate_rules(sender, raw=False, **kwargs):
+    """Los procesos recompilan las reglas y los resultados cacheados dejan de usarse"""
+    if not raw:
+        bump_rules()
+
+
+@receiver(m2m_changed, sender=Promotion.products.through)
+@receiver(m2m_changed, sender=Promotion.categories.through)
+def invalidate_rules_on_scope_change(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_rules()
@@ -0,0 +1,136 @@
+import json
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.db.models import F
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from cart.cart import Cart
+from orders.checkout import compute_totals
+from products.models import CatalogVersion, Category, Product
+from promotions import engine
+from promotions.engine import COUPON_KEY, evaluate_cart, get_rules
+from promotions.models import Promotion
+
+User = get_user_model()
+
+
+class PromotionEngineTest(TestCase):
+    def setUp(self):
+        # Reglas compiladas con versiones de otro test (la transacción se revirtió)
+        engine._state['rules'] = None
+        self.shoes = Category.objects.create(name="Calzado")
+        self.shirts = Category.objects.create(name="Camisetas")
+        self.sneaker = Product.objects.create(name="Tenis", description="-", unit_price=Decimal('1000.00'),
+                                              stock=50, category=self.shoes)
+        self.shirt = Product.objects.create(name="Camiseta", description="-", unit_price=Decimal('500.00'),
+                                            stock=50, category=self.shirts)
+        self.request = RequestFactory().get('/')
+        SessionMiddleware(lambda request: None).process_request(self.request)
+
+    def cart(self, *lines):
+        cart = Cart(self.request)
+        for product, quantity in lines:
+            cart.add(product, quantity=quantity)
+        return cart
+
+    def test_percentage_by_category(self):
+        promotion = Promotion.objects.create(name="10% calzado", value=Decimal('10'))
+        promotion.categories.add(self.shoes)
+        evaluation = evaluate_cart(self.cart((self.sneaker, 2), (self.shirt, 1)))
+        self.assertEqual(evaluation.discount, 20000)
+        self.assertEqual(evaluation.iva, 3800)
+        self.assertEqual(evaluation.lines, {self.sneaker.pk: (20000, promotion.pk)})
+        self.assertEqual(evaluation.promotions, ("10% calzado",))
+
+    def test_buy_x_get_y(self):
+        promotion = Promotion.objects.create(name="3x2", kind=Promotion.BUY_X_GET_Y, value=0,
+                                             buy_quantity=2, free_quantity=1)
+        promotion.products.add(self.shirt)
+        evaluation = evaluate_cart(self.cart((self.shirt, 7)))
+        self.assertEqual(evaluation.discount, 2 * 50000)
+
+    def test_best_rule_wins_without_stacking(self):
+        Promotion.objects.create(name="Todo 5%", value=Decimal('5'))
+        amount = Promotion.objects.create(name="-$300", kind=Promotion.AMOUNT, value=Decimal('300'))
+        amount.products.add(self.sneaker)
+        evaluation = evaluate_cart(self.cart((self.sneaker, 1), (self.shirt, 2)))
+        self.assertEqual(evaluation.lines[self.sneaker.pk], (30000, amount.pk))
+        self.assertEqual(evaluation.lines[self.shirt.pk][0], 5000)
+        self.assertEqual(evaluation.discount, 35000)
+
+    def test_coupon_applies_only_when_entered(self):
+        Promotion.objects.create(name="Cupón", value=Decimal('20'), code='hola20')
+        cart = self.cart((self.shirt, 1))
+        self.assertEqual(evaluate_cart(cart).discount, 0)
+        self.request.session[COUPON_KEY] = 'HOLA20'
+        self.assertEqual(evaluate_cart(cart).discount, 10000)
+
+    def test_expired_and_future_rules_are_ignored(self):
+        now = timezone.now()
+        Promotion.objects.create(name="Pasada", value=Decimal('50'), ends_at=now - timedelta(days=1))
+        Promotion.objects.create(name="Futura", value=Decimal('50'), starts_at=now + timedelta(days=1))
+        self.assertEqual(evaluate_cart(self.cart((self.shirt, 1))).discount, 0)
+
+    def test_evaluation_is_cached_per_cart_version(self):
+        Promotion.objects.create(name="Todo 10%", value=Decimal('10'))
+        cart = self.cart((self.shirt, 1))
+        first = evaluate_cart(cart)
+        cart.invalidate()
+        with self.assertNumQueries(0):
+            self.assertEqual(evaluate_cart(Cart(self.request)), first)
+        cart.add(self.shirt)
+        self.assertEqual(evaluate_cart(cart).discount, 2 * first.discount)
+
+    def test_rules_are_recompiled_when_a_promotion_changes(self):
+        promotion = Promotion.objects.create(name="Todo 10%", value=Decimal('10'))
+        rules = get_rules()
+        self.assertIs(get_rules(), rules)
+        promotion.value = Decimal('20')
+        promotion.save()
+        self.assertEqual(evaluate_cart(self.cart((self.shirt, 1))).discount, 10000)
+
+    def test_change_made_by_another_process_is_noticed(self):
+        promotion = Promotion.objects.create(name="Mitad", value=Decimal('50'))
+        self.assertEqual(evaluate_cart(self.cart((self.shirt, 1))).discount, 25000)
+        # Otro worker la desactiva: sin señales ni caché compartida en este proceso
+        Promotion.objects.filter(pk=promotion.pk).update(is_active=False)
+        CatalogVersion.objects.filter(name=engine.VERSION).update(value=F('value') + 1)
+        request = RequestFactory().get('/')
+        request.session = self.request.session
+        self.assertFalse(get_rules(request))
+        self.assertEqual(evaluate_cart(Cart(request)).discount, 0)
+
+    def test_compute_totals_with_discount(self):
+        Promotion.objects.create(name="Todo 10%", value=Decimal('10'))
+        cart = self.cart((self.sneaker, 1))
+        totals = compute_totals(cart, evaluate_cart(cart))
+        self.assertEqual(totals['subtotal'], Decimal('1000.00'))
+        self.assertEqual(totals['discount'], Decimal('100.00'))
+        self.assertEqual(totals['total_iva'], Decimal('171.00'))
+        self.assertEqual(totals['total'], Decimal('1071.00'))
+
+
+class CouponViewTest(TestCase):
+    def setUp(self):
+        engine._state['rules'] = None
+        self.client.force_login(User.objects.create_user(username="kevin", password="123456"))
+        category = Category.objects.create(name="Calzado")
+        self.product = Product.objects.create(name="Tenis", description="-", unit_price=Decimal('1000.00'),
+                                              stock=5, category=category)
+        Promotion.objects.create(name="Cupón", value=Decimal('10'), code='TENIS10')
+
+    def test_apply_and_remove_coupon(self):
+        self.client.post('/promotions/coupon/', {'code': 'nope'})
+        self.assertNotIn(COUPON_KEY, self.client.session)
+        self.client.post('/promotions/coupon/', {'code': 'tenis10'})
+        self.assertEqual(self.client.session[COUPON_KEY], 'TENIS10')
+        response = self.client.post('/cart/batch/', json.dumps({'operations': [
+            {'op': 'add', 'product_id': self.product.pk},
+        ]}), content_type='application/json')
+        self.assertEqual(response.json()['discount'], '100.00')
+        self.client.post('/promotions/coupon/remove/')
+        self.assertNotIn(COUPON_KEY, self.client.session)
@@ -0,0 +1,9 @@
+from django.urls import path
+from . import views
+
+app_name = 'promotions'
+
+urlpatterns = [
+    path('coupon/', views.apply_coupon, name='apply_coupon'),
+    path('coupon/remove/', views.remove_coupon, name='remove_coupon'),
+]
@@ -0,0 +1,26 @@
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import redirect
+from django.views.decorators.http import require_POST
+
+from .engine import COUPON_KEY, get_rules
+
+
+@require_POST
+@login_required
+def apply_coupon(request):
+    code = (request.POST.get('code') or '').strip().upper()
+    if code and get_rules(request).is_valid_coupon(code):
+        request.session[COUPON_KEY] = code
+        messages.success(request, f'Cupón "{code}" aplicado')
+    else:
+        messages.error(request, 'El cupón no es válido o ya venció')
+    return redirect('cart:cart_detail')
+
+
+@require_POST
+@login_required
+def remove_coupon(request):
+    if request.session.pop(COUPON_KEY, None):
+        messages.info(request, 'Cupón quitado')
+    return redirect('cart:cart_detail')